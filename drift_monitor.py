@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Streaming feature and prediction drift monitoring for the time-estimation model
+Keeps mergeable, constant-size sketches per feature (log-bucketed quantile
+sketches for numeric features, counts for the one-hot flags) plus a sketch of
+the predictions. Serving processes flush their sketches to a directory; the
+CLI merges them and reports PSI and KS drift against the training snapshot
+without ever storing raw requests.
+
+Usage:
+    python drift_monitor.py --reference model/forest/drift_reference.json --live /var/lib/nordflytt/drift
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+# One-hot features are tracked as rates, everything else as distributions
+FLAG_FEATURES = ('property_type_villa', 'property_type_kontor', 'elevator_ingen', 'elevator_liten')
+PREDICTION_KEY = 'predicted_hours'
+REFERENCE_FILE = 'drift_reference.json'
+
+class QuantileSketch:
+    """Mergeable log-bucketed quantile sketch with bounded memory
+
+    Values are assigned to buckets whose width grows geometrically, which
+    gives quantiles within relative_accuracy of the true value. When more
+    than max_buckets are in use the lowest buckets are collapsed, so memory
+    stays constant however many values are added. Values <= 0 share a
+    single zero bucket (all model features are non-negative).
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=1024):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        positive = values[values > 0]
+
+        self.zero_count += int(len(values) - len(positive))
+        self.count += int(len(values))
+
+        if len(positive):
+            indexes, counts = np.unique(np.ceil(np.log(positive) / self._log_gamma).astype(np.int64),
+                                        return_counts=True)
+            for index, count in zip(indexes.tolist(), counts.tolist()):
+                self.buckets[index] = self.buckets.get(index, 0) + count
+            self._collapse()
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self._collapse()
+        return self
+
+    def _collapse(self):
+        if len(self.buckets) <= self.max_buckets:
+            return
+        indexes = sorted(self.buckets)
+        overflow = indexes[:len(indexes) - self.max_buckets + 1]
+        target = indexes[len(overflow)]
+        self.buckets[target] += sum(self.buckets.pop(index) for index in overflow)
+
+    def _value(self, index):
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                return self._value(index)
+        return self._value(max(self.buckets))
+
+    def cdf_points(self):
+        """Sorted (value, cumulative fraction) pairs covering the sketch"""
+        points = [(0.0, self.zero_count / self.count)] if self.count else []
+        seen = self.zero_count
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            points.append((self._value(index), seen / self.count))
+        return points
+
+    def cdf(self, x):
+        """Fraction of values <= x"""
+        if not self.count:
+            return 0.0
+        seen = self.zero_count if x >= 0 else 0
+        seen += sum(count for index, count in self.buckets.items() if self._value(index) <= x)
+        return seen / self.count
+
+    def to_dict(self):
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'max_buckets': self.max_buckets,
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'buckets': {str(index): count for index, count in self.buckets.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['relative_accuracy'], data['max_buckets'])
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        sketch.buckets = {int(index): count for index, count in data['buckets'].items()}
+        return sketch
+
+class FlagCounter:
+    """Count of rows with a one-hot flag set"""
+
+    def __init__(self):
+        self.ones = 0
+        self.count = 0
+
+    def add(self, values):
+        values = np.asarray(values).ravel()
+        self.ones += int(np.count_nonzero(values > 0.5))
+        self.count += int(len(values))
+
+    def merge(self, other):
+        self.ones += other.ones
+        self.count += other.count
+        return self
+
+    @property
+    def rate(self):
+        return self.ones / self.count if self.count else None
+
+    def to_dict(self):
+        return {'ones': self.ones, 'count': self.count}
+
+    @classmethod
+    def from_dict(cls, data):
+        counter = cls()
+        counter.ones = data['ones']
+        counter.count = data['count']
+        return counter
+
+class FeatureSketches:
+    """One sketch per model feature plus one for predictions"""
+
+    def __init__(self, feature_names):
+        self.feature_names = list(feature_names)
+        self.sketches = {
+            name: FlagCounter() if name in FLAG_FEATURES else QuantileSketch()
+            for name in self.feature_names
+        }
+        self.sketches[PREDICTION_KEY] = QuantileSketch()
+
+    def update(self, features, predictions=None):
+        """Add a (rows, features) batch in feature_names order"""
+        features = np.asarray(features, dtype=np.float64)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        for column, name in enumerate(self.feature_names):
+            self.sketches[name].add(features[:, column])
+        if predictions is not None:
+            self.sketches[PREDICTION_KEY].add(predictions)
+
+    def merge(self, other):
+        for name, sketch in other.sketches.items():
+            self.sketches[name].merge(sketch)
+        return self
+
+    @property
+    def rows(self):
+        return self.sketches[self.feature_names[0]].count if self.feature_names else 0
+
+    def to_dict(self):
+        return {
+            'feature_names': self.feature_names,
+            'sketches': {
+                name: {'type': 'flag' if isinstance(sketch, FlagCounter) else 'quantile', **sketch.to_dict()}
+                for name, sketch in self.sketches.items()
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketches = cls(data['feature_names'])
+        for name, sketch_data in data['sketches'].items():
+            sketch_type = FlagCounter if sketch_data['type'] == 'flag' else QuantileSketch
+            sketches.sketches[name] = sketch_type.from_dict(sketch_data)
+        return sketches
+
+    def save(self, path):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+class DriftMonitor:
+    """Thread-safe live sketches that are flushed to drift_dir periodically
+
+    Each process writes its own drift-<pid>.json; the files are merged by
+    the CLI, so any number of workers can report without coordination.
+    """
+
+    def __init__(self, feature_names, drift_dir, flush_seconds=60):
+        self.drift_dir = drift_dir
+        self.flush_seconds = flush_seconds
+        self.sketches = FeatureSketches(feature_names)
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        os.makedirs(drift_dir, exist_ok=True)
+
+    def record(self, features, predictions):
+        with self._lock:
+            self.sketches.update(features, predictions)
+            due = time.monotonic() - self._last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._last_flush = time.monotonic()
+            data = self.sketches.to_dict()
+        path = os.path.join(self.drift_dir, f'drift-{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+def psi(expected, actual, epsilon=1e-4):
+    """Population stability index between two probability vectors"""
+    expected = np.clip(np.asarray(expected, dtype=np.float64), epsilon, None)
+    actual = np.clip(np.asarray(actual, dtype=np.float64), epsilon, None)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+def _step_cdf(points, grid):
+    """Evaluate a sketch's step CDF (from cdf_points) at every grid value"""
+    positions = np.searchsorted(points[:, 0], grid, side='right') - 1
+    return np.where(positions >= 0, points[np.clip(positions, 0, None), 1], 0.0)
+
+def numeric_drift(reference, live, bins=10):
+    """PSI over the reference's quantile bins and KS over the sketch CDFs"""
+    edges = sorted({reference.quantile(k / bins) for k in range(1, bins)})
+    reference_cdf = [reference.cdf(edge) for edge in edges]
+    live_cdf = [live.cdf(edge) for edge in edges]
+    reference_probs = np.diff([0.0] + reference_cdf + [1.0])
+    live_probs = np.diff([0.0] + live_cdf + [1.0])
+
+    reference_points = np.array(reference.cdf_points())
+    live_points = np.array(live.cdf_points())
+    grid = np.union1d(reference_points[:, 0], live_points[:, 0])
+    ks = np.max(np.abs(_step_cdf(reference_points, grid) - _step_cdf(live_points, grid)))
+
+    return {'psi': psi(reference_probs, live_probs), 'ks': float(ks),
+            'reference_p50': reference.quantile(0.5), 'live_p50': live.quantile(0.5)}
+
+def flag_drift(reference, live):
+    reference_rate, live_rate = reference.rate or 0.0, live.rate or 0.0
+    return {
+        'psi': psi([1 - reference_rate, reference_rate], [1 - live_rate, live_rate]),
+        'ks': abs(reference_rate - live_rate),
+        'reference_rate': reference_rate,
+        'live_rate': live_rate
+    }
+
+def drift_report(reference, live):
+    """Per-feature PSI/KS of live sketches against the training snapshot"""
+    report = {}
+    for name, reference_sketch in reference.sketches.items():
+        live_sketch = live.sketches.get(name)
+        if live_sketch is None or not live_sketch.count or not reference_sketch.count:
+            continue
+        if isinstance(reference_sketch, FlagCounter):
+            report[name] = flag_drift(reference_sketch, live_sketch)
+        else:
+            report[name] = numeric_drift(reference_sketch, live_sketch)
+    return report
+
+def load_live(path):
+    """Merge every sketch file in a directory (or a single file)"""
+    paths = sorted(glob.glob(os.path.join(path, 'drift-*.json'))) if os.path.isdir(path) else [path]
+    if not paths:
+        raise FileNotFoundError(f"No drift sketches found in {path}")
+    merged = FeatureSketches.load(paths[0])
+    for other in paths[1:]:
+        merged.merge(FeatureSketches.load(other))
+    return merged
+
+def psi_status(value):
+    if value >= 0.25:
+        return '🔴 drift'
+    if value >= 0.1:
+        return '🟡 shift'
+    return '🟢 stable'
+
+def main():
+    parser = argparse.ArgumentParser(description="Report feature and prediction drift against training")
+    parser.add_argument('--reference', required=True, help="drift_reference.json written by training.py")
+    parser.add_argument('--live', required=True, help="Directory of drift-*.json files (or one file)")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args()
+
+    reference = FeatureSketches.load(args.reference)
+    live = load_live(args.live)
+    report = drift_report(reference, live)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"📊 Drift: {live.rows} live rows vs {reference.rows} training rows")
+    print(f"{'feature':>24} {'PSI':>8} {'KS':>7}  status")
+    for name, metrics in report.items():
+        print(f"{name:>24} {metrics['psi']:>8.4f} {metrics['ks']:>7.4f}  {psi_status(metrics['psi'])}")
+
+if __name__ == "__main__":
+    main()
@@ -2,57 +2,511 @@
 import joblib
 import numpy as np
 import pandas as pd
+import csv
+import io
 import json
+import logging
 import os
+import random
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Expected feature order for Nordflytt model
+FEATURE_NAMES = [
+    'living_area', 'team_size', 'distance_km', 'floors',
+    'weather_score', 'customer_preparation', 'enhanced_v21_estimate',
+    'property_type_villa', 'property_type_kontor',
+    'elevator_ingen', 'elevator_liten'
+]
+
+# Default values for missing features (everything else defaults to 0)
+FEATURE_DEFAULTS = {
+    'weather_score': 0.8,
+    'customer_preparation': 0.7
+}
+
+MODEL_VERSION = 'v1.0-randomforest-nordflytt'
+
+# Rows per chunk when streaming CSV / NDJSON batch-transform input
+STREAM_CHUNK_ROWS = int(os.environ.get('NORDFLYTT_STREAM_CHUNK_ROWS', '1000'))
+
+CSV_CONTENT_TYPE = 'text/csv'
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/jsonlines', 'application/jsonl')
+# Binary response formats for internal callers (JSON stays the default)
+MSGPACK_CONTENT_TYPES = ('application/msgpack', 'application/x-msgpack')
+ARROW_STREAM_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+def _dumps(content):
+    """Serialize to JSON bytes; orjson writes NumPy arrays without .tolist()"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=lambda value: value.tolist()).encode('utf-8')
+
+# Sub-directory (or symlink to a versioned directory) of model_dir holding
+# the compiled (flattened) forest, and the optional shadow candidate
+COMPILED_MODEL_DIR = 'forest'
+CANDIDATE_MODEL_DIR = 'candidate'
+# Published versions kept per slot; older ones are deleted on publish
+MODEL_KEEP_VERSIONS = int(os.environ.get('NORDFLYTT_MODEL_KEEP_VERSIONS', '3'))
+
+# Seconds between checks of model_dir for a newly published forest (0 = off)
+MODEL_POLL_SECONDS = float(os.environ.get('NORDFLYTT_MODEL_POLL_SECONDS', '0'))
+# Fraction of requests also scored by the candidate model in the background
+SHADOW_SAMPLE_RATE = float(os.environ.get('NORDFLYTT_SHADOW_SAMPLE_RATE', '0.1'))
+# Shadow work is dropped rather than queued beyond this many pending batches
+SHADOW_MAX_PENDING = 8
+
+# Directory live drift sketches are flushed to (unset = drift monitoring off)
+DRIFT_DIR = os.environ.get('NORDFLYTT_DRIFT_DIR')
+DRIFT_FLUSH_SECONDS = float(os.environ.get('NORDFLYTT_DRIFT_FLUSH_SECONDS', '60'))
+_drift_monitor = None
+
+class CompiledForest:
+    """RandomForest flattened into contiguous node arrays
+
+    All trees are concatenated into one set of node arrays so a batch is
+    scored for every tree at once with vectorized NumPy traversal. Leaves
+    point to themselves, which lets traversal run a fixed max_depth steps.
+    The arrays are plain .npy files and are loaded memory-mapped, so every
+    process serving the same artifact shares one copy of the model pages.
+    """
+
+    ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def node_count(self):
+        return len(self.feature)
+
+    def predict_trees(self, X):
+        """Per-tree predictions with shape (n_rows, n_estimators)"""
+        # Trees split on float32 features, same as scikit-learn
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        nodes = np.repeat(self.roots[np.newaxis, :], len(X), axis=0)
+        for _ in range(self.max_depth):
+            go_left = np.take_along_axis(X, self.feature[nodes], axis=1) <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        return self.value[nodes]
+
+    def predict(self, X):
+        return self.predict_trees(X).mean(axis=1)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({
+                'max_depth': self.max_depth,
+                'n_features': self.n_features,
+                'n_estimators': self.n_estimators,
+                'node_count': self.node_count,
+                'feature_names': FEATURE_NAMES,
+                'model_version': MODEL_VERSION
+            }, f, indent=2)
+
+def compile_forest(model):
+    """Flatten a fitted RandomForestRegressor into a CompiledForest"""
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count, dtype=np.int32)
+        is_leaf = tree.children_left < 0
+
+        # Leaves loop back to themselves and always take the left branch
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold).astype(np.float64))
+        lefts.append((np.where(is_leaf, node_ids, tree.children_left) + offset).astype(np.int32))
+        rights.append((np.where(is_leaf, node_ids, tree.children_right) + offset).astype(np.int32))
+        values.append(tree.value[:, 0, 0].astype(np.float64))
+        roots.append(offset)
+
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    return CompiledForest(
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds),
+        left=np.concatenate(lefts),
+        right=np.concatenate(rights),
+        value=np.concatenate(values),
+        roots=np.array(roots, dtype=np.int32),
+        max_depth=max_depth,
+        n_features=model.n_features_in_ if hasattr(model, 'n_features_in_') else len(FEATURE_NAMES)
+    )
+
+def load_compiled_forest(path, mmap_mode='r'):
+    """Load a compiled forest, memory-mapping the node arrays by default"""
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+
+    arrays = {
+        name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+        for name in CompiledForest.ARRAYS
+    }
+    return CompiledForest(max_depth=meta['max_depth'], n_features=meta['n_features'], **arrays)
+
+def _prune_versions(model_dir, slot, keep=MODEL_KEEP_VERSIONS):
+    """Delete all but the newest keep <slot>-<version> directories
+
+    A directory a slot symlink points at is never deleted, whatever its age.
+    """
+    in_use = {os.path.realpath(os.path.join(model_dir, name)) for name in (COMPILED_MODEL_DIR, CANDIDATE_MODEL_DIR)}
+    versions = []
+    for entry in os.scandir(model_dir):
+        if entry.name.startswith(f'{slot}-') and entry.is_dir(follow_symlinks=False):
+            versions.append((entry.stat(follow_symlinks=False).st_mtime, entry.path))
+    versions.sort(reverse=True)
+    for _, version_dir in versions[keep:]:
+        if os.path.realpath(version_dir) not in in_use:
+            shutil.rmtree(version_dir, ignore_errors=True)
+
+def publish_forest(forest, model_dir, slot=COMPILED_MODEL_DIR, extra_files=None):
+    """Save a compiled forest as a new version and atomically point slot at it
+
+    The forest (plus any extra_files, a {filename: JSON-serializable} dict)
+    is written to model_dir/<slot>-<version> first and the slot symlink is
+    then replaced with os.replace, so a watching server never sees a
+    half-written artifact. Versions beyond MODEL_KEEP_VERSIONS are then
+    pruned. Returns the version directory.
+    """
+    version = f"{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{random.randint(0, 9999):04d}"
+    version_dir = os.path.join(model_dir, f'{slot}-{version}')
+    forest.save(version_dir)
+    for filename, content in (extra_files or {}).items():
+        with open(os.path.join(version_dir, filename), 'w') as f:
+            json.dump(content, f)
+
+    slot_path = os.path.join(model_dir, slot)
+    if os.path.isdir(slot_path) and not os.path.islink(slot_path):
+        # Move a pre-versioning artifact aside so the slot can become a symlink
+        os.rename(slot_path, os.path.join(model_dir, f'{slot}-legacy-{version}'))
+
+    tmp_link = os.path.join(model_dir, f'.{slot}.{version}.tmp')
+    os.symlink(os.path.basename(version_dir), tmp_link)
+    os.replace(tmp_link, slot_path)
+    _prune_versions(model_dir, slot)
+    return version_dir
+
+class ShadowStats:
+    """Running latency and prediction-delta totals for shadow scoring"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+        self.latency_ms_total = 0.0
+        self.latency_ms_max = 0.0
+        self.abs_delta_total = 0.0
+        self.abs_delta_max = 0.0
+        self.dropped = 0
+
+    def record(self, rows, latency_ms, abs_delta):
+        with self._lock:
+            self.batches += 1
+            self.rows += rows
+            self.latency_ms_total += latency_ms
+            self.latency_ms_max = max(self.latency_ms_max, latency_ms)
+            self.abs_delta_total += float(abs_delta.sum())
+            self.abs_delta_max = max(self.abs_delta_max, float(abs_delta.max()) if rows else 0.0)
+
+    def record_dropped(self):
+        with self._lock:
+            self.dropped += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'rows': self.rows,
+                'dropped': self.dropped,
+                'avg_latency_ms': self.latency_ms_total / self.batches if self.batches else None,
+                'max_latency_ms': self.latency_ms_max,
+                'mean_abs_delta_hours': self.abs_delta_total / self.rows if self.rows else None,
+                'max_abs_delta_hours': self.abs_delta_max
+            }
+
+class HotSwapModel:
+    """Live compiled forest that follows model_dir, plus an optional shadow
+
+    A daemon thread polls model_dir and swaps in a newly published forest
+    by replacing a single reference; requests already in flight keep the
+    model they started with. When a candidate slot exists, a sample of
+    requests is re-scored by it on a background thread and the latency and
+    prediction delta are recorded in shadow_stats.
+    """
+
+    def __init__(self, model_dir, poll_seconds=MODEL_POLL_SECONDS, shadow_sample_rate=SHADOW_SAMPLE_RATE):
+        self.model_dir = model_dir
+        self.poll_seconds = poll_seconds
+        self.shadow_sample_rate = shadow_sample_rate
+        self.current = None
+        self.candidate = None
+        self.shadow_stats = ShadowStats()
+        self._signatures = {}
+        self._shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='nordflytt-shadow')
+        self._shadow_slots = threading.Semaphore(SHADOW_MAX_PENDING)
+
+        self.reload()
+        if self.current is None:
+            raise FileNotFoundError(f"No compiled forest in {model_dir}")
+
+        if poll_seconds > 0:
+            threading.Thread(target=self._watch, name='nordflytt-model-watcher', daemon=True).start()
+
+    def _signature(self, slot):
+        path = os.path.join(self.model_dir, slot)
+        meta_path = os.path.join(path, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        return os.path.realpath(path), os.path.getmtime(meta_path)
+
+    def reload(self):
+        """Load any slot whose artifact changed since the last check"""
+        for slot, attribute in ((COMPILED_MODEL_DIR, 'current'), (CANDIDATE_MODEL_DIR, 'candidate')):
+            signature = self._signature(slot)
+            if signature == self._signatures.get(slot):
+                continue
+
+            if signature is None:
+                # A missing live slot is a publish in progress; keep serving
+                if slot == CANDIDATE_MODEL_DIR:
+                    self.candidate = None
+                    logger.info("Shadow candidate removed")
+            else:
+                setattr(self, attribute, load_compiled_forest(signature[0]))
+                logger.info("Loaded %s model from %s", slot, signature[0])
+            self._signatures[slot] = signature
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                self.reload()
+            except Exception:
+                logger.exception("Model reload failed, keeping the current model")
+
+    def maybe_shadow(self, features, live_predictions):
+        """Queue candidate scoring for a sample of traffic without blocking"""
+        candidate = self.candidate
+        if candidate is None or random.random() >= self.shadow_sample_rate:
+            return
+        if not self._shadow_slots.acquire(blocking=False):
+            self.shadow_stats.record_dropped()
+            return
+        self._shadow_pool.submit(self._score_shadow, candidate, features, live_predictions)
+
+    def _score_shadow(self, candidate, features, live_predictions):
+        try:
+            started = time.perf_counter()
+            shadow_predictions = candidate.predict(features)
+            latency_ms = (time.perf_counter() - started) * 1000
+            abs_delta = np.abs(shadow_predictions - np.asarray(live_predictions))
+            self.shadow_stats.record(len(abs_delta), latency_ms, abs_delta)
+            logger.debug("Shadow scored %d rows in %.2fms, mean delta %.3fh",
+                         len(abs_delta), latency_ms, float(abs_delta.mean()) if len(abs_delta) else 0.0)
+        except Exception:
+            logger.exception("Shadow scoring failed")
+        finally:
+            self._shadow_slots.release()
 
 def model_fn(model_dir):
-    """Load the Nordflytt RandomForest model"""
+    """Load the Nordflytt RandomForest model
+
+    Prefers the compiled forest in model_dir/forest and falls back to the
+    scikit-learn model.joblib artifact. With NORDFLYTT_MODEL_POLL_SECONDS
+    set, the compiled forest is wrapped in a HotSwapModel that follows new
+    publishes and shadow-scores model_dir/candidate.
+    """
+    compiled_path = os.path.join(model_dir, COMPILED_MODEL_DIR)
+    if os.path.isdir(compiled_path):
+        if MODEL_POLL_SECONDS > 0:
+            return HotSwapModel(model_dir)
+        return load_compiled_forest(compiled_path)
+
     model_path = os.path.join(model_dir, 'model.joblib')
     model = joblib.load(model_path)
     return model
 
+def _base_content_type(content_type):
+    """Strip parameters such as charset from a content type"""
+    return (content_type or '').split(';')[0].strip().lower()
+
+def _iter_lines(request_body):
+    """Yield decoded text lines from a str, bytes or file-like request body"""
+    if isinstance(request_body, (bytes, bytearray)):
+        # Decode line by line rather than copying the whole body as one str
+        stream = io.TextIOWrapper(io.BytesIO(request_body), encoding='utf-8', newline='')
+    elif isinstance(request_body, str):
+        stream = io.StringIO(request_body)
+    elif hasattr(request_body, 'read'):
+        stream = request_body
+    else:
+        stream = iter(request_body)
+
+    for line in stream:
+        if isinstance(line, (bytes, bytearray)):
+            line = line.decode('utf-8')
+        yield line
+
+def _row_from_mapping(record):
+    """Build a feature row from a dict, filling defaults for missing features"""
+    return [record.get(feature, FEATURE_DEFAULTS.get(feature, 0)) for feature in FEATURE_NAMES]
+
+def features_from_frame(frame):
+    """Select model features from an arbitrary frame in model order
+
+    Missing columns and missing values get the same defaults as single
+    JSON requests; extra columns (ids, targets) are ignored.
+    """
+    features = frame.reindex(columns=FEATURE_NAMES)
+    return features.fillna({feature: FEATURE_DEFAULTS.get(feature, 0) for feature in FEATURE_NAMES}).astype(float)
+
+def _chunked_frames(rows, chunk_rows=None):
+    """Group feature rows into DataFrames of at most chunk_rows rows"""
+    chunk_rows = chunk_rows or STREAM_CHUNK_ROWS
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            yield pd.DataFrame(chunk, columns=FEATURE_NAMES, dtype=float)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame(chunk, columns=FEATURE_NAMES, dtype=float)
+
+def _iter_csv_rows(request_body):
+    """Parse CSV rows lazily; a header row is used to map columns by name"""
+    reader = csv.reader(_iter_lines(request_body))
+    columns = None
+    first_row = True
+    for fields in reader:
+        if not fields or all(not field.strip() for field in fields):
+            continue
+
+        if first_row:
+            first_row = False
+            if any(field.strip() in FEATURE_NAMES for field in fields):
+                columns = [field.strip() for field in fields]
+                continue
+
+        if columns:
+            record = {
+                name: float(value)
+                for name, value in zip(columns, fields)
+                if name in FEATURE_NAMES and value.strip()
+            }
+            yield _row_from_mapping(record)
+        else:
+            if len(fields) != len(FEATURE_NAMES):
+                raise ValueError(f"Expected {len(FEATURE_NAMES)} CSV columns, got {len(fields)}")
+            yield [float(value) for value in fields]
+
+def _iter_ndjson_rows(request_body):
+    """Parse newline-delimited JSON rows lazily (objects or positional arrays)"""
+    for line in _iter_lines(request_body):
+        line = line.strip()
+        if not line:
+            continue
+
+        record = json.loads(line)
+        if isinstance(record, dict):
+            yield _row_from_mapping(record)
+        else:
+            if len(record) != len(FEATURE_NAMES):
+                raise ValueError(f"Expected {len(FEATURE_NAMES)} features, got {len(record)}")
+            yield record
+
 def input_fn(request_body, request_content_type):
-    """Parse and prepare input features"""
-    if request_content_type == 'application/json':
+    """Parse and prepare input features
+
+    JSON bodies return a single DataFrame. CSV and NDJSON bodies return a
+    generator of DataFrame chunks so arbitrarily large batch-transform inputs
+    are parsed in constant memory.
+    """
+    content_type = _base_content_type(request_content_type)
+
+    if content_type == 'application/json':
         input_data = json.loads(request_body)
-        
-        # Expected feature order for Nordflytt model
-        feature_names = [
-            'living_area', 'team_size', 'distance_km', 'floors',
-            'weather_score', 'customer_preparation', 'enhanced_v21_estimate',
-            'property_type_villa', 'property_type_kontor', 
-            'elevator_ingen', 'elevator_liten'
-        ]
-        
+
         # Handle both single and batch predictions
         if 'instances' in input_data:
             # Batch format
-            df = pd.DataFrame(input_data['instances'], columns=feature_names)
+            df = pd.DataFrame(input_data['instances'], columns=FEATURE_NAMES)
         else:
             # Single prediction - ensure correct feature extraction
-            features = []
-            for feature in feature_names:
-                if feature in input_data:
-                    features.append(input_data[feature])
-                else:
-                    # Default values for missing features
-                    if feature == 'weather_score':
-                        features.append(0.8)
-                    elif feature == 'customer_preparation':
-                        features.append(0.7)
-                    else:
-                        features.append(0)
-            
-            df = pd.DataFrame([features], columns=feature_names)
-            
+            df = pd.DataFrame([_row_from_mapping(input_data)], columns=FEATURE_NAMES)
+
         return df
+    elif content_type == CSV_CONTENT_TYPE:
+        return _chunked_frames(_iter_csv_rows(request_body))
+    elif content_type in NDJSON_CONTENT_TYPES:
+        return _chunked_frames(_iter_ndjson_rows(request_body))
     else:
         raise ValueError(f"Unsupported content type: {request_content_type}")
 
-def predict_fn(input_data, model):
-    """Make predictions with the RandomForest model"""
+def _record_drift(input_data, predictions):
+    """Feed features and predictions into this process's drift sketches"""
+    global _drift_monitor
+    if _drift_monitor is None:
+        from drift_monitor import DriftMonitor
+        _drift_monitor = DriftMonitor(FEATURE_NAMES, DRIFT_DIR, DRIFT_FLUSH_SECONDS)
+    _drift_monitor.record(np.asarray(input_data, dtype=np.float64), predictions)
+
+def _predict_frame(input_data, model):
+    """Predict a single DataFrame and derive per-row confidence"""
+    prediction = _score_frame(input_data, model)
+    if DRIFT_DIR:
+        try:
+            _record_drift(input_data, prediction['predictions'])
+        except Exception:
+            logger.exception("Drift monitoring failed")
+    return prediction
+
+def _score_frame(input_data, model):
+    if isinstance(model, CompiledForest):
+        # One vectorized pass yields both the mean and the spread across trees
+        tree_predictions = model.predict_trees(input_data)
+        predictions = tree_predictions.mean(axis=1)
+        confidence = 1 / (1 + np.std(tree_predictions, axis=1))
+        return {'predictions': predictions, 'confidence': confidence}
+
     predictions = model.predict(input_data)
-    
+
     # Calculate confidence scores based on prediction variance
     # For RandomForest, we can use the standard deviation of tree predictions
     if hasattr(model, 'estimators_'):
@@ -62,27 +516,131 @@ def predict_fn(input_data, model):
         confidence = 1 / (1 + std_dev)
     else:
         confidence = np.ones(len(predictions)) * 0.85  # Default confidence
-    
+
     return {'predictions': predictions, 'confidence': confidence}
 
+def _predict_stream(chunks, model, hot_swap=None):
+    for chunk in chunks:
+        prediction = _predict_frame(chunk, model)
+        if hot_swap is not None:
+            hot_swap.maybe_shadow(chunk, prediction['predictions'])
+        yield prediction
+
+def predict_fn(input_data, model):
+    """Make predictions with the RandomForest model
+
+    Streamed input (an iterator of DataFrame chunks from input_fn) yields one
+    prediction dict per chunk instead of materializing the whole batch.
+    """
+    hot_swap = None
+    if isinstance(model, HotSwapModel):
+        # Pin the live model for the whole request, even across a swap
+        hot_swap, model = model, model.current
+
+    if isinstance(input_data, (pd.DataFrame, np.ndarray)):
+        prediction = _predict_frame(input_data, model)
+        if hot_swap is not None:
+            hot_swap.maybe_shadow(input_data, prediction['predictions'])
+        return prediction
+    return _predict_stream(input_data, model, hot_swap)
+
+def _iter_prediction_chunks(prediction_output):
+    if isinstance(prediction_output, dict):
+        yield prediction_output
+    else:
+        yield from prediction_output
+
+def _iter_csv_output(prediction_output):
+    for chunk in _iter_prediction_chunks(prediction_output):
+        for prediction, confidence in zip(chunk['predictions'], chunk['confidence']):
+            yield f"{float(prediction)!r},{float(confidence)!r}\n"
+
+def _iter_ndjson_output(prediction_output):
+    for chunk in _iter_prediction_chunks(prediction_output):
+        for prediction, confidence in zip(chunk['predictions'].tolist(), chunk['confidence'].tolist()):
+            yield _dumps({
+                'predicted_hours': prediction,
+                'confidence_score': confidence
+            }).decode('utf-8') + '\n'
+
+def _iter_arrow_output(prediction_output, pa):
+    """Arrow IPC stream: the schema, then one record batch per chunk"""
+    schema = pa.schema([
+        ('predicted_hours', pa.float64()),
+        ('confidence_score', pa.float64())
+    ], metadata={'model_version': MODEL_VERSION})
+    sink = io.BytesIO()
+
+    def flush():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for chunk in _iter_prediction_chunks(prediction_output):
+            writer.write_batch(pa.record_batch([
+                pa.array(np.asarray(chunk['predictions'], dtype=np.float64)),
+                pa.array(np.asarray(chunk['confidence'], dtype=np.float64))
+            ], schema=schema))
+            yield flush()
+    # Closing the writer appends the end-of-stream marker
+    yield flush()
+
+def _response_body(prediction_output, as_lists=False):
+    """Single or batch response body for the JSON and MessagePack formats"""
+    if not isinstance(prediction_output, dict):
+        chunks = list(prediction_output)
+        prediction_output = {
+            'predictions': np.concatenate([c['predictions'] for c in chunks]) if chunks else np.array([]),
+            'confidence': np.concatenate([c['confidence'] for c in chunks]) if chunks else np.array([])
+        }
+
+    predictions = prediction_output['predictions']
+    confidence = prediction_output['confidence']
+
+    # Format for single or batch predictions
+    if len(predictions) == 1:
+        return {
+            'predicted_hours': float(predictions[0]),
+            'confidence_score': float(confidence[0]),
+            'model_version': MODEL_VERSION
+        }
+
+    predictions = np.ascontiguousarray(predictions, dtype=np.float64)
+    confidence = np.ascontiguousarray(confidence, dtype=np.float64)
+    return {
+        # msgpack has no NumPy support, orjson writes the arrays directly
+        'predictions': predictions.tolist() if as_lists else predictions,
+        'confidence_scores': confidence.tolist() if as_lists else confidence,
+        'model_version': MODEL_VERSION
+    }
+
 def output_fn(prediction_output, content_type):
-    """Format output for Nordflytt CRM integration"""
-    if content_type == 'application/json':
-        predictions = prediction_output['predictions']
-        confidence = prediction_output['confidence']
-        
-        # Format for single or batch predictions
-        if len(predictions) == 1:
-            return json.dumps({
-                'predicted_hours': float(predictions[0]),
-                'confidence_score': float(confidence[0]),
-                'model_version': 'v1.0-randomforest-nordflytt'
-            })
-        else:
-            return json.dumps({
-                'predictions': predictions.tolist(),
-                'confidence_scores': confidence.tolist(),
-                'model_version': 'v1.0-randomforest-nordflytt'
-            })
+    """Format output for Nordflytt CRM integration
+
+    JSON and MessagePack responses are returned as bytes. CSV and NDJSON
+    responses are returned as a generator of lines, one per row, and Arrow
+    IPC as a generator of record batches, so large batch results stream back
+    without being buffered.
+    """
+    accept = _base_content_type(content_type)
+
+    if accept == 'application/json':
+        return _dumps(_response_body(prediction_output))
+    elif accept in MSGPACK_CONTENT_TYPES:
+        if msgpack is None:
+            raise ValueError(f"Unsupported content type: {content_type} (msgpack is not installed)")
+        return msgpack.packb(_response_body(prediction_output, as_lists=True), use_bin_type=True)
+    elif accept == CSV_CONTENT_TYPE:
+        return _iter_csv_output(prediction_output)
+    elif accept in NDJSON_CONTENT_TYPES:
+        return _iter_ndjson_output(prediction_output)
+    elif accept == ARROW_STREAM_CONTENT_TYPE:
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ValueError(f"Unsupported content type: {content_type} (pyarrow is not installed)")
+        return _iter_arrow_output(prediction_output, pa)
     else:
         raise ValueError(f"Unsupported content type: {content_type}")
@@ -0,0 +1,84 @@
+"""
+Chunked readers and writers for job history exports
+Shared by the offline re-scoring CLI and the training pipeline so large
+CSV, Parquet or NDJSON exports are never loaded in one piece.
+"""
+
+import os
+
+import pandas as pd
+
+FORMATS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson'
+}
+
+def detect_format(path, override=None):
+    """Resolve the file format from an explicit override or the file extension"""
+    if override:
+        return override
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Cannot infer format from '{path}', pass --format")
+    return FORMATS[extension]
+
+def read_chunks(path, file_format=None, chunk_rows=10000):
+    """Yield DataFrame chunks from the export without loading it whole"""
+    file_format = detect_format(path, file_format)
+    if file_format == 'csv':
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+    elif file_format == 'ndjson':
+        yield from pd.read_json(path, lines=True, chunksize=chunk_rows)
+    elif file_format == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("❌ Parquet files require pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported format: {file_format}")
+
+class ChunkWriter:
+    """Append DataFrame chunks to CSV, NDJSON or Parquet output
+
+    schema is an empty DataFrame with the output columns; when no rows were
+    written, close() writes it so an empty input still yields a readable file.
+    """
+
+    def __init__(self, path, file_format=None, schema=None):
+        self.path = path
+        self.file_format = detect_format(path, file_format)
+        self.schema = schema
+        self._parquet_writer = None
+        self._first = True
+
+    def write(self, frame):
+        if self.file_format == 'csv':
+            frame.to_csv(self.path, mode='w' if self._first else 'a', header=self._first, index=False)
+        elif self.file_format == 'ndjson':
+            with open(self.path, 'w' if self._first else 'a') as f:
+                # Older pandas omit the trailing newline, newer ones add it
+                f.write(frame.to_json(orient='records', lines=True).rstrip('\n') + '\n')
+        elif self.file_format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        self._first = False
+
+    def close(self):
+        if self._first and self.schema is not None:
+            if self.file_format == 'ndjson':
+                # NDJSON has no header, an empty file is the empty result
+                open(self.path, 'w').close()
+                self._first = False
+            else:
+                self.write(self.schema.iloc[0:0])
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
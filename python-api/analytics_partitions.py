@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Monthly partition maintenance for gpt_analytics
+Creates the coming months' partitions ahead of time and retires months
+older than the retention period (migrations/009). Each expired partition is
+detached concurrently, so API writes and dashboard reads are not blocked.
+It is then archived as a gzipped CSV when an archive directory is set, and
+dropped unless --detach-only keeps the detached table. A partition still
+holding rows the hourly rollup has not folded in is left alone.
+
+Run it daily (cron or a scheduler).
+
+Usage:
+    NORDFLYTT_DATABASE_URL=postgresql://... python analytics_partitions.py status
+    python analytics_partitions.py maintain [--retention-months 12] [--archive-dir /var/lib/nordflytt/analytics]
+"""
+
+import argparse
+import gzip
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Optional
+
+from analytics_rollup import STATE_NAME
+from migrate import DATABASE_URL, Database, MigrationError, SQLiteDatabase
+
+logger = logging.getLogger(__name__)
+
+RETENTION_MONTHS = int(os.getenv("NORDFLYTT_ANALYTICS_RETENTION_MONTHS", "12"))
+MONTHS_AHEAD = int(os.getenv("NORDFLYTT_ANALYTICS_MONTHS_AHEAD", "3"))
+# Empty: expired partitions are dropped without an archive
+ARCHIVE_DIR = os.getenv("NORDFLYTT_ANALYTICS_ARCHIVE_DIR", "")
+
+class Partition(NamedTuple):
+    name: str
+    start: Optional[datetime]  # None for MINVALUE
+    end: Optional[datetime]  # None for MAXVALUE
+    detach_pending: bool
+    size_bytes: int
+    estimated_rows: int
+
+def _bound(value: str) -> Optional[datetime]:
+    value = value.strip()
+    if value in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+def partitions(database: Database) -> List[Partition]:
+    """gpt_analytics partitions in range order"""
+    if isinstance(database, SQLiteDatabase):
+        raise MigrationError("Partition maintenance needs Postgres")
+    rows = database.query("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), i.inhdetachpending,
+               pg_total_relation_size(c.oid), GREATEST(c.reltuples, 0)::BIGINT
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'public.gpt_analytics'::regclass
+    """)
+    found = []
+    for name, bound, detach_pending, size_bytes, estimated_rows in rows:
+        if "FROM (" not in bound:
+            continue  # a DEFAULT partition never expires
+        start, end = bound.split("FROM (", 1)[1].split(") TO (", 1)
+        found.append(Partition(name, _bound(start), _bound(end.rstrip(")")), detach_pending, size_bytes, estimated_rows))
+    return sorted(found, key=lambda p: p.start or datetime.min.replace(tzinfo=timezone.utc))
+
+def retention_cutoff(retention_months: int, now: Optional[datetime] = None) -> datetime:
+    """Start of the oldest month kept"""
+    now = now or datetime.now(timezone.utc)
+    months = now.year * 12 + now.month - 1 - retention_months
+    return datetime(months // 12, months % 12 + 1, 1, tzinfo=timezone.utc)
+
+def expired(found: List[Partition], retention_months: int, now: Optional[datetime] = None) -> List[Partition]:
+    cutoff = retention_cutoff(retention_months, now)
+    return [partition for partition in found if partition.end is not None and partition.end <= cutoff]
+
+def create_partitions(database: Database, months_ahead: int = MONTHS_AHEAD) -> List[str]:
+    return [row[0] for row in database.query("SELECT public.create_gpt_analytics_partitions(%s)", (months_ahead,))]
+
+def has_unrolled_rows(database: Database, partition: Partition) -> bool:
+    """Whether the partition holds rows past the hourly rollup's watermark"""
+    if database.query("SELECT to_regclass('public.gpt_analytics_rollup_state')")[0][0] is None:
+        return False
+    state = database.query(
+        "SELECT last_ingested_at, last_id FROM gpt_analytics_rollup_state WHERE name = %s", (STATE_NAME,)
+    )
+    if not state:
+        return False
+    return database.query(
+        f'SELECT EXISTS (SELECT 1 FROM public."{partition.name}" WHERE (ingested_at, id) > (%s, %s))', state[0]
+    )[0][0]
+
+def archive(database: Database, partition: Partition, archive_dir: str) -> str:
+    """Write the partition to archive_dir/<name>.csv.gz; returns the path"""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{partition.name}.csv.gz")
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, "wb") as f:
+        database.connection.cursor().copy_expert(
+            f'COPY public."{partition.name}" TO STDOUT WITH (FORMAT csv, HEADER)', f
+        )
+    os.replace(tmp_path, path)
+    return path
+
+def retire(database: Database, partition: Partition, archive_dir: str = ARCHIVE_DIR, drop: bool = True) -> Optional[str]:
+    """Detach, optionally archive, and drop one partition; returns the archive path
+
+    If archiving fails the detached table is kept, so no rows are lost.
+    """
+    if partition.detach_pending:
+        # An earlier DETACH ... CONCURRENTLY was interrupted
+        database.execute(f'ALTER TABLE public.gpt_analytics DETACH PARTITION public."{partition.name}" FINALIZE')
+    else:
+        database.execute(f'ALTER TABLE public.gpt_analytics DETACH PARTITION public."{partition.name}" CONCURRENTLY')
+    path = archive(database, partition, archive_dir) if archive_dir else None
+    if drop:
+        database.execute(f'DROP TABLE public."{partition.name}"')
+    return path
+
+def maintain(database: Database, retention_months: int = RETENTION_MONTHS, months_ahead: int = MONTHS_AHEAD,
+             archive_dir: str = ARCHIVE_DIR, drop: bool = True, dry_run: bool = False):
+    """Create upcoming partitions and retire expired ones; returns (created, retired, skipped) names"""
+    found = partitions(database)
+    created = [] if dry_run else create_partitions(database, months_ahead)
+    retired, skipped = [], []
+    for partition in expired(found, retention_months):
+        if has_unrolled_rows(database, partition):
+            logger.warning("Keeping %s: rows not rolled up yet (run analytics_rollup.py)", partition.name)
+            skipped.append(partition.name)
+            continue
+        if not dry_run:
+            path = retire(database, partition, archive_dir, drop)
+            logger.info("Retired %s%s", partition.name, f" (archived to {path})" if path else "")
+        retired.append(partition.name)
+    return created, retired, skipped
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Create and retire monthly gpt_analytics partitions")
+    parser.add_argument("command", choices=["status", "maintain"])
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    parser.add_argument("--retention-months", type=int, default=RETENTION_MONTHS)
+    parser.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD)
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR, help="Archive expired partitions here before dropping")
+    parser.add_argument("--detach-only", action="store_true", help="Keep expired partitions as detached tables")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("Set NORDFLYTT_DATABASE_URL or pass --database-url")
+
+    try:
+        database = Database.connect(args.database_url)
+        try:
+            if args.command == "status":
+                cutoff = retention_cutoff(args.retention_months)
+                for partition in partitions(database):
+                    start = partition.start.date() if partition.start else "MINVALUE"
+                    end = partition.end.date() if partition.end else "MAXVALUE"
+                    state = " (expired)" if partition.end is not None and partition.end <= cutoff else ""
+                    print(f"{partition.name}: {start} → {end}, ~{partition.estimated_rows} rows, "
+                          f"{partition.size_bytes / 1_048_576:.1f} MB{state}")
+            else:
+                created, retired, skipped = maintain(database, args.retention_months, args.months_ahead,
+                                                     args.archive_dir, not args.detach_only, args.dry_run)
+                print(f"✅ Created {len(created)} partitions, {'would retire' if args.dry_run else 'retired'} "
+                      f"{len(retired)}, kept {len(skipped)} not yet rolled up")
+        finally:
+            database.close()
+    except MigrationError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
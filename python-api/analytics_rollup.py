@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Incremental hourly rollup of gpt_analytics
+Folds the gpt_analytics rows ingested since the last run into
+gpt_api_metrics_hourly (migrations/006): per endpoint and hour, call and
+success counts, latency sum/min/max and a mergeable latency sketch. Each
+run reads only new rows, by an (ingested_at, id) watermark, and updates the
+watermark in the same transaction as the rollup, so every row is counted
+exactly once. Rows younger than ROLLUP_LAG_SECONDS are left for the next
+run, so a write still committing is not skipped.
+
+Run it every minute (cron or a scheduler). The rollup outlives the raw rows,
+so reports and percentiles keep working after old analytics are dropped.
+
+Usage:
+    NORDFLYTT_DATABASE_URL=postgresql://... python analytics_rollup.py
+    python analytics_rollup.py report --hours 24
+    python analytics_rollup.py rebuild --since 2025-01-01T00:00:00
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from migrate import DATABASE_URL, Database, MigrationError, SQLiteDatabase
+
+# drift_monitor.py lives at the repository root next to the training tooling
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+from drift_monitor import QuantileSketch  # noqa: E402
+
+ROLLUP_LAG_SECONDS = float(os.getenv("NORDFLYTT_ROLLUP_LAG_SECONDS", "30"))
+ROLLUP_BATCH_SIZE = int(os.getenv("NORDFLYTT_ROLLUP_BATCH_SIZE", "5000"))
+STATE_NAME = "gpt_api_metrics_hourly"
+QUANTILES = (0.5, 0.95, 0.99)
+
+COLUMNS = ("total_calls", "successful_calls", "latency_count", "latency_sum_ms",
+           "latency_min_ms", "latency_max_ms", "latency_sketch")
+
+class HourlyMetrics:
+    """Counts, latency extremes and a latency sketch; merges like the sketch does"""
+
+    def __init__(self):
+        self.total_calls = 0
+        self.successful_calls = 0
+        self.latency_count = 0
+        self.latency_sum_ms = 0
+        self.latency_min_ms: Optional[int] = None
+        self.latency_max_ms: Optional[int] = None
+        self.sketch = QuantileSketch()
+
+    @classmethod
+    def from_calls(cls, successes: List[bool], latencies: List[int]) -> "HourlyMetrics":
+        metrics = cls()
+        metrics.total_calls = len(successes)
+        metrics.successful_calls = sum(1 for success in successes if success)
+        if latencies:
+            metrics.latency_count = len(latencies)
+            metrics.latency_sum_ms = sum(latencies)
+            metrics.latency_min_ms = min(latencies)
+            metrics.latency_max_ms = max(latencies)
+            metrics.sketch.add(latencies)
+        return metrics
+
+    @classmethod
+    def from_row(cls, row: Tuple) -> "HourlyMetrics":
+        metrics = cls()
+        (metrics.total_calls, metrics.successful_calls, metrics.latency_count, metrics.latency_sum_ms,
+         metrics.latency_min_ms, metrics.latency_max_ms, sketch) = row
+        if sketch:
+            metrics.sketch = QuantileSketch.from_dict(json.loads(sketch) if isinstance(sketch, str) else sketch)
+        return metrics
+
+    def merge(self, other: "HourlyMetrics") -> "HourlyMetrics":
+        self.total_calls += other.total_calls
+        self.successful_calls += other.successful_calls
+        self.latency_count += other.latency_count
+        self.latency_sum_ms += other.latency_sum_ms
+        lows = [v for v in (self.latency_min_ms, other.latency_min_ms) if v is not None]
+        highs = [v for v in (self.latency_max_ms, other.latency_max_ms) if v is not None]
+        self.latency_min_ms = min(lows) if lows else None
+        self.latency_max_ms = max(highs) if highs else None
+        self.sketch.merge(other.sketch)
+        return self
+
+    def to_row(self) -> Tuple:
+        return (self.total_calls, self.successful_calls, self.latency_count, self.latency_sum_ms,
+                self.latency_min_ms, self.latency_max_ms, json.dumps(self.sketch.to_dict()))
+
+    def summary(self) -> Dict[str, Any]:
+        summary = {
+            "calls": self.total_calls,
+            "success_rate": round(100 * self.successful_calls / self.total_calls, 1) if self.total_calls else None,
+            "avg_response_time_ms": round(self.latency_sum_ms / self.latency_count, 1) if self.latency_count else None,
+            "min_response_time_ms": self.latency_min_ms,
+            "max_response_time_ms": self.latency_max_ms
+        }
+        for q in QUANTILES:
+            value = self.sketch.quantile(q)
+            summary[f"p{round(q * 100)}_response_time_ms"] = round(value, 1) if value is not None else None
+        return summary
+
+# Watermark bounds before the first and after the last possible row
+FIRST_ROW = ("-infinity", "00000000-0000-0000-0000-000000000000")
+LAST_ID = "ffffffff-ffff-ffff-ffff-ffffffffffff"
+
+def _dialect(database: Database) -> Dict[str, Any]:
+    if isinstance(database, SQLiteDatabase):
+        return {
+            "hour": "strftime('%Y-%m-%d %H:00:00', COALESCE(timestamp, ingested_at))",
+            "horizon": "SELECT datetime('now', '-' || %s)",
+            "since": "strftime('%Y-%m-%d %H:00:00', 'now', '-' || %s)",
+            "lock": "",
+            "first_row": ("", "")
+        }
+    return {
+        "hour": "date_trunc('hour', COALESCE(timestamp, ingested_at))",
+        "horizon": "SELECT NOW() - %s::interval",
+        "since": "date_trunc('hour', NOW() - %s::interval)",
+        "lock": " FOR UPDATE",
+        "first_row": FIRST_ROW
+    }
+
+def fold(rows: Iterable[Tuple]) -> Dict[Tuple[str, Any], HourlyMetrics]:
+    """Rollup of (endpoint, hour, success, response_time_ms) rows"""
+    calls: Dict[Tuple[str, Any], Tuple[List[bool], List[int]]] = {}
+    for endpoint, hour, success, response_time_ms in rows:
+        successes, latencies = calls.setdefault((endpoint, hour), ([], []))
+        successes.append(bool(success))
+        if response_time_ms is not None:
+            latencies.append(int(response_time_ms))
+    return {key: HourlyMetrics.from_calls(successes, latencies) for key, (successes, latencies) in calls.items()}
+
+def _state(database: Database) -> Tuple[Any, str]:
+    dialect = _dialect(database)
+    row = database.query(
+        f"SELECT last_ingested_at, last_id FROM gpt_analytics_rollup_state WHERE name = %s{dialect['lock']}",
+        (STATE_NAME,)
+    )
+    if not row:
+        raise MigrationError("gpt_analytics_rollup_state has no watermark; run python migrate.py up")
+    return row[0]
+
+def _new_rows(database: Database, after: Tuple[Any, str], until: Tuple[Any, str], batch_size: int,
+              since_hour: Optional[str] = None) -> List[Tuple]:
+    """Rows with after < (ingested_at, id) <= until, in watermark order"""
+    dialect = _dialect(database)
+    # On timestamp itself, so only the partitions from since_hour on are read
+    where = " AND timestamp >= %s" if since_hour else ""
+    return database.query(
+        f"SELECT endpoint, {dialect['hour']}, success, response_time_ms, ingested_at, id FROM gpt_analytics "
+        f"WHERE (ingested_at, id) > (%s, %s) AND (ingested_at, id) <= (%s, %s){where} "
+        f"ORDER BY ingested_at, id LIMIT %s",
+        tuple(after) + tuple(until) + ((since_hour,) if since_hour else ()) + (batch_size,)
+    )
+
+def _store(database: Database, rollup: Dict[Tuple[str, Any], HourlyMetrics], merge: bool = True):
+    dialect = _dialect(database)
+    for (endpoint, hour), metrics in rollup.items():
+        if merge:
+            existing = database.query(
+                f"SELECT {', '.join(COLUMNS)} FROM gpt_api_metrics_hourly WHERE endpoint = %s AND hour = %s{dialect['lock']}",
+                (endpoint, hour)
+            )
+            if existing:
+                metrics = HourlyMetrics.from_row(existing[0]).merge(metrics)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in COLUMNS)
+        database.execute(
+            f"INSERT INTO gpt_api_metrics_hourly (endpoint, hour, {', '.join(COLUMNS)}, updated_at) "
+            f"VALUES (%s, %s, {', '.join(['%s'] * len(COLUMNS))}, CURRENT_TIMESTAMP) "
+            f"ON CONFLICT (endpoint, hour) DO UPDATE SET {updates}, updated_at = excluded.updated_at",
+            (endpoint, hour) + metrics.to_row()
+        )
+
+def roll_up_batch(database: Database, lag: float = ROLLUP_LAG_SECONDS, batch_size: int = ROLLUP_BATCH_SIZE) -> int:
+    """Fold up to batch_size new rows in one transaction; returns the number folded"""
+    database.execute("BEGIN")
+    try:
+        # Locking the watermark also keeps two runs from folding the same rows
+        after = _state(database)
+        until = database.query(_dialect(database)["horizon"], (f"{lag} seconds",))[0][0]
+        rows = _new_rows(database, after, (until, LAST_ID), batch_size)
+        if rows:
+            _store(database, fold(row[:4] for row in rows))
+            database.execute(
+                "UPDATE gpt_analytics_rollup_state SET last_ingested_at = %s, last_id = %s, updated_at = CURRENT_TIMESTAMP "
+                "WHERE name = %s",
+                (rows[-1][4], rows[-1][5], STATE_NAME)
+            )
+        database.execute("COMMIT")
+    except Exception:
+        database.execute("ROLLBACK")
+        raise
+    return len(rows)
+
+def roll_up(database: Database, lag: float = ROLLUP_LAG_SECONDS, batch_size: int = ROLLUP_BATCH_SIZE) -> int:
+    """Fold every row ingested since the watermark (up to lag ago); returns the number folded"""
+    total = 0
+    while True:
+        folded = roll_up_batch(database, lag, batch_size)
+        total += folded
+        if folded < batch_size:
+            return total
+
+def rebuild(database: Database, since: datetime, batch_size: int = ROLLUP_BATCH_SIZE) -> int:
+    """Recompute the hours from since's hour up to the watermark from raw rows; returns rows read
+
+    Hours whose raw rows were already dropped by retention would come back
+    partial, so only rebuild hours still fully in gpt_analytics.
+    """
+    since_hour = since.replace(minute=0, second=0, microsecond=0).isoformat(sep=" ")
+    database.execute("BEGIN")
+    try:
+        # Rows past the watermark are left to the next run
+        until = _state(database)
+        after = _dialect(database)["first_row"]
+        rollup: Dict[Tuple[str, Any], HourlyMetrics] = {}
+        total = 0
+        while True:
+            rows = _new_rows(database, after, until, batch_size, since_hour)
+            for key, metrics in fold(row[:4] for row in rows).items():
+                rollup[key] = rollup[key].merge(metrics) if key in rollup else metrics
+            total += len(rows)
+            if len(rows) < batch_size:
+                break
+            after = (rows[-1][4], rows[-1][5])
+        database.execute("DELETE FROM gpt_api_metrics_hourly WHERE hour >= %s", (since_hour,))
+        _store(database, rollup, merge=False)
+        database.execute("COMMIT")
+    except Exception:
+        database.execute("ROLLBACK")
+        raise
+    return total
+
+def report(database: Database, hours: float = 24, endpoint: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Per-endpoint summary of the last hours, percentiles from the merged sketches"""
+    where = " AND endpoint = %s" if endpoint else ""
+    rows = database.query(
+        f"SELECT endpoint, {', '.join(COLUMNS)} FROM gpt_api_metrics_hourly "
+        f"WHERE hour >= {_dialect(database)['since']}{where} ORDER BY endpoint",
+        (f"{hours} hours",) + ((endpoint,) if endpoint else ())
+    )
+    merged: Dict[str, HourlyMetrics] = {}
+    for row in rows:
+        metrics = HourlyMetrics.from_row(row[1:])
+        merged[row[0]] = merged[row[0]].merge(metrics) if row[0] in merged else metrics
+    return {name: metrics.summary() for name, metrics in merged.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll gpt_analytics up into gpt_api_metrics_hourly")
+    parser.add_argument("command", nargs="?", choices=["run", "rebuild", "report"], default="run")
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    parser.add_argument("--lag", type=float, default=ROLLUP_LAG_SECONDS, help="Seconds to leave for in-flight writes")
+    parser.add_argument("--batch-size", type=int, default=ROLLUP_BATCH_SIZE)
+    parser.add_argument("--since", help="rebuild: first hour to recompute (ISO 8601)")
+    parser.add_argument("--hours", type=float, default=24, help="report: hours to cover")
+    parser.add_argument("--endpoint", help="report: one endpoint only")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("Set NORDFLYTT_DATABASE_URL or pass --database-url")
+    if args.command == "rebuild" and not args.since:
+        parser.error("rebuild needs --since")
+
+    try:
+        database = Database.connect(args.database_url)
+    except MigrationError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    try:
+        if args.command == "run":
+            folded = roll_up(database, args.lag, args.batch_size)
+            print(f"✅ Rolled up {folded} analytics rows in {(time.perf_counter() - started) * 1000:.0f} ms")
+        elif args.command == "rebuild":
+            read = rebuild(database, datetime.fromisoformat(args.since), args.batch_size)
+            print(f"✅ Rebuilt hours since {args.since} from {read} analytics rows")
+        else:
+            summaries = report(database, args.hours, args.endpoint)
+            print(f"📊 Last {args.hours:g} hours")
+            for name, summary in summaries.items():
+                print(f"{name}: " + ", ".join(f"{key} {value}" for key, value in summary.items()))
+    except MigrationError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        database.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: JSON vs MessagePack vs Arrow IPC response formats
+Measures payload size and client-side parse time for a calculate-price
+response and for batch inference output of increasing size, encoded exactly
+as the API (serialization.py) and inference.output_fn produce them.
+"""
+
+import json
+import os
+import sys
+import timeit
+
+import numpy as np
+
+from benchmark_serialization import PRICE_RESPONSE
+from serialization import MSGPACK_AVAILABLE, dumps
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inference  # noqa: E402
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+def per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+def parse_arrow(payload):
+    return pa.ipc.open_stream(payload).read_all()
+
+def bench_price_response():
+    print(f"\n{'calculate-price':>18} {'bytes':>8} {'parse µs':>10}")
+    payloads = {"json": dumps(PRICE_RESPONSE)}
+    if MSGPACK_AVAILABLE:
+        payloads["msgpack"] = msgpack.packb(PRICE_RESPONSE, use_bin_type=True)
+
+    for name, payload in payloads.items():
+        parse = json.loads if name == "json" else msgpack.unpackb
+        print(f"{name:>18} {len(payload):>8} {per_call_us(lambda: parse(payload), 20000):>10.2f}")
+
+def bench_batch_output():
+    print(f"\n{'batch rows':>10} {'format':>8} {'bytes':>11} {'vs json':>8} {'parse µs':>11} {'vs json':>8}")
+    rng = np.random.default_rng(0)
+    formats = [("json", "application/json", json.loads)]
+    if msgpack is not None:
+        formats.append(("msgpack", "application/msgpack", msgpack.unpackb))
+    if pa is not None:
+        formats.append(("arrow", inference.ARROW_STREAM_CONTENT_TYPE, parse_arrow))
+
+    for rows in (10, 1000, 10000, 100000):
+        prediction_output = {
+            "predictions": rng.uniform(3, 12, rows),
+            "confidence": rng.uniform(0.6, 1.0, rows)
+        }
+        number = max(5, 200000 // rows)
+        baseline = None
+
+        for name, content_type, parse in formats:
+            payload = inference.output_fn(prediction_output, content_type)
+            if not isinstance(payload, bytes):
+                payload = b"".join(payload)
+            parse_us = per_call_us(lambda: parse(payload), number)
+            baseline = baseline or (len(payload), parse_us)
+            print(f"{rows:>10} {name:>8} {len(payload):>11} {len(payload) / baseline[0]:>7.2f}x "
+                  f"{parse_us:>11.1f} {parse_us / baseline[1]:>7.2f}x")
+
+if __name__ == "__main__":
+    print("⏱️  Response format microbenchmark")
+    print(f"msgpack available: {msgpack is not None}, pyarrow available: {pa is not None}")
+    bench_price_response()
+    bench_batch_output()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: per-request logging overhead on the handler thread
+Compares the old synchronous logger.info(f"... {data.dict()}") with
+structured_logging.log_request at INFO, with route sampling, and with the
+level turned off. Output goes to /dev/null so only the caller-side cost is
+measured (for the queued variants that is level check, sampling and enqueue).
+"""
+
+import logging
+import os
+import timeit
+import warnings
+
+import structured_logging
+from main import CalculatePriceRequest, CreateTicketRequest
+
+PRICE_REQUEST = CalculatePriceRequest(
+    volume_m3=25, floors_from=4, floors_to=2, elevator_from="none", elevator_to="yes",
+    additional_services=["packing", "cleaning"], distance_km=30
+)
+TICKET_REQUEST = CreateTicketRequest(
+    customer_email="anna.svensson@example.com", issue_type="damage_claim",
+    description="Soffan fick en reva under flytten, ring mig på 070-123 45 67", booking_reference="BK-2024-001234"
+)
+
+def per_call_us(func, number=20000):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+def reset_root(handler, level):
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+def bench(name, data):
+    logger = logging.getLogger("benchmark")
+    devnull = open(os.devnull, "w")
+    route = "/gpt-rag/benchmark"
+
+    # Before: basicConfig-style handler formatting on the calling thread
+    warnings.filterwarnings("ignore", message=".*`dict` method is deprecated")
+    sync_handler = logging.StreamHandler(devnull)
+    sync_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    reset_root(sync_handler, logging.INFO)
+    before = per_call_us(lambda: logger.info(f"{name} request: {data.dict()}"))
+
+    queued_handler = structured_logging.DroppingQueueHandler(structured_logging.queue.Queue())
+    reset_root(queued_handler, logging.INFO)
+
+    def drain():
+        while not queued_handler.queue.empty():
+            queued_handler.queue.get_nowait()
+
+    results = {"before (sync f-string)": before}
+    results["queued, INFO"] = per_call_us(lambda: structured_logging.log_request(logger, route, f"{name} request", data))
+    drain()
+
+    structured_logging.SAMPLE_RATES[route] = 0.1
+    results["queued, 10% sampled"] = per_call_us(lambda: structured_logging.log_request(logger, route, f"{name} request", data))
+    del structured_logging.SAMPLE_RATES[route]
+    drain()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    results["level off"] = per_call_us(lambda: structured_logging.log_request(logger, route, f"{name} request", data))
+
+    # What the writer thread spends per record, off the request path
+    formatter = structured_logging.JSONLineFormatter()
+    record = logger.makeRecord("benchmark", logging.INFO, __file__, 0, f"{name} request", None, None,
+                               extra={"route": route, "fields": data})
+    results["writer thread format"] = per_call_us(lambda: formatter.format(record), 5000)
+
+    print(f"\n{name}")
+    for label, us in results.items():
+        print(f"{label:>24} {us:>8.3f} µs")
+    print(f"{'sample output':>24} {formatter.format(record)}")
+    devnull.close()
+
+if __name__ == "__main__":
+    print("⏱️  Logging overhead microbenchmark")
+    bench("Price calculation", PRICE_REQUEST)
+    bench("Create ticket", TICKET_REQUEST)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: knowledge-base search latency
+Builds the BM25 index over the real knowledge base plus synthetic passages
+(words drawn Zipf-style from the knowledge-base vocabulary) and reports
+build, save and reload time and per-query latency at several corpus sizes.
+
+The vector part times the embedder, then compares brute-force float32
+search with int8 and IVF search on clustered unit vectors: latency and
+recall@10 against the float32 brute-force results. Last, hybrid retrieval
+over the real knowledge base, with and without the result cache.
+"""
+
+import os
+import random
+import tempfile
+import time
+import timeit
+
+import numpy as np
+
+import knowledge_base
+import vector_index
+from knowledge_base import Passage
+from retrieval import Retriever
+from search_index import BM25Index
+from vector_index import VectorIndex
+
+QUERIES = [
+    "Vad kostar det att avboka flytten?",
+    "trappor utan hiss",
+    "hur fungerar rut-avdrag",
+    "min soffa skadades under flytten",
+    "rabatt för stora flyttar",
+    "kan jag boka om till en annan dag"
+]
+
+def synthetic_corpus(size, seed=7):
+    """The real passages plus synthetic ones up to size"""
+    passages = knowledge_base.load_passages()
+    words = " ".join(knowledge_base.passage_text(passage) for passage in passages).split()
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    while len(passages) < size:
+        text = " ".join(rng.choices(words, weights, k=rng.randint(40, 160)))
+        passages.append(Passage(f"synthetic#{len(passages)}", "synthetic.md", "Syntetisk", "", text))
+    return passages
+
+def per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+def bench_sizes(sizes):
+    print(f"\n{'passages':>9} {'build ms':>9} {'save ms':>8} {'load ms':>8} {'query µs':>9} {'worst µs':>9}")
+    for size in sizes:
+        passages = synthetic_corpus(size)
+        started = time.perf_counter()
+        index = BM25Index(passages)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bm25.pkl")
+            started = time.perf_counter()
+            index.save(path)
+            save_ms = (time.perf_counter() - started) * 1000
+            started = time.perf_counter()
+            BM25Index.load(path)
+            load_ms = (time.perf_counter() - started) * 1000
+
+        latencies = [per_call_us(lambda: index.search(query, 5), 200) for query in QUERIES]
+        print(f"{size:>9} {build_ms:>9.1f} {save_ms:>8.1f} {load_ms:>8.1f} "
+              f"{sum(latencies) / len(latencies):>9.1f} {max(latencies):>9.1f}")
+
+def clustered_vectors(size, dim, clusters=200, seed=7):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=size)] + 2.0 * rng.standard_normal((size, dim)).astype(np.float32)
+    return vector_index.normalize(vectors)
+
+def vector_variants(vectors):
+    """Brute float32, brute int8 and IVF (float32) indexes over the same vectors"""
+    passages = [Passage(str(i), "synthetic.md", "", "", "") for i in range(len(vectors))]
+    hashes = [""] * len(vectors)
+    codes, scales = vector_index.quantize(vectors)
+    started = time.perf_counter()
+    centroids = vector_index.train_ivf(vectors, int(np.sqrt(len(vectors))))
+    order, offsets = vector_index.assign_lists(vectors, centroids)
+    train_ms = (time.perf_counter() - started) * 1000
+    return train_ms, {
+        "float32": VectorIndex(passages, hashes, vectors),
+        "int8": VectorIndex(passages, hashes, codes, scales),
+        "ivf": VectorIndex(passages, hashes, vectors, None, centroids, order, offsets)
+    }
+
+def bench_embedder(size=1000):
+    texts = [knowledge_base.passage_text(passage) for passage in synthetic_corpus(size)]
+    embed = vector_index.load_embedder()
+    started = time.perf_counter()
+    embed(texts)
+    per_passage = (time.perf_counter() - started) / size * 1e6
+    query_us = per_call_us(lambda: embed([QUERIES[0]]), 200)
+    print(f"\n{vector_index.EMBEDDER}: {per_passage:.0f} µs per passage, {query_us:.0f} µs per query")
+
+def bench_vectors(sizes, dim=vector_index.HASHING_DIM, queries=50):
+    print(f"\n{'vectors':>9} {'variant':>10} {'query µs':>9} {'recall@10':>10}")
+    for size in sizes:
+        # Queries come from the same clusters as the passages
+        vectors = clustered_vectors(size + queries, dim)
+        vectors, probes = vectors[:size], vectors[size:]
+        train_ms, variants = vector_variants(vectors)
+        truth = [set(variants["float32"].search_vector(q, 10)[0]) for q in probes]
+
+        runs = [(name, {}) for name in variants] + [("ivf", {"nprobe": nprobe}) for nprobe in (4, 16, 32)]
+        for name, options in runs:
+            index = variants[name]
+            latency = per_call_us(lambda: [index.search_vector(q, 10, **options) for q in probes], 5) / queries
+            recall = np.mean([len(truth[i] & set(index.search_vector(q, 10, **options)[0])) / 10
+                              for i, q in enumerate(probes)])
+            label = f"{name}/{options['nprobe']}" if options else name
+            print(f"{size:>9} {label:>10} {latency:>9.1f} {recall:>10.3f}")
+        print(f"{size:>9} IVF training and assignment: {train_ms:.0f} ms")
+
+def bench_hybrid():
+    passages = knowledge_base.load_passages()
+    retriever = Retriever(BM25Index(passages), VectorIndex.build(passages))
+    print(f"\n{'mode':>9} {'uncached µs':>12} {'cached µs':>10}")
+    for mode in ("keyword", "semantic", "hybrid"):
+        uncached = sum(per_call_us(lambda: retriever.search(query, 5, mode, use_cache=False), 200) for query in QUERIES)
+        cached = sum(per_call_us(lambda: retriever.search(query, 5, mode), 2000) for query in QUERIES)
+        print(f"{mode:>9} {uncached / len(QUERIES):>12.1f} {cached / len(QUERIES):>10.1f}")
+
+if __name__ == "__main__":
+    print("⏱️  Knowledge search microbenchmark")
+    bench_sizes([1000, 5000, 20000])
+    bench_embedder()
+    bench_vectors([10000, 100000])
+    bench_hybrid()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: standard-library JSON vs the fast serialization path
+Compares FastAPI's default JSONResponse with FastJSONResponse on typical GPT
+RAG API responses, and json.dumps(.tolist()) with orjson's native NumPy
+support on batch inference output.
+"""
+
+import json
+import timeit
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+from serialization import FAST_JSON_AVAILABLE, FastJSONResponse, dumps
+
+PRICE_RESPONSE = {
+    "price_calculated": True,
+    "pricing_data": {
+        "total_price": 8291,
+        "volume_discount": "15% rabatt för 20-29 m³",
+        "savings_explanation": "Du sparar 1243 kr tack vare 15% rabatt för 20-29 m³ och 4694 kr med RUT-avdrag"
+    },
+    "price_breakdown": {
+        "personnel_cost": 4694,
+        "truck_cost": 2347,
+        "stairs_fee": 500,
+        "additional_services": ["Packning (3h): 750 kr", "Flyttstädning: 1200 kr"],
+        "subtotal": 8291,
+        "discount_amount": 1243,
+        "rut_savings": 4694,
+        "estimated_hours": 6.4,
+        "time_estimate_source": "model"
+    },
+    "suggested_response": "Din flytt kostar 7048 kr inklusive allt med 15% rabatt för 20-29 m³. Detta inkluderar packning."
+}
+
+BOOKING_RESPONSE = {
+    "booking_found": True,
+    "booking_data": {
+        "booking_id": "12345678-1234-1234-1234-123456789012",
+        "reference_number": "BK-2024-001234",
+        "date": "2024-12-15",
+        "services": ["flytt", "packning", "städning"],
+        "total_amount": 8500,
+        "status": "completed",
+        "packed_by_nordflytt": True,
+        "photos_available": True,
+        "from_address": "Vasagatan 10, Stockholm",
+        "to_address": "Östermalm 25, Stockholm",
+        "volume_m3": 25
+    },
+    "service_context": {"has_packing_service": True, "has_cleaning": True, "has_boxes": False, "has_storage": False},
+    "additional_info": {"can_modify": False, "can_cancel": False, "invoice_sent": True, "payment_status": "paid"}
+}
+
+def per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+def bench_responses():
+    print(f"\n{'response':>18} {'JSONResponse µs':>16} {'Fast µs':>9} {'speedup':>8}")
+    for name, content in (("calculate-price", PRICE_RESPONSE), ("booking-details", BOOKING_RESPONSE)):
+        baseline = per_call_us(lambda: JSONResponse(content), 20000)
+        fast = per_call_us(lambda: FastJSONResponse(content), 20000)
+        print(f"{name:>18} {baseline:>16.2f} {fast:>9.2f} {baseline / fast:>7.1f}x")
+
+def bench_batch_output():
+    print(f"\n{'batch rows':>18} {'json+tolist µs':>16} {'Fast µs':>9} {'speedup':>8}")
+    rng = np.random.default_rng(0)
+    for rows in (10, 1000, 10000, 100000):
+        predictions = rng.uniform(3, 12, rows)
+        confidence = rng.uniform(0.6, 1.0, rows)
+        number = max(5, 200000 // rows)
+
+        def baseline():
+            return json.dumps({
+                "predictions": predictions.tolist(),
+                "confidence_scores": confidence.tolist(),
+                "model_version": "v1.0-randomforest-nordflytt"
+            })
+
+        def fast():
+            return dumps({
+                "predictions": predictions,
+                "confidence_scores": confidence,
+                "model_version": "v1.0-randomforest-nordflytt"
+            })
+
+        baseline_us = per_call_us(baseline, number)
+        fast_us = per_call_us(fast, number)
+        print(f"{rows:>18} {baseline_us:>16.1f} {fast_us:>9.1f} {baseline_us / fast_us:>7.1f}x")
+
+if __name__ == "__main__":
+    print("⏱️  Serialization microbenchmark")
+    print(f"orjson available: {FAST_JSON_AVAILABLE}")
+    bench_responses()
+    bench_batch_output()
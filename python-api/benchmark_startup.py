@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: import-time profile and cold start of the API
+Profiles `import main` with python -X importtime (top modules by cumulative
+time, optionally failing over an import budget) and measures cold start:
+seconds from launching the server until /health answers, plus the memory of
+all server processes, for uvicorn --workers and for gunicorn with the
+preloading master in gunicorn.conf.py.
+
+Usage:
+    python benchmark_startup.py --budget-ms 400
+    python benchmark_startup.py --servers uvicorn,gunicorn --workers 4 --model-dir model
+"""
+
+import argparse
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def import_profile(top):
+    """(total µs, [(cumulative µs, module)]) for the top-level imports of main"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=API_DIR,
+                            capture_output=True, text=True, env={**os.environ, "NORDFLYTT_LOG_LEVEL": "WARNING"})
+    entries = []
+    total = 0
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative, depth, module = int(match.group(2)), len(match.group(3)), match.group(4)
+        # Children are listed before their parent, so keep the second level
+        # since the last top-level import and stop at main itself
+        if depth == 1:
+            if module == "main":
+                total = cumulative
+                break
+            entries = []
+        elif depth == 3:
+            entries.append((cumulative, module))
+    return total, sorted(entries, reverse=True)[:top]
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def server_command(server, port, workers):
+    if server == "gunicorn":
+        return [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.conf.py",
+                "--bind", f"127.0.0.1:{port}", "--workers", str(workers)]
+    return [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning"]
+
+def process_tree(pid):
+    pids = [pid]
+    for child in pids:
+        try:
+            with open(f"/proc/{child}/task/{child}/children") as f:
+                pids.extend(int(value) for value in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+def memory_mb(pid):
+    """(PSS, RSS) in MB summed over the server's processes (Linux only)"""
+    pss = rss = 0
+    for child in process_tree(pid):
+        try:
+            with open(f"/proc/{child}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        pss += int(line.split()[1])
+                    elif line.startswith("Rss:"):
+                        rss += int(line.split()[1])
+        except OSError:
+            return None, None
+    return pss / 1024, rss / 1024
+
+def cold_start(server, workers, model_dir=None, timeout=60):
+    port = free_port()
+    env = {**os.environ, "NORDFLYTT_LOG_LEVEL": "WARNING", "NORDFLYTT_WORKERS": str(workers)}
+    if model_dir:
+        env["NORDFLYTT_MODEL_DIR"] = model_dir
+    started = time.perf_counter()
+    process = subprocess.Popen(server_command(server, port, workers), cwd=API_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"{server} exited with {process.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        ready = time.perf_counter() - started
+                        # Let the remaining workers finish booting before measuring memory
+                        time.sleep(2)
+                        return ready, memory_mb(process.pid)
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError(f"{server} not healthy after {timeout}s")
+    finally:
+        process.terminate()
+        process.wait(10)
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile imports and measure API cold start")
+    parser.add_argument("--servers", default="uvicorn,gunicorn", help="uvicorn and/or gunicorn")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--model-dir", help="Time-estimation model to load in each worker")
+    parser.add_argument("--top", type=int, default=15, help="Modules to list in the import profile")
+    parser.add_argument("--budget-ms", type=float, help="Fail if `import main` takes longer")
+    args = parser.parse_args()
+
+    print("⏱️  API startup benchmark")
+    total, entries = import_profile(args.top)
+    print(f"\n📦 import main: {total / 1000:.1f} ms")
+    for cumulative, module in entries:
+        print(f"{cumulative / 1000:>10.1f} ms  {module}")
+
+    print(f"\n{'server':>10} {'workers':>8} {'ready s':>8} {'PSS MB':>8} {'RSS MB':>8}")
+    for server in args.servers.split(","):
+        for _ in range(args.runs):
+            ready, (pss, rss) = cold_start(server, args.workers, args.model_dir)
+            memory = f"{pss:>8.1f} {rss:>8.1f}" if pss is not None else f"{'-':>8} {'-':>8}"
+            print(f"{server:>10} {args.workers:>8} {ready:>8.2f} {memory}")
+
+    if args.budget_ms is not None and total / 1000 > args.budget_ms:
+        print(f"\n❌ import main took {total / 1000:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: request validation cost per model
+Compares FastAPI's default body handling (json.loads into a dict, then
+validate the dict) with validating the raw bytes in one pass
+(model_validate_json, and a cached TypeAdapter for batch bodies).
+"""
+
+import json
+import timeit
+
+from main import BookingDetailsRequest, CalculatePriceRequest, CreateTicketRequest, CustomerLookupRequest
+from request_validation import list_adapter
+
+BODIES = {
+    CustomerLookupRequest: {"email": "anna.svensson@gmail.com", "query_context": "Jag har en fråga om min flytt"},
+    BookingDetailsRequest: {"customer_email": "anna.svensson@gmail.com", "booking_date": "2024-12-15"},
+    CreateTicketRequest: {
+        "customer_email": "anna.svensson@gmail.com",
+        "issue_type": "damage_claim",
+        "description": "Min soffa fick en reva under flytten. Den var packad av er personal och skadan upptäcktes vid uppackning.",
+        "priority": "high",
+        "booking_reference": "BK-2024-001234"
+    },
+    CalculatePriceRequest: {
+        "volume_m3": 25, "floors_from": 4, "floors_to": 2, "elevator_from": "none",
+        "elevator_to": "yes", "additional_services": ["packing", "cleaning"], "distance_km": 30
+    }
+}
+
+def per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+def bench_models():
+    print(f"\n{'model':>24} {'dict path µs':>13} {'bytes µs':>9} {'speedup':>8}")
+    for model, body in BODIES.items():
+        raw = json.dumps(body).encode("utf-8")
+        # Both paths must agree before timing them
+        assert model.model_validate(json.loads(raw)) == model.model_validate_json(raw)
+
+        baseline = per_call_us(lambda: model.model_validate(json.loads(raw)), 20000)
+        fast = per_call_us(lambda: model.model_validate_json(raw), 20000)
+        print(f"{model.__name__:>24} {baseline:>13.2f} {fast:>9.2f} {baseline / fast:>7.1f}x")
+
+def bench_batches():
+    print(f"\n{'batch size':>24} {'dict path µs':>13} {'bytes µs':>9} {'speedup':>8}")
+    adapter = list_adapter(CalculatePriceRequest)
+    for size in (10, 100, 1000):
+        raw = json.dumps([BODIES[CalculatePriceRequest]] * size).encode("utf-8")
+        number = max(20, 20000 // size)
+
+        baseline = per_call_us(lambda: [CalculatePriceRequest.model_validate(item) for item in json.loads(raw)], number)
+        fast = per_call_us(lambda: adapter.validate_json(raw), number)
+        print(f"{size:>24} {baseline:>13.1f} {fast:>9.1f} {baseline / fast:>7.1f}x")
+
+if __name__ == "__main__":
+    print("⏱️  Request validation microbenchmark")
+    bench_models()
+    bench_batches()
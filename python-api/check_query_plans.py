@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Query-plan check for the SQL the API issues
+Runs EXPLAIN on the SQL equivalent of every PostgREST query in main.py and
+the background loaders, and fails when one reads a table with a sequential
+scan. Planning runs with enable_seqscan off, so tiny development tables do
+not hide a missing index: a Seq Scan then means no index can serve the
+query at all. Against SQLite (sqlite:///path.db) EXPLAIN QUERY PLAN is used
+and a "SCAN table" without an index counts as a sequential scan.
+
+Keep HOT_QUERIES in step with the queries in main.py when adding endpoints.
+
+Usage:
+    NORDFLYTT_DATABASE_URL=postgresql://... python check_query_plans.py
+    python check_query_plans.py --database-url sqlite:///local.db
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, List, NamedTuple, Tuple
+
+from customer_context import JOB_COLUMNS, PAGE_SIZE, TICKET_COLUMNS
+from migrate import DATABASE_URL, Database, MigrationError, SQLiteDatabase
+
+class HotQuery(NamedTuple):
+    name: str
+    sql: str
+    params: Tuple
+    # Queries that read the whole table on purpose
+    allow_seq_scan: bool = False
+
+HOT_QUERIES = [
+    HotQuery("customer-lookup: customer", "SELECT * FROM customers WHERE email = %s", ("anna.svensson@gmail.com",)),
+    HotQuery("customer-lookup: bookings",
+             "SELECT * FROM jobs WHERE customer_email = %s ORDER BY date DESC", ("anna.svensson@gmail.com",)),
+    HotQuery("booking-details: by reference",
+             "SELECT * FROM jobs WHERE reference_number = %s ORDER BY date DESC LIMIT 1", ("BK-2024-001234",)),
+    HotQuery("booking-details: by e-mail",
+             "SELECT * FROM jobs WHERE customer_email = %s ORDER BY date DESC LIMIT 1", ("anna.svensson@gmail.com",)),
+    HotQuery("booking-details: by e-mail and date",
+             "SELECT * FROM jobs WHERE customer_email = %s AND date = %s ORDER BY date DESC LIMIT 1",
+             ("anna.svensson@gmail.com", "2024-12-15")),
+    HotQuery("create-ticket: link duplicate",
+             "UPDATE support_tickets SET updated_at = %s WHERE ticket_number = %s",
+             ("2025-01-01T00:00:00", "NF-2025-1234")),
+    HotQuery("customer context: changed tickets",
+             f"SELECT {TICKET_COLUMNS} FROM support_tickets WHERE updated_at >= %s ORDER BY updated_at, id LIMIT {PAGE_SIZE}",
+             ("2025-01-01T00:00:00",)),
+    HotQuery("customer context: next tickets page",
+             f"SELECT {TICKET_COLUMNS} FROM support_tickets WHERE updated_at > %s OR (updated_at = %s AND id > %s) "
+             f"ORDER BY updated_at, id LIMIT {PAGE_SIZE}",
+             ("2025-01-01T00:00:00", "2025-01-01T00:00:00", "00000000-0000-0000-0000-000000000000")),
+    HotQuery("customer context: changed jobs",
+             f"SELECT {JOB_COLUMNS} FROM jobs WHERE updated_at >= %s ORDER BY updated_at, id LIMIT {PAGE_SIZE}",
+             ("2025-01-01T00:00:00",)),
+    HotQuery("analytics rollup: new rows",
+             "SELECT endpoint, success, response_time_ms, ingested_at, id FROM gpt_analytics "
+             "WHERE (ingested_at, id) > (%s, %s) AND (ingested_at, id) <= (%s, %s) ORDER BY ingested_at, id LIMIT 5000",
+             ("2025-01-01T00:00:00", "00000000-0000-0000-0000-000000000000",
+              "2025-01-01T01:00:00", "ffffffff-ffff-ffff-ffff-ffffffffffff")),
+    HotQuery("warmup: known e-mails",
+             f"SELECT id, email, created_at FROM customers WHERE id > %s ORDER BY id LIMIT {PAGE_SIZE}",
+             ("00000000-0000-0000-0000-000000000000",)),
+    HotQuery("warmup: new customers",
+             f"SELECT id, email, created_at FROM customers WHERE created_at > %s OR (created_at = %s AND id > %s) "
+             f"ORDER BY created_at, id LIMIT {PAGE_SIZE}",
+             ("2025-01-01T00:00:00", "2025-01-01T00:00:00", "00000000-0000-0000-0000-000000000000")),
+    HotQuery("warmup: open connections", "SELECT * FROM jobs LIMIT 1", (), allow_seq_scan=True),
+]
+
+def plan_nodes(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+def explain(database: Database, query: HotQuery) -> Tuple[List[str], List[str]]:
+    """(tables read by a sequential scan, indexes used)"""
+    if isinstance(database, SQLiteDatabase):
+        details = [row[3] for row in database.query(f"EXPLAIN QUERY PLAN {query.sql}", query.params)]
+        seq_scans = [detail.split()[1] for detail in details if detail.startswith("SCAN ") and " INDEX " not in detail]
+        indexes = [detail.split(" INDEX ")[1].split()[0] for detail in details if " INDEX " in detail]
+        return seq_scans, indexes
+
+    plan = database.query(f"EXPLAIN (FORMAT JSON) {query.sql}", query.params)[0][0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes = list(plan_nodes(plan[0]["Plan"]))
+    seq_scans = [node["Relation Name"] for node in nodes if node["Node Type"] == "Seq Scan"]
+    indexes = [node["Index Name"] for node in nodes if "Index Name" in node]
+    return seq_scans, indexes
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail when an API query plans a sequential scan")
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    parser.add_argument("--planner-default", action="store_true",
+                        help="Keep enable_seqscan on (plans as production would for the current table sizes)")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("Set NORDFLYTT_DATABASE_URL or pass --database-url")
+
+    try:
+        database = Database.connect(args.database_url)
+    except MigrationError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    if not args.planner_default and not isinstance(database, SQLiteDatabase):
+        database.execute("SET enable_seqscan = off")
+
+    print("🔍 Query plan check")
+    failures = 0
+    try:
+        for query in HOT_QUERIES:
+            try:
+                seq_scans, indexes = explain(database, query)
+            except Exception as e:
+                failures += 1
+                print(f"❌ {query.name}: EXPLAIN failed: {str(e).strip()}")
+                continue
+            if seq_scans and not query.allow_seq_scan:
+                failures += 1
+                print(f"❌ {query.name}: sequential scan on {', '.join(seq_scans)}")
+            else:
+                print(f"✅ {query.name}: {', '.join(indexes) or 'sequential scan (allowed)'}")
+    finally:
+        database.close()
+
+    if failures:
+        print(f"\n{failures} of {len(HOT_QUERIES)} queries need an index (see migrations/)")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -53,6 +53,7 @@ CREATE INDEX idx_support_tickets_created_at ON support_tickets(created_at DESC);
 """
 
 # SQL for creating gpt_analytics table
+# (partitioned by month by migrations/009_partition_gpt_analytics.sql)
 CREATE_GPT_ANALYTICS_SQL = """
 CREATE TABLE IF NOT EXISTS gpt_analytics (
     id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
@@ -73,6 +74,7 @@ CREATE INDEX idx_gpt_analytics_timestamp ON gpt_analytics(timestamp DESC);
 CREATE INDEX idx_gpt_analytics_customer_email ON gpt_analytics(customer_email);
 
 -- Create view for metrics
+-- (re-pointed at the incremental hourly rollup by migrations/006_gpt_api_metrics_rollup.sql)
 CREATE OR REPLACE VIEW gpt_api_metrics AS
 SELECT 
     endpoint,
@@ -104,6 +106,7 @@ ADD COLUMN IF NOT EXISTS special_requirements TEXT,
 ADD COLUMN IF NOT EXISTS ai_notes JSONB DEFAULT '{}';
 
 -- Create function to update VIP status
+-- (replaced by delta-based triggers in migrations/005_delta_vip_status.sql)
 CREATE OR REPLACE FUNCTION update_customer_vip_status()
 RETURNS TRIGGER AS $$
 BEGIN
@@ -150,20 +153,23 @@ def create_tables():
         print("\n-- 3. Update existing tables")
         print(UPDATE_EXISTING_TABLES_SQL)
         
-        # Create migration files
+        # Create migration files (never overwritten: migrate.py checksums applied files)
         os.makedirs("python-api/migrations", exist_ok=True)
         
-        with open("python-api/migrations/001_create_support_tickets.sql", "w") as f:
-            f.write(CREATE_SUPPORT_TICKETS_SQL)
+        migration_files = {
+            "python-api/migrations/001_create_support_tickets.sql": CREATE_SUPPORT_TICKETS_SQL,
+            "python-api/migrations/002_create_gpt_analytics.sql": CREATE_GPT_ANALYTICS_SQL,
+            "python-api/migrations/003_update_existing_tables.sql": UPDATE_EXISTING_TABLES_SQL
+        }
+        for path, sql in migration_files.items():
+            if os.path.exists(path):
+                logger.info(f"Keeping existing {path}")
+                continue
+            with open(path, "w") as f:
+                f.write(sql)
         
-        with open("python-api/migrations/002_create_gpt_analytics.sql", "w") as f:
-            f.write(CREATE_GPT_ANALYTICS_SQL)
-        
-        with open("python-api/migrations/003_update_existing_tables.sql", "w") as f:
-            f.write(UPDATE_EXISTING_TABLES_SQL)
-        
-        logger.info("\nMigration files created in python-api/migrations/")
-        logger.info("Run these in order in your Supabase SQL editor.")
+        logger.info("\nMigration files are in python-api/migrations/")
+        logger.info("Apply them with: python python-api/migrate.py up")
         
     except Exception as e:
         logger.error(f"Error creating tables: {str(e)}")
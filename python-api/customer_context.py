@@ -0,0 +1,258 @@
+"""
+Per-customer index of ticket and booking text
+Holds, per customer e-mail, the text of their support tickets
+(support_tickets.description) and bookings (jobs.ai_notes and
+special_requirements), stemmed once when an entry is added. A context
+request is one dictionary lookup by e-mail plus ranking that customer's few
+entries against the conversation, instead of scanning support_tickets and
+jobs on every call.
+
+The index is loaded page by page (keyset pagination on updated_at, id)
+during warmup and then kept current incrementally: create_ticket adds its
+ticket directly, and a refresher thread pulls rows whose updated_at is past
+the last one seen. Each worker holds its own index, so a ticket created
+through another worker shows up after at most CONTEXT_REFRESH_SECONDS. Only
+rows changed within CONTEXT_MAX_AGE_DAYS are loaded and older entries are
+pruned on refresh, which bounds the memory every worker spends on it.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from search_index import tokenize
+from warmup import normalize_email
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000  # PostgREST's default max rows per request
+# Oldest entries are dropped beyond this, per customer
+MAX_ENTRIES_PER_CUSTOMER = int(os.getenv("NORDFLYTT_CONTEXT_MAX_ENTRIES", "50"))
+CONTEXT_REFRESH_SECONDS = float(os.getenv("NORDFLYTT_CONTEXT_REFRESH_SECONDS", "60"))
+# Rows not changed for this long are not loaded, and older entries are pruned (0 = keep everything)
+CONTEXT_MAX_AGE_DAYS = float(os.getenv("NORDFLYTT_CONTEXT_MAX_AGE_DAYS", "365"))
+
+TICKET_COLUMNS = ("id, ticket_number, customer_email, issue_type, description, priority, status, assigned_team, "
+                  "booking_reference, created_at, updated_at")
+JOB_COLUMNS = "id, customer_email, reference_number, date, status, special_requirements, ai_notes, updated_at"
+# jobs.ai_notes only exists once UPDATE_EXISTING_TABLES_SQL has run
+JOB_COLUMNS_WITHOUT_NOTES = "id, customer_email, reference_number, date, status, special_requirements, updated_at"
+
+class ContextEntry(NamedTuple):
+    kind: str  # "ticket" or "booking"
+    key: str
+    date: str
+    text: str
+    details: Dict[str, Any]
+    terms: Counter
+
+def flatten_notes(notes: Any, prefix: str = "") -> List[str]:
+    """ai_notes JSONB as "path: value" lines"""
+    if isinstance(notes, dict):
+        return [line for key, value in notes.items() for line in flatten_notes(value, f"{prefix}{key}.")]
+    if isinstance(notes, list):
+        return [line for value in notes for line in flatten_notes(value, prefix)]
+    if notes is None or notes == "":
+        return []
+    return [f"{prefix.rstrip('.')}: {notes}" if prefix else str(notes)]
+
+def ticket_entry(row: Dict[str, Any]) -> ContextEntry:
+    text = row.get("description") or ""
+    return ContextEntry(
+        "ticket",
+        str(row.get("ticket_number") or row.get("id") or ""),
+        str(row.get("created_at") or ""),
+        text,
+        {
+            "issue_type": row.get("issue_type"),
+            "priority": row.get("priority"),
+            "status": row.get("status"),
+            "booking_reference": row.get("booking_reference")
+        },
+        Counter(tokenize(text))
+    )
+
+def job_entry(row: Dict[str, Any]) -> ContextEntry:
+    lines = flatten_notes(row.get("ai_notes"))
+    if row.get("special_requirements"):
+        lines.insert(0, str(row["special_requirements"]))
+    text = "\n".join(lines)
+    return ContextEntry(
+        "booking",
+        str(row.get("reference_number") or row.get("id") or ""),
+        str(row.get("date") or ""),
+        text,
+        {"status": row.get("status")},
+        Counter(tokenize(text))
+    )
+
+class CustomerContextIndex:
+    """Ticket and booking entries per normalised e-mail, newest first"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES_PER_CUSTOMER):
+        self.max_entries = max_entries
+        self.customers: Dict[str, List[ContextEntry]] = {}
+        self.watermarks: Dict[str, str] = {}
+        # Falls back to JOB_COLUMNS_WITHOUT_NOTES once jobs.ai_notes turns out to be missing
+        self.job_columns = JOB_COLUMNS
+        # Called with (table, row) for every loaded row, so other in-memory
+        # indexes can follow the same incremental refresh
+        self.listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.customers)
+
+    def add(self, email: str, entry: ContextEntry):
+        """Insert or replace (same kind and key) an entry of one customer"""
+        if not email or not entry.key:
+            return
+        email = normalize_email(email)
+        with self._lock:
+            entries = [e for e in self.customers.get(email, ()) if (e.kind, e.key) != (entry.kind, entry.key)]
+            entries.append(entry)
+            entries.sort(key=lambda e: e.date, reverse=True)
+            self.customers[email] = entries[:self.max_entries]
+
+    def add_ticket(self, row: Dict[str, Any]):
+        self.add(row.get("customer_email"), ticket_entry(row))
+
+    def add_job(self, row: Dict[str, Any]):
+        entry = job_entry(row)
+        if entry.text:
+            self.add(row.get("customer_email"), entry)
+
+    def add_rows(self, table: str, rows: Iterable[Dict[str, Any]]):
+        add = self.add_ticket if table == "support_tickets" else self.add_job
+        for row in rows:
+            add(row)
+            for listener in self.listeners:
+                listener(table, row)
+            updated_at = row.get("updated_at")
+            if updated_at and updated_at > self.watermarks.get(table, ""):
+                self.watermarks[table] = updated_at
+
+    def prune(self, cutoff: str) -> int:
+        """Drop entries dated before cutoff (ISO date or timestamp); returns how many were dropped"""
+        dropped = 0
+        with self._lock:
+            for email, entries in list(self.customers.items()):
+                kept = [entry for entry in entries if not entry.date or entry.date >= cutoff]
+                dropped += len(entries) - len(kept)
+                if kept:
+                    self.customers[email] = kept
+                else:
+                    del self.customers[email]
+        return dropped
+
+    def context(self, email: str, query: Optional[str] = None, limit: int = 10,
+                kinds: Tuple[str, ...] = ("ticket", "booking")) -> List[ContextEntry]:
+        """A customer's entries, most relevant to query first (newest first without one)"""
+        entries = [entry for entry in self.customers.get(normalize_email(email), ()) if entry.kind in kinds]
+        terms = set(tokenize(query)) if query else None
+        if terms:
+            # Entries are newest first and the sort is stable, so ties stay newest first
+            entries = sorted(entries, key=lambda entry: sum(entry.terms[term] > 0 for term in terms), reverse=True)
+        return entries[:limit]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "customers": len(self.customers),
+            "entries": sum(len(entries) for entries in self.customers.values()),
+            "watermarks": dict(self.watermarks)
+        }
+
+def max_age_cutoff(max_age_days: float = CONTEXT_MAX_AGE_DAYS) -> Optional[str]:
+    if max_age_days <= 0:
+        return None
+    return (datetime.now(timezone.utc) - timedelta(days=max_age_days)).isoformat()
+
+def _pages(client, table: str, columns: str, since: Optional[str] = None):
+    """Pages ordered by (updated_at, id), each starting after the last row of the previous one
+
+    Keyset pagination: offsets over the non-unique updated_at skip or repeat
+    rows when rows change between pages.
+    """
+    last = None
+    while True:
+        query = client.table(table).select(columns)
+        if last is not None:
+            updated_at, row_id = (f'"{value}"' for value in last)
+            query = query.or_(f"updated_at.gt.{updated_at},and(updated_at.eq.{updated_at},id.gt.{row_id})")
+        elif since:
+            # gte: rows sharing the last timestamp may have arrived after it was read
+            query = query.gte("updated_at", since)
+        # One order parameter: older postgrest-py repeats it on a second order() call
+        page = query.order("updated_at,id").limit(PAGE_SIZE).execute()
+        rows = page.data or []
+        yield rows
+        if len(rows) < PAGE_SIZE:
+            break
+        last = (rows[-1]["updated_at"], rows[-1]["id"])
+
+def _is_missing_notes_column(error: Exception) -> bool:
+    message = str(error)
+    # PostgREST reports an unknown column as 42703 (or PGRST204 from its schema cache)
+    return "ai_notes" in message and ("42703" in message or "PGRST204" in message or "does not exist" in message)
+
+def load_rows(index: CustomerContextIndex, client, table: str, max_age_days: float = CONTEXT_MAX_AGE_DAYS):
+    """Add rows of table changed since its watermark (the last max_age_days the first time)"""
+    since = index.watermarks.get(table) or max_age_cutoff(max_age_days)
+    if table == "support_tickets":
+        for rows in _pages(client, table, TICKET_COLUMNS, since):
+            index.add_rows(table, rows)
+        return
+
+    try:
+        for rows in _pages(client, table, index.job_columns, since):
+            index.add_rows(table, rows)
+    except Exception as e:
+        if index.job_columns == JOB_COLUMNS_WITHOUT_NOTES or not _is_missing_notes_column(e):
+            raise
+        logger.warning("jobs.ai_notes does not exist (run UPDATE_EXISTING_TABLES_SQL), "
+                       "loading booking context from special_requirements only")
+        index.job_columns = JOB_COLUMNS_WITHOUT_NOTES
+        load_rows(index, client, table, max_age_days)
+
+def load_customer_context(client, index: Optional[CustomerContextIndex] = None,
+                          max_age_days: float = CONTEXT_MAX_AGE_DAYS) -> CustomerContextIndex:
+    index = index if index is not None else CustomerContextIndex()
+    for table in ("support_tickets", "jobs"):
+        try:
+            load_rows(index, client, table, max_age_days)
+        except Exception as e:
+            logger.error(f"Could not load customer context from {table}: {str(e)}")
+    cutoff = max_age_cutoff(max_age_days)
+    if cutoff:
+        index.prune(cutoff)
+    return index
+
+class CustomerContextRefresher:
+    """Pulls changed tickets and jobs into the index in a daemon thread"""
+
+    def __init__(self, client, index: CustomerContextIndex, interval: float = CONTEXT_REFRESH_SECONDS,
+                 load: Callable[[Any, CustomerContextIndex], CustomerContextIndex] = load_customer_context):
+        self.client = client
+        self.index = index
+        self.interval = interval
+        self.load = load
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="customer-context-refresh", daemon=True)
+
+    def start(self):
+        if self.interval > 0:
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            started = time.perf_counter()
+            self.load(self.client, self.index)
+            logger.debug("Customer context refreshed in %.1f ms", (time.perf_counter() - started) * 1000)
@@ -101,6 +101,24 @@ echo "4️⃣  Building and deploying services..."
 # Use production Dockerfile
 cp Dockerfile.production Dockerfile
 
+# The time-estimation model ships in the image; a missing model would
+# silently fall back to the heuristic, so refuse to build without one
+MODEL_SOURCE="${NORDFLYTT_MODEL_SOURCE:-model}"
+if [ ! -e "$MODEL_SOURCE/forest" ] && [ ! -f "$MODEL_SOURCE/model.joblib" ]; then
+    echo "❌ No time-estimation model in $MODEL_SOURCE"
+    echo "   Train one with: python3 ../training.py jobs-export.parquet --model-dir python-api/model"
+    echo "   or point NORDFLYTT_MODEL_SOURCE at a trained model directory"
+    exit 1
+fi
+if [ "$MODEL_SOURCE" != "model" ]; then
+    rm -rf model
+    cp -a "$MODEL_SOURCE" model
+fi
+
+# The model code lives at the repository root, outside the build context
+cp ../inference.py ../drift_monitor.py .
+trap 'rm -f inference.py drift_monitor.py' EXIT
+
 # Build services
 docker-compose build --no-cache
 
@@ -127,14 +145,11 @@ fi
 # 5. Run database migrations
 echo ""
 echo "6️⃣  Database migrations..."
-echo "   Please run these SQL files in your Supabase dashboard:"
-echo "   - migrations/001_create_support_tickets.sql"
-echo "   - migrations/002_create_gpt_analytics.sql"
-echo "   - migrations/003_update_existing_tables.sql"
-echo ""
-read -p "   Have you run the migrations? (y/N): " -n 1 -r
-echo
-if [[ ! $REPLY =~ ^[Yy]$ ]]; then
+if [ -n "$NORDFLYTT_DATABASE_URL" ]; then
+    python3 migrate.py up || { echo "❌ Migrations failed"; exit 1; }
+else
+    echo "   NORDFLYTT_DATABASE_URL is not set, skipping. Apply them with:"
+    echo "   NORDFLYTT_DATABASE_URL=postgresql://... python3 migrate.py up"
     echo "⚠️  Please run migrations before using the API"
 fi
 
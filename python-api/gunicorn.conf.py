@@ -0,0 +1,52 @@
+"""
+Gunicorn settings for the GPT RAG API in production
+The master imports the app and the heavy libraries once (preload_app plus
+PRELOAD_MODULES) and then freezes the garbage collector, so forked uvicorn
+workers share those pages copy-on-write instead of each importing them again.
+The master also builds the knowledge indexes, so workers only load them.
+Each worker still creates its own Supabase client and loads the model in the
+FastAPI lifespan handler, after the fork.
+
+Usage:
+    gunicorn main:app -c gunicorn.conf.py
+"""
+
+import gc
+import importlib
+import os
+import sys
+
+bind = os.getenv("NORDFLYTT_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("NORDFLYTT_WORKERS", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+loglevel = os.getenv("NORDFLYTT_LOG_LEVEL", "info").lower()
+
+# Imported lazily by the app (in the lifespan handler or on first use), so
+# import them here to load them once in the master
+PRELOAD_MODULES = ["supabase", "email_validator", "numpy", "pandas", "joblib", "sklearn.ensemble", "pyarrow"]
+
+def on_starting(server):
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            server.log.warning(f"Preload skipped, {name} is not installed")
+
+    # inference.py (repo root) is imported on first model load otherwise
+    import time_estimation
+    time_estimation.preload()
+
+    # Build or refresh the knowledge indexes once here, so the forked workers
+    # only load (memory-map) them instead of racing to rebuild them
+    import retrieval
+    try:
+        retrieval.load_or_build()
+    except Exception as e:
+        server.log.warning(f"Knowledge indexes not prebuilt, workers will build them: {str(e)}")
+
+def when_ready(server):
+    # Objects created so far are never collected; without this the first GC
+    # pass in each worker touches (and so copies) every preloaded page
+    gc.freeze()
+    server.log.info(f"Preloaded {len(sys.modules)} modules, {gc.get_freeze_count()} objects frozen")
@@ -0,0 +1,101 @@
+"""
+Policy and FAQ knowledge base for GPT RAG retrieval
+Reads the markdown files in KNOWLEDGE_DIR and splits them into passages
+once, at index time: one passage per heading section, with long sections
+split on paragraph boundaries. The search indexes store these passages and
+return them as they are, so a search request never re-reads or re-splits a
+document.
+"""
+
+import hashlib
+import os
+import re
+from typing import Iterable, List, NamedTuple
+
+KNOWLEDGE_DIR = os.getenv("NORDFLYTT_KNOWLEDGE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge"))
+# Built indexes are written here and reloaded on the next start
+INDEX_DIR = os.getenv("NORDFLYTT_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "index"))
+
+MAX_PASSAGE_CHARS = 1200
+
+HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+
+class Passage(NamedTuple):
+    passage_id: str
+    source: str
+    title: str
+    section: str
+    text: str
+
+def markdown_files(knowledge_dir: str = KNOWLEDGE_DIR) -> List[str]:
+    """Markdown files under knowledge_dir, as sorted relative paths"""
+    found = []
+    for root, _, files in os.walk(knowledge_dir):
+        for name in files:
+            if name.lower().endswith((".md", ".markdown")):
+                found.append(os.path.relpath(os.path.join(root, name), knowledge_dir))
+    return sorted(found)
+
+def fingerprint(knowledge_dir: str = KNOWLEDGE_DIR) -> str:
+    """Changes whenever a markdown file is added, removed or modified"""
+    digest = hashlib.sha1()
+    for relative in markdown_files(knowledge_dir):
+        stat = os.stat(os.path.join(knowledge_dir, relative))
+        digest.update(f"{relative}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+def _split_long(text: str, max_chars: int) -> List[str]:
+    """Split on blank lines into pieces of at most max_chars (a single longer paragraph stays whole)"""
+    if len(text) <= max_chars:
+        return [text]
+    pieces, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            pieces.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        pieces.append(current)
+    return pieces
+
+def split_markdown(source: str, content: str, max_chars: int = MAX_PASSAGE_CHARS) -> List[Passage]:
+    """Passages of one markdown document, titled by its first H1"""
+    title = os.path.splitext(os.path.basename(source))[0].replace("-", " ").capitalize()
+    sections = []
+    section, lines = "", []
+
+    for line in content.splitlines():
+        match = HEADING.match(line)
+        if match:
+            sections.append((section, "\n".join(lines).strip()))
+            if len(match.group(1)) == 1:
+                title, section = match.group(2), ""
+            else:
+                section = match.group(2)
+            lines = []
+        else:
+            lines.append(line)
+    sections.append((section, "\n".join(lines).strip()))
+
+    passages = []
+    for section, text in sections:
+        if not text:
+            continue
+        for piece in _split_long(text, max_chars):
+            passages.append(Passage(f"{source}#{len(passages)}", source, title, section, piece))
+    return passages
+
+def load_passages(knowledge_dir: str = KNOWLEDGE_DIR) -> List[Passage]:
+    passages = []
+    for relative in markdown_files(knowledge_dir):
+        with open(os.path.join(knowledge_dir, relative), encoding="utf-8") as f:
+            passages.extend(split_markdown(relative, f.read()))
+    return passages
+
+def passage_text(passage: Passage) -> str:
+    """What gets indexed: headings weigh in alongside the body"""
+    return f"{passage.title}\n{passage.section}\n{passage.text}"
+
+def sources(passages: Iterable[Passage]) -> List[str]:
+    return sorted({passage.source for passage in passages})
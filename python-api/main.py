@@ -4,33 +4,89 @@ Nordflytt GPT RAG API
 Python FastAPI server for Custom GPT integration
 """
 
-from fastapi import FastAPI, HTTPException, Header, Request
+from fastapi import FastAPI, HTTPException, Header, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, EmailStr, Field
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
 import os
 import logging
 from dotenv import load_dotenv
-from supabase import create_client, Client
 import json
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+import time_estimation
+import structured_logging
+import tracing
+import warmup
+import retrieval
+import customer_context
+import ticket_dedup
+from request_validation import json_body, json_list_body, openapi_body, validate_json
+from serialization import ARROW_STREAM_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, FastJSONResponse, dumps, negotiated_response
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (JSON lines written by a background thread)
+structured_logging.configure()
 logger = logging.getLogger(__name__)
 
+# Supabase configuration
+SUPABASE_URL = os.getenv("NEXT_PUBLIC_SUPABASE_URL", "https://gindcnpiejkntkangpuc.supabase.co")
+SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
+NORDFLYTT_GPT_API_KEY = os.getenv("NORDFLYTT_GPT_API_KEY", "nordflytt_gpt_api_key_2025")
+MAX_PRICE_BATCH = int(os.getenv("NORDFLYTT_MAX_PRICE_BATCH", "1000"))
+
+# Created per worker by the lifespan handler, not at import: importing main
+# stays cheap, and a preloading master (gunicorn.conf.py) can fork workers
+# without sharing sockets or threads with them
+supabase = None
+time_model = None
+known_emails = None
+knowledge = None
+customer_contexts = customer_context.CustomerContextIndex()
+duplicate_tickets = ticket_dedup.TicketDeduplicator()
+# Tickets loaded for the customer context also seed the duplicate check
+customer_contexts.listeners.append(duplicate_tickets.observe)
+warmup_state = warmup.Warmup()
+
+def create_supabase_client():
+    """Supabase client, or None without credentials (supabase is imported lazily)"""
+    if not SUPABASE_KEY:
+        return None
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+def set_known_emails(known: "warmup.KnownEmailFilter"):
+    global known_emails
+    known_emails = known
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global supabase
+    supabase = create_supabase_client()
+    # The worker accepts requests only after startup returns, so no user
+    # request pays for cold connections, pages or caches
+    warm_up()
+    refresher = warmup.KnownEmailsRefresher(supabase, known_emails, set_known_emails).start() if known_emails else None
+    context_refresher = customer_context.CustomerContextRefresher(supabase, customer_contexts).start() if supabase else None
+    yield
+    if refresher:
+        refresher.stop()
+    if context_refresher:
+        context_refresher.stop()
+
 # Initialize FastAPI
 app = FastAPI(
     title="Nordflytt GPT RAG API",
     description="API endpoints for Custom GPT integration with Nordflytt CRM",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
 )
 
 # Initialize rate limiter
@@ -38,6 +94,9 @@ limiter = Limiter(key_func=get_remote_address)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+# Root span and request id per request (exported when NORDFLYTT_TRACE_FILE is set)
+app.add_middleware(tracing.TracingMiddleware)
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -47,14 +106,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Supabase configuration
-SUPABASE_URL = os.getenv("NEXT_PUBLIC_SUPABASE_URL", "https://gindcnpiejkntkangpuc.supabase.co")
-SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
-NORDFLYTT_GPT_API_KEY = os.getenv("NORDFLYTT_GPT_API_KEY", "nordflytt_gpt_api_key_2025")
-
-# Initialize Supabase client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY) if SUPABASE_KEY else None
-
 # Pydantic models
 class CustomerLookupRequest(BaseModel):
     email: EmailStr
@@ -82,6 +133,17 @@ class CalculatePriceRequest(BaseModel):
     additional_services: List[str] = []
     distance_km: float
 
+class CustomerContextRequest(BaseModel):
+    email: EmailStr
+    query: Optional[str] = None
+    limit: int = Field(10, ge=1, le=50)
+    include: List[Literal["ticket", "booking"]] = ["ticket", "booking"]
+
+class SearchRequest(BaseModel):
+    query: str
+    top_k: int = Field(5, ge=1, le=50)
+    mode: Literal["hybrid", "keyword", "semantic"] = "hybrid"
+
 # Authentication middleware
 async def verify_api_key(authorization: str = Header(None)):
     if not authorization:
@@ -127,29 +189,169 @@ def calculate_stairs_fee(floors_from: int, floors_to: int, elevator_from: str, e
     
     return fee
 
+# Pricing catalog for additional services
+SERVICE_PRICES = {
+    "packing": 250 * 3,  # 3 hours minimum
+    "packning": 250 * 3,
+    "cleaning": 1200,
+    "städning": 1200,
+    "piano": 2500,
+    "storage": 500,
+    "magasinering": 500
+}
+
+SERVICE_NAMES = {
+    "packing": "Packning (3h)",
+    "packning": "Packning (3h)",
+    "cleaning": "Flyttstädning",
+    "städning": "Flyttstädning",
+    "piano": "Pianoflytt",
+    "storage": "Magasinering",
+    "magasinering": "Magasinering"
+}
+
+def build_price_quote(data: CalculatePriceRequest, hours_needed: float, time_estimate_source: str) -> Dict[str, Any]:
+    """Price a move given the estimated hours (2 movers)"""
+    # Base pricing
+    base_hourly_rate = 590  # kr/h excluding VAT
+    vat_rate = 0.25
+    rut_deduction_rate = 0.5  # 50% for personnel costs
+    
+    # Personnel cost
+    personnel_cost = base_hourly_rate * hours_needed * 2  # 2 movers
+    personnel_cost_with_vat = personnel_cost * (1 + vat_rate)
+    
+    # RUT deduction on personnel cost
+    rut_savings = personnel_cost_with_vat * rut_deduction_rate
+    personnel_cost_after_rut = personnel_cost_with_vat - rut_savings
+    
+    # Truck cost (not eligible for RUT)
+    truck_hourly_rate = 295
+    truck_cost = truck_hourly_rate * hours_needed * (1 + vat_rate)
+    
+    # Calculate stairs fee
+    stairs_fee = calculate_stairs_fee(
+        data.floors_from, 
+        data.floors_to, 
+        data.elevator_from, 
+        data.elevator_to
+    )
+    
+    # Additional services
+    service_costs = []
+    additional_cost = 0
+    
+    for service in data.additional_services:
+        if service.lower() in SERVICE_PRICES:
+            cost = SERVICE_PRICES[service.lower()]
+            additional_cost += cost
+    
+            service_costs.append(f"{SERVICE_NAMES.get(service.lower(), service)}: {cost} kr")
+    
+    # Subtotal before discounts
+    subtotal = personnel_cost_after_rut + truck_cost + stairs_fee + additional_cost
+    
+    # Apply volume discount
+    discount_rate, discount_description = calculate_volume_discount(data.volume_m3)
+    discount_amount = subtotal * discount_rate
+    
+    # Final price
+    total_price = subtotal - discount_amount
+    
+    # Savings explanation
+    total_savings = rut_savings + discount_amount
+    savings_parts = []
+    if discount_description:
+        savings_parts.append(f"{int(discount_amount)} kr tack vare {discount_description}")
+    savings_parts.append(f"{int(rut_savings)} kr med RUT-avdrag")
+    savings_explanation = f"Du sparar {' och '.join(savings_parts)}"
+    
+    # Suggested response
+    suggested_response = f"Din flytt kostar {int(total_price)} kr inklusive allt"
+    if discount_description:
+        suggested_response += f" med {discount_description}"
+    suggested_response += f". Detta inkluderar {', '.join([s.lower() for s in data.additional_services])}." if data.additional_services else "."
+    suggested_response += f" {savings_explanation}. Priset är redan reducerat med RUT-avdrag där det är tillämpligt."
+    
+    return {
+        "price_calculated": True,
+        "pricing_data": {
+            "total_price": int(total_price),
+            "volume_discount": discount_description,
+            "savings_explanation": savings_explanation
+        },
+        "price_breakdown": {
+            "personnel_cost": int(personnel_cost_after_rut),
+            "truck_cost": int(truck_cost),
+            "stairs_fee": stairs_fee,
+            "additional_services": service_costs,
+            "subtotal": int(subtotal),
+            "discount_amount": int(discount_amount),
+            "rut_savings": int(rut_savings),
+            "estimated_hours": round(hours_needed, 1),
+            "time_estimate_source": time_estimate_source
+        },
+        "suggested_response": suggested_response
+    }
+
+# Representative requests pushed through every layer during warmup
+WARMUP_PRICE_REQUEST = b'{"volume_m3": 25, "floors_from": 4, "floors_to": 2, "elevator_from": "none", "elevator_to": "small", "additional_services": ["packing", "cleaning", "piano", "storage"], "distance_km": 30}'
+WARMUP_LOOKUP_REQUEST = b'{"email": "warmup@nordflytt.se", "query_context": "warmup"}'
+
+def warm_pricing():
+    """Validation, pricing, the model and serialization for sample requests"""
+    validate_json(CustomerLookupRequest, WARMUP_LOOKUP_REQUEST)
+    samples = [validate_json(CalculatePriceRequest, WARMUP_PRICE_REQUEST)] * 8
+    time_estimation.warm_up(time_model, samples)
+    quotes = [build_price_quote(data, time_estimation.heuristic_hours(data.volume_m3), "heuristic") for data in samples]
+    dumps({"quotes": quotes})
+
+def warm_up():
+    global knowledge, time_model
+    warmup_state.start()
+    # Load the time-estimation model in-process (None falls back to the heuristic);
+    # a configured model that fails to load keeps /ready at 503
+    time_model = warmup_state.step("time_model", time_estimation.load_time_model,
+                                   required=time_estimation.MODEL_REQUIRED)
+    if supabase:
+        warmup_state.step("supabase_connections", lambda: warmup.open_connections(supabase))
+        known = warmup_state.step("known_emails", lambda: warmup.load_known_emails(supabase))
+        if known is not None:
+            set_known_emails(known)
+        warmup_state.step("customer_context", lambda: customer_context.load_customer_context(supabase, customer_contexts))
+    warmup_state.step("pricing_and_model", warm_pricing)
+    # Reloaded from NORDFLYTT_INDEX_DIR unless the knowledge base changed
+    knowledge = warmup_state.step("knowledge_index", retrieval.load_or_build)
+    if knowledge is not None:
+        # Past the cache, which should only hold real queries
+        warmup_state.step("knowledge_search", lambda: knowledge.search("flytt pris rut-avdrag", use_cache=False))
+    warmup_state.finish()
+
 # Endpoint 1: Customer Lookup
-@app.post("/gpt-rag/customer-lookup")
+@app.post("/gpt-rag/customer-lookup", openapi_extra=openapi_body(CustomerLookupRequest.model_json_schema()))
 @limiter.limit("100/15minutes")
 async def customer_lookup(
     request: Request,
-    data: CustomerLookupRequest,
+    data: CustomerLookupRequest = Depends(json_body(CustomerLookupRequest)),
     _: str = Header(None, alias="Authorization", dependencies=[verify_api_key])
 ):
     try:
         # Log the request
-        logger.info(f"Customer lookup request for: {data.email}")
+        structured_logging.log_request(logger, "/gpt-rag/customer-lookup", "Customer lookup request", data)
         
-        # Try to fetch from Supabase
-        if supabase:
+        # Try to fetch from Supabase (skipped for e-mails the known-emails filter has never seen)
+        if supabase and (known_emails is None or data.email in known_emails):
             try:
                 # Query customer from database
-                customer_result = supabase.table('customers').select('*').eq('email', data.email).execute()
+                with tracing.span("supabase.select", tracing.KIND_CLIENT, table="customers"):
+                    customer_result = supabase.table('customers').select('*').eq('email', data.email).execute()
                 
                 if customer_result.data and len(customer_result.data) > 0:
                     customer = customer_result.data[0]
                     
                     # Get booking history
-                    bookings_result = supabase.table('jobs').select('*').eq('customer_email', data.email).order('date', desc=True).execute()
+                    with tracing.span("supabase.select", tracing.KIND_CLIENT, table="jobs"):
+                        bookings_result = supabase.table('jobs').select('*').eq('customer_email', data.email).order('date', desc=True).execute()
                     
                     total_bookings = len(bookings_result.data) if bookings_result.data else 0
                     last_booking = bookings_result.data[0] if bookings_result.data else None
@@ -236,15 +438,15 @@ async def customer_lookup(
         raise HTTPException(status_code=500, detail=str(e))
 
 # Endpoint 2: Booking Details
-@app.post("/gpt-rag/booking-details")
+@app.post("/gpt-rag/booking-details", openapi_extra=openapi_body(BookingDetailsRequest.model_json_schema()))
 @limiter.limit("100/15minutes")
 async def booking_details(
     request: Request,
-    data: BookingDetailsRequest,
+    data: BookingDetailsRequest = Depends(json_body(BookingDetailsRequest)),
     _: str = Header(None, alias="Authorization", dependencies=[verify_api_key])
 ):
     try:
-        logger.info(f"Booking details request: {data.dict()}")
+        structured_logging.log_request(logger, "/gpt-rag/booking-details", "Booking details request", data)
         
         # Try to fetch from Supabase
         if supabase and (data.customer_email or data.booking_id):
@@ -258,16 +460,18 @@ async def booking_details(
                     if data.booking_date:
                         query = query.eq('date', data.booking_date)
                 
-                result = query.order('date', desc=True).limit(1).execute()
+                with tracing.span("supabase.select", tracing.KIND_CLIENT, table="jobs"):
+                    result = query.order('date', desc=True).limit(1).execute()
                 
                 if result.data and len(result.data) > 0:
                     booking = result.data[0]
                     
                     # Check if booking can be modified
-                    booking_date = datetime.fromisoformat(booking['date'])
-                    days_until_move = (booking_date - datetime.now()).days
-                    can_modify = days_until_move > 2
-                    can_cancel = days_until_move > 7
+                    with tracing.span("booking.modification_window"):
+                        booking_date = datetime.fromisoformat(booking['date'])
+                        days_until_move = (booking_date - datetime.now()).days
+                        can_modify = days_until_move > 2
+                        can_cancel = days_until_move > 7
                     
                     return {
                         "booking_found": True,
@@ -343,15 +547,15 @@ async def booking_details(
         raise HTTPException(status_code=500, detail=str(e))
 
 # Endpoint 3: Create Support Ticket
-@app.post("/gpt-rag/create-ticket")
+@app.post("/gpt-rag/create-ticket", openapi_extra=openapi_body(CreateTicketRequest.model_json_schema()))
 @limiter.limit("100/15minutes")
 async def create_ticket(
     request: Request,
-    data: CreateTicketRequest,
+    data: CreateTicketRequest = Depends(json_body(CreateTicketRequest)),
     _: str = Header(None, alias="Authorization", dependencies=[verify_api_key])
 ):
     try:
-        logger.info(f"Create ticket request: {data.dict()}")
+        structured_logging.log_request(logger, "/gpt-rag/create-ticket", "Create ticket request", data)
         
         # Validate issue type
         valid_issue_types = ["damage_claim", "booking_change", "complaint", "cleaning_issue", "general"]
@@ -381,6 +585,43 @@ async def create_ticket(
             "low": "inom 2 arbetsdagar"
         }
         
+        # A repeat of a recent ticket (same e-mail or booking) is linked to it, not inserted
+        with tracing.span("ticket.duplicate_check", tickets=len(duplicate_tickets)):
+            duplicate = duplicate_tickets.find(data.customer_email, data.description, data.booking_reference)
+        
+        if duplicate:
+            existing, similarity = duplicate
+            logger.info("Ticket linked to near-duplicate %s (similarity %.2f)", existing.ticket_number, similarity)
+            if supabase:
+                try:
+                    # Bump the existing ticket so its team sees the new contact
+                    with tracing.span("supabase.update", tracing.KIND_CLIENT, table="support_tickets"):
+                        supabase.table('support_tickets').update({"updated_at": datetime.now().isoformat()}).eq('ticket_number', existing.ticket_number).execute()
+                    with tracing.span("supabase.insert", tracing.KIND_CLIENT, table="gpt_analytics"):
+                        supabase.table('gpt_analytics').insert({
+                            "endpoint": "/create-ticket",
+                            "customer_email": data.customer_email,
+                            "success": True,
+                            "request_data": data.dict(),
+                            "response_data": {"duplicate_of": existing.ticket_number, "similarity": round(similarity, 2)},
+                            "timestamp": datetime.now().isoformat()
+                        }).execute()
+                except Exception as e:
+                    logger.error(f"Database error linking duplicate ticket: {str(e)}")
+            
+            priority = existing.priority if existing.priority in estimated_response else data.priority
+            assigned_team = existing.assigned_team or assigned_teams[data.issue_type]
+            return {
+                "ticket_created": False,
+                "duplicate_of": existing.ticket_number,
+                "ticket_data": {
+                    "ticket_number": existing.ticket_number,
+                    "estimated_response": estimated_response[priority],
+                    "assigned_team": assigned_team
+                },
+                "suggested_response": f"Du har redan ett ärende om detta, {existing.ticket_number}, så jag har kopplat din nya kontakt till det i stället för att skapa ett nytt. {assigned_team} har ärendet och du får svar {estimated_response[priority]}."
+            }
+        
         # Generate ticket number
         ticket_number = generate_ticket_number()
         ticket_id = f"ticket-{datetime.now().timestamp()}-{data.customer_email[:5]}"
@@ -402,8 +643,11 @@ async def create_ticket(
                     "updated_at": datetime.now().isoformat()
                 }
                 
-                result = supabase.table('support_tickets').insert(ticket_data).execute()
-                logger.info(f"Ticket created in database: {ticket_number}")
+                with tracing.span("supabase.insert", tracing.KIND_CLIENT, table="support_tickets"):
+                    result = supabase.table('support_tickets').insert(ticket_data).execute()
+                logger.info("Ticket created in database: %s", ticket_number)
+                customer_contexts.add_ticket(ticket_data)
+                duplicate_tickets.add_row(ticket_data)
             except Exception as e:
                 logger.error(f"Database error creating ticket: {str(e)}")
                 # Continue with mock response even if database fails
@@ -433,7 +677,8 @@ async def create_ticket(
                     "response_data": {"ticket_number": ticket_number},
                     "timestamp": datetime.now().isoformat()
                 }
-                supabase.table('gpt_analytics').insert(analytics_data).execute()
+                with tracing.span("supabase.insert", tracing.KIND_CLIENT, table="gpt_analytics"):
+                    supabase.table('gpt_analytics').insert(analytics_data).execute()
             except:
                 pass
         
@@ -455,121 +700,138 @@ async def create_ticket(
         raise HTTPException(status_code=500, detail=str(e))
 
 # Endpoint 4: Calculate Price
-@app.post("/gpt-rag/calculate-price")
+@app.post(
+    "/gpt-rag/calculate-price",
+    openapi_extra=openapi_body(CalculatePriceRequest.model_json_schema()),
+    responses={200: {"content": {MSGPACK_MEDIA_TYPE: {}}}}
+)
 @limiter.limit("100/15minutes")
 async def calculate_price(
     request: Request,
-    data: CalculatePriceRequest,
+    data: CalculatePriceRequest = Depends(json_body(CalculatePriceRequest)),
     _: str = Header(None, alias="Authorization", dependencies=[verify_api_key])
 ):
     try:
-        logger.info(f"Price calculation request: {data.dict()}")
-        
-        # Base pricing
-        base_hourly_rate = 590  # kr/h excluding VAT
-        vat_rate = 0.25
-        rut_deduction_rate = 0.5  # 50% for personnel costs
-        
-        # Calculate time needed (2 movers)
-        hours_needed = max(3, data.volume_m3 / 5)  # Minimum 3 hours
-        
-        # Personnel cost
-        personnel_cost = base_hourly_rate * hours_needed * 2  # 2 movers
-        personnel_cost_with_vat = personnel_cost * (1 + vat_rate)
-        
-        # RUT deduction on personnel cost
-        rut_savings = personnel_cost_with_vat * rut_deduction_rate
-        personnel_cost_after_rut = personnel_cost_with_vat - rut_savings
-        
-        # Truck cost (not eligible for RUT)
-        truck_hourly_rate = 295
-        truck_cost = truck_hourly_rate * hours_needed * (1 + vat_rate)
-        
-        # Calculate stairs fee
-        stairs_fee = calculate_stairs_fee(
-            data.floors_from, 
-            data.floors_to, 
-            data.elevator_from, 
-            data.elevator_to
-        )
-        
-        # Additional services
-        service_costs = []
-        additional_cost = 0
-        
-        service_prices = {
-            "packing": 250 * 3,  # 3 hours minimum
-            "packning": 250 * 3,
-            "cleaning": 1200,
-            "städning": 1200,
-            "piano": 2500,
-            "storage": 500,
-            "magasinering": 500
-        }
+        structured_logging.log_request(logger, "/gpt-rag/calculate-price", "Price calculation request", data)
         
-        for service in data.additional_services:
-            if service.lower() in service_prices:
-                cost = service_prices[service.lower()]
-                additional_cost += cost
-                
-                service_names = {
-                    "packing": "Packning (3h)",
-                    "packning": "Packning (3h)",
-                    "cleaning": "Flyttstädning",
-                    "städning": "Flyttstädning",
-                    "piano": "Pianoflytt",
-                    "storage": "Magasinering",
-                    "magasinering": "Magasinering"
-                }
-                
-                service_costs.append(f"{service_names.get(service.lower(), service)}: {cost} kr")
+        # Calculate time needed (2 movers, minimum 3 hours)
+        hours_needed, time_estimate_source = time_estimation.estimate_hours(data, time_model)
         
-        # Subtotal before discounts
-        subtotal = personnel_cost_after_rut + truck_cost + stairs_fee + additional_cost
+        return negotiated_response(request, build_price_quote(data, hours_needed, time_estimate_source))
         
-        # Apply volume discount
-        discount_rate, discount_description = calculate_volume_discount(data.volume_m3)
-        discount_amount = subtotal * discount_rate
+    except Exception as e:
+        logger.error(f"Error calculating price: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Endpoint 5: Calculate Price for many moves at once (CRM and batch jobs)
+@app.post(
+    "/gpt-rag/calculate-price/batch",
+    openapi_extra=openapi_body({"type": "array", "items": CalculatePriceRequest.model_json_schema()}),
+    responses={200: {"content": {MSGPACK_MEDIA_TYPE: {}, ARROW_STREAM_MEDIA_TYPE: {}}}}
+)
+@limiter.limit("100/15minutes")
+async def calculate_price_batch(
+    request: Request,
+    data: List[CalculatePriceRequest] = Depends(json_list_body(CalculatePriceRequest)),
+    _: str = Header(None, alias="Authorization", dependencies=[verify_api_key])
+):
+    if len(data) > MAX_PRICE_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_PRICE_BATCH} price requests per batch")
+    
+    try:
+        structured_logging.log_request(logger, "/gpt-rag/calculate-price/batch", "Batch price calculation request", {"size": len(data)})
         
-        # Final price
-        total_price = subtotal - discount_amount
+        # One model call for the whole batch
+        estimates = time_estimation.estimate_hours_batch(data, time_model)
         
-        # Savings explanation
-        total_savings = rut_savings + discount_amount
-        savings_parts = []
-        if discount_description:
-            savings_parts.append(f"{int(discount_amount)} kr tack vare {discount_description}")
-        savings_parts.append(f"{int(rut_savings)} kr med RUT-avdrag")
-        savings_explanation = f"Du sparar {' och '.join(savings_parts)}"
+        return negotiated_response(request, {
+            "quotes": [
+                build_price_quote(item, hours_needed, time_estimate_source)
+                for item, (hours_needed, time_estimate_source) in zip(data, estimates)
+            ]
+        }, rows_key="quotes")
         
-        # Suggested response
-        suggested_response = f"Din flytt kostar {int(total_price)} kr inklusive allt"
-        if discount_description:
-            suggested_response += f" med {discount_description}"
-        suggested_response += f". Detta inkluderar {', '.join([s.lower() for s in data.additional_services])}." if data.additional_services else "."
-        suggested_response += f" {savings_explanation}. Priset är redan reducerat med RUT-avdrag där det är tillämpligt."
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error calculating batch price: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Endpoint 6: Search the policy and FAQ knowledge base
+@app.post(
+    "/gpt-rag/search",
+    openapi_extra=openapi_body(SearchRequest.model_json_schema()),
+    responses={200: {"content": {MSGPACK_MEDIA_TYPE: {}}}}
+)
+@limiter.limit("100/15minutes")
+async def search_knowledge(
+    request: Request,
+    data: SearchRequest = Depends(json_body(SearchRequest)),
+    _: str = Header(None, alias="Authorization", dependencies=[verify_api_key])
+):
+    if knowledge is None or not knowledge.available(data.mode):
+        raise HTTPException(status_code=503, detail=f"Knowledge base {data.mode} index is not loaded")
+    
+    try:
+        structured_logging.log_request(logger, "/gpt-rag/search", "Knowledge search request", data)
+        
+        with tracing.span(f"search.{data.mode}", passages=len(knowledge)):
+            hits = knowledge.search(data.query, data.top_k, data.mode)
+        
+        return negotiated_response(request, {
+            "query": data.query,
+            "results": [
+                {
+                    "id": passage.passage_id,
+                    "title": passage.title,
+                    "section": passage.section,
+                    "source": passage.source,
+                    "text": passage.text,
+                    "score": round(score, 4)
+                }
+                for passage, score in hits
+            ]
+        })
         
-        return {
-            "price_calculated": True,
-            "pricing_data": {
-                "total_price": int(total_price),
-                "volume_discount": discount_description,
-                "savings_explanation": savings_explanation
-            },
-            "price_breakdown": {
-                "personnel_cost": int(personnel_cost_after_rut),
-                "truck_cost": int(truck_cost),
-                "stairs_fee": stairs_fee,
-                "additional_services": service_costs,
-                "subtotal": int(subtotal),
-                "discount_amount": int(discount_amount),
-                "rut_savings": int(rut_savings)
-            },
-            "suggested_response": suggested_response
-        }
+    except Exception as e:
+        logger.error(f"Error searching knowledge base: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Endpoint 7: Earlier tickets and booking notes of one customer
+@app.post(
+    "/gpt-rag/customer-context",
+    openapi_extra=openapi_body(CustomerContextRequest.model_json_schema()),
+    responses={200: {"content": {MSGPACK_MEDIA_TYPE: {}}}}
+)
+@limiter.limit("100/15minutes")
+async def get_customer_context(
+    request: Request,
+    data: CustomerContextRequest = Depends(json_body(CustomerContextRequest)),
+    _: str = Header(None, alias="Authorization", dependencies=[verify_api_key])
+):
+    try:
+        structured_logging.log_request(logger, "/gpt-rag/customer-context", "Customer context request", data)
+        
+        with tracing.span("customer_context.lookup"):
+            entries = customer_contexts.context(data.email, data.query, data.limit, tuple(data.include))
+        
+        return negotiated_response(request, {
+            "customer_email": data.email,
+            "context_found": bool(entries),
+            "entries": [
+                {
+                    "kind": entry.kind,
+                    "reference": entry.key,
+                    "date": entry.date,
+                    "text": entry.text,
+                    **entry.details
+                }
+                for entry in entries
+            ]
+        })
         
     except Exception as e:
-        logger.error(f"Error calculating price: {str(e)}")
+        logger.error(f"Error in customer context: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # Health check endpoint
@@ -579,9 +841,23 @@ async def health_check():
         "status": "healthy",
         "service": "Nordflytt GPT RAG API",
         "timestamp": datetime.now().isoformat(),
-        "database_connected": supabase is not None
+        "database_connected": supabase is not None,
+        "time_model_loaded": time_model is not None,
+        "time_model": time_estimation.stats.snapshot(),
+        "logging": structured_logging.stats(),
+        "tracing": tracing.stats(),
+        "warmup": warmup_state.snapshot(),
+        "known_emails": known_emails.snapshot() if known_emails else None,
+        "knowledge": knowledge.snapshot() if knowledge is not None else None,
+        "customer_context": customer_contexts.snapshot(),
+        "duplicate_tickets": duplicate_tickets.snapshot()
     }
 
+# Readiness: 503 until this worker has finished warming up
+@app.get("/ready")
+async def readiness_check():
+    return FastJSONResponse(warmup_state.snapshot(), status_code=200 if warmup_state.ready else 503)
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -592,7 +868,10 @@ async def root():
             "/gpt-rag/customer-lookup",
             "/gpt-rag/booking-details",
             "/gpt-rag/create-ticket",
-            "/gpt-rag/calculate-price"
+            "/gpt-rag/calculate-price",
+            "/gpt-rag/calculate-price/batch",
+            "/gpt-rag/search",
+            "/gpt-rag/customer-context"
         ],
         "documentation": "/docs"
     }
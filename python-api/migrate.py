@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Migration runner for the GPT RAG API database
+Applies migrations/NNN_name.sql in version order and records each one in
+schema_migrations with a SHA-256 checksum, so an applied file that was
+edited afterwards is reported instead of silently diverging. Runs against
+Postgres (NORDFLYTT_DATABASE_URL or DATABASE_URL, e.g. the Supabase
+connection string) or SQLite (sqlite:///path.db). SQLite only exercises the
+runner itself (the tests use it) with SQLite-compatible files: CONCURRENTLY
+and the public. schema are dropped, but the shipped migrations use
+plpgsql, triggers and partitioning and only run on Postgres.
+
+001-003 used to be pasted into the SQL editor. When schema_migrations is
+empty but the tables they create exist, up records them as applied instead
+of running them again.
+
+A migration runs in one transaction unless it contains CREATE/DROP INDEX
+CONCURRENTLY (or the line "-- migrate:no-transaction"). Then each statement
+runs on its own, as Postgres requires, and must be idempotent (IF NOT
+EXISTS), since a failure leaves the earlier statements applied. An index
+left invalid by a failed concurrent build is dropped and rebuilt on the
+next run. A plain CREATE INDEX on a table the migration does not create
+itself would lock out writes while it builds, so it is rejected unless the
+file says "-- migrate:allow-blocking-index".
+
+Usage:
+    python migrate.py status
+    python migrate.py up [--target 5] [--dry-run]
+    python migrate.py baseline 3    # mark 001-003 applied (pasted in the SQL editor earlier)
+    python migrate.py verify        # exit 1 if an applied migration changed
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import sys
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d+)_([\w-]+)\.sql$")
+DATABASE_URL = os.getenv("NORDFLYTT_DATABASE_URL") or os.getenv("DATABASE_URL", "")
+# Give up on a table lock instead of queueing every write behind the migration
+LOCK_TIMEOUT = os.getenv("NORDFLYTT_MIGRATION_LOCK_TIMEOUT", "5s")
+# pg_advisory_lock key, so two deploys never migrate at once
+ADVISORY_LOCK_KEY = 4_611_017_233
+
+# Migrations applied by hand before the runner existed, each with a table it creates
+PRE_RUNNER_TABLES = {1: "support_tickets", 2: "gpt_api_metrics", 3: "gpt_sessions"}
+
+NO_TRANSACTION = "-- migrate:no-transaction"
+ALLOW_BLOCKING_INDEX = "-- migrate:allow-blocking-index"
+
+CONCURRENTLY = re.compile(r"\b(CREATE|DROP)\s+(UNIQUE\s+)?INDEX\s+CONCURRENTLY\b", re.IGNORECASE)
+CREATE_INDEX = re.compile(
+    r"^\s*CREATE\s+(?:UNIQUE\s+)?INDEX\s+(CONCURRENTLY\s+)?(IF\s+NOT\s+EXISTS\s+)?([\w.\"]+)?\s*ON\s+(?:ONLY\s+)?([\w.\"]+)",
+    re.IGNORECASE
+)
+CREATE_TABLE = re.compile(
+    r"\bCREATE\s+(?:UNLOGGED\s+TABLE|TABLE|MATERIALIZED\s+VIEW)\s+(?:IF\s+NOT\s+EXISTS\s+)?([\w.\"]+)", re.IGNORECASE
+)
+
+class MigrationError(Exception):
+    pass
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    path: str
+    sql: str
+    checksum: str
+
+    @property
+    def transactional(self) -> bool:
+        return NO_TRANSACTION not in self.sql and not CONCURRENTLY.search(self.sql)
+
+def checksum(sql: str) -> str:
+    # Line endings normalised, so a checkout with CRLF does not look edited
+    return hashlib.sha256(sql.replace("\r\n", "\n").encode("utf-8")).hexdigest()
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        path = os.path.join(directory, filename)
+        with open(path, encoding="utf-8") as f:
+            sql = f.read()
+        migrations.append(Migration(int(match.group(1)), match.group(2), path, sql, checksum(sql)))
+
+    versions = [migration.version for migration in migrations]
+    duplicates = sorted({version for version in versions if versions.count(version) > 1})
+    if duplicates:
+        raise MigrationError(f"Duplicate migration versions: {duplicates}")
+    return sorted(migrations)
+
+def split_statements(sql: str) -> List[str]:
+    """Statements of a SQL script, split on top-level semicolons
+
+    Semicolons inside quotes, dollar-quoted function bodies and comments do
+    not split. Statements that are only comments are dropped.
+    """
+    statements, start, i, n = [], 0, 0, len(sql)
+    while i < n:
+        char = sql[i]
+        if sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = n if end < 0 else end + 1
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+        elif char in ("'", '"'):
+            end = i + 1
+            while end < n:
+                if sql[end] == char:
+                    # A doubled quote is an escaped quote
+                    if end + 1 < n and sql[end + 1] == char:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            i = end + 1
+        elif char == "$":
+            match = re.match(r"\$[A-Za-z_]*\$", sql[i:])
+            if match:
+                end = sql.find(match.group(0), i + len(match.group(0)))
+                i = n if end < 0 else end + len(match.group(0))
+            else:
+                i += 1
+        elif char == ";":
+            statements.append(sql[start:i])
+            start = i = i + 1
+        else:
+            i += 1
+    statements.append(sql[start:])
+    return [statement.strip() for statement in statements if _has_code(statement)]
+
+def strip_comments(statement: str) -> str:
+    return re.sub(r"/\*.*?\*/", "", re.sub(r"--[^\n]*", "", statement), flags=re.DOTALL).strip()
+
+def _has_code(statement: str) -> bool:
+    return bool(strip_comments(statement))
+
+def _bare_name(name: str) -> str:
+    return name.replace('"', "").split(".")[-1].lower()
+
+def lint(migration: Migration) -> List[str]:
+    """Problems that would make the migration block writes or fail half-applied"""
+    problems = []
+    statements = split_statements(migration.sql)
+    created_tables = {_bare_name(match.group(1)) for match in CREATE_TABLE.finditer(migration.sql)}
+    for statement in statements:
+        # Statements keep the comments above them
+        match = CREATE_INDEX.match(strip_comments(statement))
+        if not match:
+            continue
+        concurrently, if_not_exists, table = match.group(1), match.group(2), _bare_name(match.group(4))
+        if not concurrently and table not in created_tables and ALLOW_BLOCKING_INDEX not in migration.sql:
+            problems.append(f"CREATE INDEX on existing table {table} without CONCURRENTLY blocks writes")
+        if not migration.transactional and not if_not_exists:
+            problems.append(f"CREATE INDEX on {table} outside a transaction needs IF NOT EXISTS to be re-runnable")
+    return problems
+
+class Database:
+    """The few operations the runner needs, for Postgres and SQLite"""
+
+    placeholder = "%s"
+    history_ddl = """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            checksum TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            execution_ms INTEGER
+        )"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    @staticmethod
+    def connect(url: str) -> "Database":
+        if url.startswith("sqlite:///"):
+            return SQLiteDatabase(sqlite3.connect(url[len("sqlite:///"):], isolation_level=None))
+        if url.startswith(("postgres://", "postgresql://")):
+            try:
+                import psycopg2
+            except ImportError:
+                raise MigrationError("psycopg2 is required for Postgres (pip install psycopg2-binary)")
+            connection = psycopg2.connect(url)
+            connection.autocommit = True
+            return Database(connection)
+        raise MigrationError("Database URL must start with postgresql:// or sqlite:///")
+
+    def execute(self, sql: str, params: Tuple = ()):
+        cursor = self.connection.cursor()
+        cursor.execute(sql, params)
+        return cursor
+
+    def query(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        return self.execute(sql, params).fetchall()
+
+    def translate(self, statement: str) -> str:
+        return statement
+
+    def table_exists(self, name: str) -> bool:
+        return self.query("SELECT to_regclass(%s) IS NOT NULL", (f"public.{name}",))[0][0]
+
+    def lock(self):
+        self.execute("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_KEY,))
+
+    def unlock(self):
+        self.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_KEY,))
+
+    def set_lock_timeout(self, timeout: str):
+        self.execute("SELECT set_config('lock_timeout', %s, false)", (timeout,))
+
+    def drop_invalid_index(self, statement: str):
+        """Drop the index a failed CREATE INDEX CONCURRENTLY left behind as invalid"""
+        match = CREATE_INDEX.match(strip_comments(statement))
+        if not match or not match.group(1) or not match.group(3):
+            return
+        name = match.group(3).replace('"', "")
+        invalid = self.query(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.oid = to_regclass(%s) AND NOT i.indisvalid", (name,)
+        )
+        if invalid:
+            logger.warning("Dropping invalid index %s left by an earlier failed build", name)
+            self.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {match.group(3)}")
+
+    def close(self):
+        self.connection.close()
+
+class SQLiteDatabase(Database):
+    """Local stand-in: same bookkeeping, Postgres-only clauses removed"""
+
+    placeholder = "?"
+    history_ddl = Database.history_ddl.replace("TIMESTAMPTZ NOT NULL DEFAULT NOW()", "TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP")
+
+    def execute(self, sql: str, params: Tuple = ()):
+        return self.connection.execute(sql.replace("%s", "?"), params)
+
+    def translate(self, statement: str) -> str:
+        statement = re.sub(r"\bINDEX\s+CONCURRENTLY\b", "INDEX", statement, flags=re.IGNORECASE)
+        return re.sub(r"\bpublic\.", "", statement)
+
+    def table_exists(self, name: str) -> bool:
+        return bool(self.query("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)))
+
+    def lock(self):
+        pass
+
+    def unlock(self):
+        pass
+
+    def set_lock_timeout(self, timeout: str):
+        pass
+
+    def drop_invalid_index(self, statement: str):
+        pass
+
+class MigrationRunner:
+    def __init__(self, database: Database, migrations: List[Migration], lock_timeout: str = LOCK_TIMEOUT,
+                 pre_runner_tables: Optional[Dict[int, str]] = None):
+        self.database = database
+        self.migrations = migrations
+        self.lock_timeout = lock_timeout
+        self.pre_runner_tables = PRE_RUNNER_TABLES if pre_runner_tables is None else pre_runner_tables
+
+    def applied(self) -> Dict[int, Tuple[str, str]]:
+        """version -> (name, checksum) of applied migrations"""
+        self.database.execute(self.database.history_ddl)
+        return {version: (name, digest) for version, name, digest in
+                self.database.query("SELECT version, name, checksum FROM schema_migrations ORDER BY version")}
+
+    def status(self) -> List[Tuple[Migration, str]]:
+        applied = self.applied()
+        statuses = []
+        for migration in self.migrations:
+            if migration.version not in applied:
+                state = "pending"
+            elif applied[migration.version][1] != migration.checksum:
+                state = "changed"
+            else:
+                state = "applied"
+            statuses.append((migration, state))
+        return statuses
+
+    def verify(self) -> List[str]:
+        applied = self.applied()
+        problems = [f"{migration.version:03d}_{migration.name}: checksum differs from the applied file"
+                    for migration, state in self.status() if state == "changed"]
+        on_disk = {migration.version for migration in self.migrations}
+        problems += [f"{version:03d}_{name}: applied but missing from {MIGRATIONS_DIR}"
+                     for version, (name, _) in applied.items() if version not in on_disk]
+        return problems
+
+    def _record(self, migration: Migration, execution_ms: Optional[int]):
+        p = self.database.placeholder
+        self.database.execute(
+            f"INSERT INTO schema_migrations (version, name, checksum, execution_ms) VALUES ({p}, {p}, {p}, {p})",
+            (migration.version, migration.name, migration.checksum, execution_ms)
+        )
+
+    def _apply(self, migration: Migration):
+        statements = [self.database.translate(statement) for statement in split_statements(migration.sql)]
+        started = time.perf_counter()
+        self.database.set_lock_timeout(self.lock_timeout)
+        if migration.transactional:
+            self.database.execute("BEGIN")
+            try:
+                for statement in statements:
+                    self.database.execute(statement)
+                self._record(migration, round((time.perf_counter() - started) * 1000))
+                self.database.execute("COMMIT")
+            except Exception:
+                self.database.execute("ROLLBACK")
+                raise
+        else:
+            for statement in statements:
+                self.database.drop_invalid_index(statement)
+                self.database.execute(statement)
+            self._record(migration, round((time.perf_counter() - started) * 1000))
+
+    def applied_by_hand(self) -> int:
+        """Last pre-runner migration whose table exists when none is recorded (0: nothing to adopt)
+
+        Refuses a gap (say 001 and 003 applied, 002 not): which of them to
+        record is then a decision for baseline, not a guess.
+        """
+        if self.applied():
+            return 0
+        present = [version for version, table in sorted(self.pre_runner_tables.items())
+                   if self.database.table_exists(table)]
+        if present and present != list(range(1, len(present) + 1)):
+            raise MigrationError(
+                f"Tables of migrations {present} exist but schema_migrations is empty; "
+                "run 'migrate.py baseline N' for the last migration applied by hand"
+            )
+        return present[-1] if present else 0
+
+    def up(self, target: Optional[int] = None, dry_run: bool = False) -> List[Migration]:
+        """Apply pending migrations up to target; refuses to run past changed ones"""
+        self.database.lock()
+        try:
+            problems = self.verify()
+            if problems:
+                raise MigrationError("Applied migrations differ from disk:\n  " + "\n  ".join(problems))
+
+            adopted = self.applied_by_hand()
+            if adopted:
+                logger.warning("Tables of 001-%03d exist without schema_migrations rows, recording them as applied", adopted)
+                if not dry_run:
+                    self.baseline(adopted)
+
+            pending = [migration for migration, state in self.status()
+                       if state == "pending" and migration.version > adopted
+                       and (target is None or migration.version <= target)]
+            for migration in pending:
+                problems = lint(migration)
+                if problems:
+                    raise MigrationError(f"{os.path.basename(migration.path)}:\n  " + "\n  ".join(problems))
+
+            for migration in pending:
+                mode = "in a transaction" if migration.transactional else "statement by statement"
+                if dry_run:
+                    logger.info("Would apply %03d_%s %s", migration.version, migration.name, mode)
+                    continue
+                logger.info("Applying %03d_%s %s", migration.version, migration.name, mode)
+                try:
+                    self._apply(migration)
+                except Exception as e:
+                    raise MigrationError(f"{os.path.basename(migration.path)} failed: {str(e)}") from e
+            return pending
+        finally:
+            self.database.unlock()
+
+    def baseline(self, version: int) -> List[Migration]:
+        """Record migrations up to version as applied without running them"""
+        applied = self.applied()
+        marked = [migration for migration in self.migrations
+                  if migration.version <= version and migration.version not in applied]
+        for migration in marked:
+            self._record(migration, None)
+        return marked
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply versioned SQL migrations")
+    parser.add_argument("command", choices=["status", "up", "baseline", "verify"])
+    parser.add_argument("version", nargs="?", type=int, help="Last version for baseline")
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    parser.add_argument("--migrations-dir", default=MIGRATIONS_DIR)
+    parser.add_argument("--target", type=int, help="Apply up to this version")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if not args.database_url:
+        parser.error("Set NORDFLYTT_DATABASE_URL or pass --database-url")
+    if args.command == "baseline" and args.version is None:
+        parser.error("baseline needs a version")
+
+    database = Database.connect(args.database_url)
+    runner = MigrationRunner(database, load_migrations(args.migrations_dir))
+    try:
+        if args.command == "status":
+            for migration, state in runner.status():
+                print(f"{migration.version:03d}  {state:<8}  {migration.name}")
+        elif args.command == "verify":
+            problems = runner.verify()
+            for problem in problems:
+                print(f"❌ {problem}")
+            if problems:
+                sys.exit(1)
+            print("✅ Applied migrations match the files on disk")
+        elif args.command == "baseline":
+            for migration in runner.baseline(args.version):
+                print(f"Marked {migration.version:03d}_{migration.name} as applied")
+        else:
+            applied = runner.up(args.target, args.dry_run)
+            print(f"{'Would apply' if args.dry_run else 'Applied'} {len(applied)} migration(s)")
+    except MigrationError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    finally:
+        database.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+-- Indexes for the lookups the API issues on every request
+-- (python check_query_plans.py verifies each query uses one).
+-- Built CONCURRENTLY so jobs and customers stay writable while they build;
+-- migrate.py runs this file statement by statement, outside a transaction.
+
+-- customer-lookup: jobs of a customer, newest first.
+-- booking-details: jobs by customer_email, or customer_email and date,
+-- newest first. Equality on both columns and ORDER BY date DESC are all
+-- served by this one index, so no separate (customer_email, date) index.
+-- total_amount is included so per-customer sums and counts (VIP status)
+-- can be answered from the index alone.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_jobs_customer_email_date
+    ON public.jobs (customer_email, date DESC)
+    INCLUDE (total_amount);
+
+-- booking-details by reference number (same name as in
+-- database/migrations/007, so this is skipped where that ran)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_jobs_reference_number
+    ON public.jobs (reference_number);
+
+-- customer-lookup, and the known-emails filter (an index-only scan of email)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_customers_email
+    ON public.customers (email);
+
+-- Customer context refresh: rows changed since the last watermark
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_support_tickets_updated_at
+    ON public.support_tickets (updated_at);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_jobs_updated_at
+    ON public.jobs (updated_at);
@@ -0,0 +1,140 @@
+-- Delta-based maintenance of customers.total_spent and vip_status
+-- The old update_vip_status_trigger re-ran SUM(total_amount) and COUNT(*)
+-- over all of a customer's jobs, twice, for every inserted or updated job,
+-- which made bulk job imports quadratic. Customers now keep job_count next
+-- to total_spent, and each job change adds or subtracts its own amount.
+-- VIP rule unchanged: at least 3 jobs or more than 50 000 kr spent.
+--
+-- Row-level triggers handle normal traffic. For bulk loads, run
+--     SET LOCAL nordflytt.vip_maintenance = 'statement';
+-- in the loading transaction: the row-level triggers are then skipped and
+-- statement-level triggers apply one aggregated delta per customer from the
+-- statement's transition tables.
+--
+-- python reconcile_vip_status.py recounts customers in batches and repairs
+-- any drift. Run it once after this migration, then nightly: existing
+-- customers start with job_count NULL (not counted yet), and the first run
+-- fills it in. This migration doesn't backfill, so it never rewrites every
+-- customer while holding the lock on jobs its trigger changes take.
+
+-- Created by create_tables.py's UPDATE_EXISTING_TABLES_SQL, but not by any
+-- earlier migration
+ALTER TABLE public.customers
+ADD COLUMN IF NOT EXISTS total_spent DECIMAL(10,2) DEFAULT 0,
+ADD COLUMN IF NOT EXISTS vip_status BOOLEAN DEFAULT false;
+
+-- Without a default while adding, so existing rows are NULL until counted
+ALTER TABLE public.customers
+ADD COLUMN IF NOT EXISTS job_count INTEGER;
+ALTER TABLE public.customers
+ALTER COLUMN job_count SET DEFAULT 0;
+
+-- Apply per-customer deltas; the only place the VIP rule lives. While a
+-- customer's job_count is still NULL, its job-count half of the rule keeps
+-- the vip_status from before.
+CREATE OR REPLACE FUNCTION public.apply_customer_job_deltas(p_emails TEXT[], p_jobs INTEGER[], p_amounts NUMERIC[])
+RETURNS void AS $$
+    UPDATE public.customers c
+    SET
+        job_count = c.job_count + d.jobs,
+        total_spent = COALESCE(c.total_spent, 0) + d.amount,
+        vip_status = (COALESCE(c.job_count + d.jobs >= 3, c.vip_status, false)
+                      OR COALESCE(c.total_spent, 0) + d.amount > 50000)
+    FROM (
+        SELECT email, SUM(jobs) AS jobs, SUM(amount) AS amount
+        FROM unnest(p_emails, p_jobs, p_amounts) AS u(email, jobs, amount)
+        WHERE email IS NOT NULL
+        GROUP BY email
+        HAVING SUM(jobs) <> 0 OR SUM(amount) <> 0
+    ) d
+    WHERE c.email = d.email;
+$$ LANGUAGE sql;
+
+-- Row-level: one job's delta
+CREATE OR REPLACE FUNCTION public.update_customer_vip_status()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM public.apply_customer_job_deltas(
+            ARRAY[NEW.customer_email], ARRAY[1], ARRAY[COALESCE(NEW.total_amount, 0)]);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM public.apply_customer_job_deltas(
+            ARRAY[OLD.customer_email], ARRAY[-1], ARRAY[-COALESCE(OLD.total_amount, 0)]);
+    ELSIF OLD.customer_email IS DISTINCT FROM NEW.customer_email
+          OR OLD.total_amount IS DISTINCT FROM NEW.total_amount THEN
+        PERFORM public.apply_customer_job_deltas(
+            ARRAY[OLD.customer_email, NEW.customer_email],
+            ARRAY[-1, 1],
+            ARRAY[-COALESCE(OLD.total_amount, 0), COALESCE(NEW.total_amount, 0)]);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement-level: all rows of the statement, aggregated per customer
+CREATE OR REPLACE FUNCTION public.update_customer_vip_status_bulk()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_emails TEXT[];
+    v_jobs INTEGER[];
+    v_amounts NUMERIC[];
+BEGIN
+    -- Transition tables only exist for the events that declare them
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(customer_email), array_agg(1), array_agg(COALESCE(total_amount, 0))
+        INTO v_emails, v_jobs, v_amounts
+        FROM new_jobs;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(customer_email), array_agg(-1), array_agg(-COALESCE(total_amount, 0))
+        INTO v_emails, v_jobs, v_amounts
+        FROM old_jobs;
+    ELSE
+        SELECT array_agg(email), array_agg(delta_jobs), array_agg(delta_amount)
+        INTO v_emails, v_jobs, v_amounts
+        FROM (
+            SELECT customer_email AS email, -1 AS delta_jobs, -COALESCE(total_amount, 0) AS delta_amount FROM old_jobs
+            UNION ALL
+            SELECT customer_email, 1, COALESCE(total_amount, 0) FROM new_jobs
+        ) changes;
+    END IF;
+    IF v_emails IS NOT NULL THEN
+        PERFORM public.apply_customer_job_deltas(v_emails, v_jobs, v_amounts);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS update_vip_status_trigger ON public.jobs;
+CREATE TRIGGER update_vip_status_trigger
+AFTER INSERT OR DELETE OR UPDATE OF customer_email, total_amount ON public.jobs
+FOR EACH ROW
+WHEN (current_setting('nordflytt.vip_maintenance', true) IS DISTINCT FROM 'statement')
+EXECUTE FUNCTION public.update_customer_vip_status();
+
+-- Transition tables allow one event per trigger and no column list
+DROP TRIGGER IF EXISTS update_vip_status_bulk_insert ON public.jobs;
+CREATE TRIGGER update_vip_status_bulk_insert
+AFTER INSERT ON public.jobs
+REFERENCING NEW TABLE AS new_jobs
+FOR EACH STATEMENT
+WHEN (current_setting('nordflytt.vip_maintenance', true) = 'statement')
+EXECUTE FUNCTION public.update_customer_vip_status_bulk();
+
+DROP TRIGGER IF EXISTS update_vip_status_bulk_update ON public.jobs;
+CREATE TRIGGER update_vip_status_bulk_update
+AFTER UPDATE ON public.jobs
+REFERENCING OLD TABLE AS old_jobs NEW TABLE AS new_jobs
+FOR EACH STATEMENT
+WHEN (current_setting('nordflytt.vip_maintenance', true) = 'statement')
+EXECUTE FUNCTION public.update_customer_vip_status_bulk();
+
+DROP TRIGGER IF EXISTS update_vip_status_bulk_delete ON public.jobs;
+CREATE TRIGGER update_vip_status_bulk_delete
+AFTER DELETE ON public.jobs
+REFERENCING OLD TABLE AS old_jobs
+FOR EACH STATEMENT
+WHEN (current_setting('nordflytt.vip_maintenance', true) = 'statement')
+EXECUTE FUNCTION public.update_customer_vip_status_bulk();
+
+COMMENT ON COLUMN public.customers.job_count IS 'Number of jobs, kept by update_vip_status triggers; NULL until reconcile_vip_status.py has counted the customer';
+COMMENT ON FUNCTION public.apply_customer_job_deltas IS 'Add job count and amount deltas per customer and re-derive vip_status';
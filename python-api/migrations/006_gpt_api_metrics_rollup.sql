@@ -0,0 +1,118 @@
+-- Hourly rollup of gpt_analytics, maintained incrementally
+-- The gpt_api_metrics view re-aggregated all of gpt_analytics with
+-- GROUP BY DATE_TRUNC('hour', timestamp) on every read. python
+-- analytics_rollup.py (run every minute) now folds only rows ingested since
+-- its watermark into gpt_api_metrics_hourly: per endpoint and hour, call and
+-- success counts, latency sum/min/max and a mergeable latency sketch
+-- (drift_monitor.QuantileSketch as JSON), so percentiles over any range of
+-- hours come from merging sketches instead of reading raw rows.
+--
+-- gpt_api_metrics is kept as a view, now over the rollup, where it was a
+-- view before; databases where it is the metrics table of the original
+-- 002 migration keep that table.
+
+-- The API writes here; created by create_tables.py, repeated so this
+-- migration also works on a database set up from migrations/ alone
+CREATE TABLE IF NOT EXISTS public.gpt_analytics (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    endpoint VARCHAR(100) NOT NULL,
+    customer_email VARCHAR(255),
+    success BOOLEAN NOT NULL DEFAULT true,
+    response_time_ms INTEGER,
+    error_message TEXT,
+    request_data JSONB,
+    response_data JSONB,
+    api_key_used VARCHAR(50),
+    timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- When the row was written, by the database clock. timestamp is set by the
+-- client and may lag or lead, so the rollup watermark uses this instead.
+-- A constant default: no table rewrite, existing rows share the
+-- migration's time and are folded in by the first run.
+ALTER TABLE public.gpt_analytics
+ADD COLUMN IF NOT EXISTS ingested_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+
+CREATE TABLE IF NOT EXISTS public.gpt_api_metrics_hourly (
+    endpoint VARCHAR(100) NOT NULL,
+    hour TIMESTAMPTZ NOT NULL,
+    total_calls BIGINT NOT NULL DEFAULT 0,
+    successful_calls BIGINT NOT NULL DEFAULT 0,
+    -- Calls with a response_time_ms; the average is latency_sum_ms / latency_count
+    latency_count BIGINT NOT NULL DEFAULT 0,
+    latency_sum_ms BIGINT NOT NULL DEFAULT 0,
+    latency_min_ms INTEGER,
+    latency_max_ms INTEGER,
+    latency_sketch JSONB,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (endpoint, hour)
+);
+
+CREATE INDEX IF NOT EXISTS idx_gpt_api_metrics_hourly_hour ON public.gpt_api_metrics_hourly (hour DESC);
+
+-- Watermark: the last (ingested_at, id) folded into the rollup
+CREATE TABLE IF NOT EXISTS public.gpt_analytics_rollup_state (
+    name TEXT PRIMARY KEY,
+    last_ingested_at TIMESTAMPTZ NOT NULL,
+    last_id UUID NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO public.gpt_analytics_rollup_state (name, last_ingested_at, last_id)
+VALUES ('gpt_api_metrics_hourly', '-infinity', '00000000-0000-0000-0000-000000000000')
+ON CONFLICT (name) DO NOTHING;
+
+-- Quantile q of a latency sketch, as drift_monitor.QuantileSketch.quantile
+CREATE OR REPLACE FUNCTION public.sketch_quantile(p_sketch JSONB, p_q DOUBLE PRECISION)
+RETURNS DOUBLE PRECISION AS $$
+    WITH sketch AS (
+        SELECT
+            (p_sketch->>'count')::BIGINT AS total,
+            (p_sketch->>'zero_count')::BIGINT AS zeros,
+            p_q * ((p_sketch->>'count')::BIGINT - 1) AS rank,
+            (1 + (p_sketch->>'relative_accuracy')::DOUBLE PRECISION)
+                / (1 - (p_sketch->>'relative_accuracy')::DOUBLE PRECISION) AS gamma
+    ), buckets AS (
+        SELECT key::INTEGER AS bucket, SUM(value::BIGINT) OVER (ORDER BY key::INTEGER) AS seen
+        FROM jsonb_each_text(p_sketch->'buckets')
+    )
+    SELECT CASE
+        WHEN total IS NULL OR total = 0 THEN NULL
+        WHEN rank < zeros THEN 0
+        ELSE (
+            SELECT 2 * power(gamma, bucket) / (gamma + 1)
+            FROM buckets
+            WHERE zeros + seen > rank
+            ORDER BY bucket
+            LIMIT 1
+        )
+    END
+    FROM sketch;
+$$ LANGUAGE sql IMMUTABLE;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_class
+                   WHERE relname = 'gpt_api_metrics' AND relnamespace = 'public'::regnamespace AND relkind <> 'v') THEN
+        DROP VIEW IF EXISTS public.gpt_api_metrics;
+        CREATE VIEW public.gpt_api_metrics AS
+        SELECT
+            endpoint,
+            total_calls,
+            successful_calls,
+            total_calls - successful_calls AS failed_calls,
+            latency_sum_ms::NUMERIC / NULLIF(latency_count, 0) AS avg_response_time,
+            latency_min_ms AS min_response_time,
+            latency_max_ms AS max_response_time,
+            hour,
+            public.sketch_quantile(latency_sketch, 0.95) AS p95_response_time
+        FROM public.gpt_api_metrics_hourly
+        ORDER BY hour DESC;
+        GRANT SELECT ON public.gpt_api_metrics TO authenticated;
+    END IF;
+END $$;
+
+GRANT SELECT ON public.gpt_api_metrics_hourly TO authenticated;
+
+COMMENT ON TABLE public.gpt_api_metrics_hourly IS 'Per endpoint and hour gpt_analytics rollup, maintained by analytics_rollup.py';
+COMMENT ON FUNCTION public.sketch_quantile IS 'Quantile of a QuantileSketch stored as JSON';
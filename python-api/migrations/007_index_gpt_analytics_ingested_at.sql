@@ -0,0 +1,4 @@
+-- Watermark scan of analytics_rollup.py: rows after (ingested_at, id)
+-- Built CONCURRENTLY so the API can keep logging analytics meanwhile.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_gpt_analytics_ingested_at
+    ON public.gpt_analytics (ingested_at, id);
@@ -0,0 +1,36 @@
+-- migrate:no-transaction
+-- Groundwork for partitioning gpt_analytics by month (migration 009)
+-- 009 turns the existing table into the first partition of a new
+-- partitioned gpt_analytics instead of copying its rows. Everything slow
+-- about that happens here, statement by statement, without blocking the
+-- API's analytics writes:
+--   * the (id, timestamp) primary key every partition needs, built concurrently
+--   * timestamp made non-null (the partition key cannot be null)
+--   * a CHECK constraint proving every row lies before the first monthly
+--     partition, validated with a lock that lets writes through, so 009's
+--     ATTACH PARTITION does not rescan the table under an exclusive lock
+-- Apply 008 and 009 in one run (migrate.py up does): in between, rows dated
+-- after the current month are rejected by the CHECK.
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_gpt_analytics_id_timestamp
+    ON public.gpt_analytics (id, timestamp);
+
+UPDATE public.gpt_analytics SET timestamp = ingested_at WHERE timestamp IS NULL;
+
+-- Bounded at the next month boundary, the earliest bound the current
+-- month's rows allow: the legacy partition then ends with this month, monthly
+-- partitions start with the next one, and retention can drop the legacy
+-- partition as soon as this month expires
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint
+                   WHERE conname = 'gpt_analytics_legacy_range' AND conrelid = 'public.gpt_analytics'::regclass) THEN
+        EXECUTE format(
+            'ALTER TABLE public.gpt_analytics ADD CONSTRAINT gpt_analytics_legacy_range '
+            'CHECK (timestamp IS NOT NULL AND timestamp < %L) NOT VALID',
+            date_trunc('month', NOW()) + INTERVAL '1 month'
+        );
+    END IF;
+END $$;
+
+ALTER TABLE public.gpt_analytics VALIDATE CONSTRAINT gpt_analytics_legacy_range;
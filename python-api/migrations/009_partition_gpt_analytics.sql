@@ -0,0 +1,90 @@
+-- Range-partition gpt_analytics by month
+-- Every insert and each of the three indexes got more expensive as one heap
+-- table accumulated request_data/response_data forever. gpt_analytics is now
+-- partitioned by timestamp into gpt_analytics_YYYY_MM tables, so:
+--   * inserts only touch the current month's table and indexes
+--   * queries filtering on timestamp (the dashboard's last 24h/7d/30d, the
+--     rollup rebuild) only scan the matching months
+--   * old months are detached and dropped whole (python analytics_partitions.py)
+-- The existing table is renamed gpt_analytics_legacy and attached as the
+-- partition holding everything up to the end of the month 008 ran in; the
+-- constraint validated in 008 lets the attach skip the scan, so no rows are
+-- copied and writes are blocked only for the catalog changes. Monthly
+-- partitions start with the following month.
+
+ALTER TABLE public.gpt_analytics RENAME TO gpt_analytics_legacy;
+
+-- Free the index names for the partitioned table (ALTER INDEX ... RENAME is catalog-only)
+ALTER INDEX IF EXISTS public.idx_gpt_analytics_endpoint RENAME TO idx_gpt_analytics_legacy_endpoint;
+ALTER INDEX IF EXISTS public.idx_gpt_analytics_timestamp RENAME TO idx_gpt_analytics_legacy_timestamp;
+ALTER INDEX IF EXISTS public.idx_gpt_analytics_customer_email RENAME TO idx_gpt_analytics_legacy_customer_email;
+ALTER INDEX IF EXISTS public.idx_gpt_analytics_ingested_at RENAME TO idx_gpt_analytics_legacy_ingested_at;
+
+-- The validated CHECK from 008 proves NOT NULL without a scan
+ALTER TABLE public.gpt_analytics_legacy ALTER COLUMN timestamp SET NOT NULL;
+
+-- A partition's primary key has to include the partition key
+ALTER TABLE public.gpt_analytics_legacy
+    DROP CONSTRAINT gpt_analytics_pkey,
+    ADD CONSTRAINT gpt_analytics_legacy_pkey PRIMARY KEY USING INDEX idx_gpt_analytics_id_timestamp;
+
+CREATE TABLE public.gpt_analytics (LIKE public.gpt_analytics_legacy INCLUDING DEFAULTS)
+PARTITION BY RANGE (timestamp);
+
+ALTER TABLE public.gpt_analytics ADD PRIMARY KEY (id, timestamp);
+
+-- Same definitions as the legacy indexes, so attaching reuses them instead of building
+CREATE INDEX idx_gpt_analytics_endpoint ON public.gpt_analytics (endpoint);
+CREATE INDEX idx_gpt_analytics_timestamp ON public.gpt_analytics (timestamp DESC);
+CREATE INDEX idx_gpt_analytics_customer_email ON public.gpt_analytics (customer_email);
+CREATE INDEX idx_gpt_analytics_ingested_at ON public.gpt_analytics (ingested_at, id);
+
+-- Attach up to the bound 008's constraint proves, so no rows are rechecked
+DO $$
+DECLARE
+    legacy_end TIMESTAMPTZ;
+BEGIN
+    SELECT substring(pg_get_constraintdef(oid) FROM '< ''([^'']+)''')::TIMESTAMPTZ
+    INTO legacy_end
+    FROM pg_constraint
+    WHERE conname = 'gpt_analytics_legacy_range' AND conrelid = 'public.gpt_analytics_legacy'::regclass;
+
+    EXECUTE format(
+        'ALTER TABLE public.gpt_analytics ATTACH PARTITION public.gpt_analytics_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+        legacy_end
+    );
+END $$;
+
+ALTER TABLE public.gpt_analytics_legacy DROP CONSTRAINT gpt_analytics_legacy_range;
+
+-- Monthly partitions from this month to p_months_ahead months ahead; months
+-- already covered (by an existing partition or the legacy one) are skipped.
+-- Returns the partitions created. Run daily by analytics_partitions.py.
+CREATE OR REPLACE FUNCTION public.create_gpt_analytics_partitions(p_months_ahead INTEGER DEFAULT 3)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    month_start TIMESTAMPTZ;
+    partition_name TEXT;
+BEGIN
+    FOR i IN 0..p_months_ahead LOOP
+        month_start := date_trunc('month', NOW()) + make_interval(months => i);
+        partition_name := 'gpt_analytics_' || to_char(month_start, 'YYYY_MM');
+        CONTINUE WHEN to_regclass('public.' || partition_name) IS NOT NULL;
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE public.%I PARTITION OF public.gpt_analytics FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, month_start + INTERVAL '1 month'
+            );
+            RETURN NEXT partition_name;
+        EXCEPTION WHEN invalid_object_definition THEN
+            -- Overlaps gpt_analytics_legacy
+            NULL;
+        END;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT public.create_gpt_analytics_partitions(3);
+
+COMMENT ON TABLE public.gpt_analytics IS 'GPT API analytics, range-partitioned by month on timestamp';
+COMMENT ON FUNCTION public.create_gpt_analytics_partitions IS 'Create monthly gpt_analytics partitions ahead of time';
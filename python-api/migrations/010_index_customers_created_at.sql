@@ -0,0 +1,5 @@
+-- Known-emails poll of warmup.py: customers created since the newest one
+-- seen, paged by (created_at, id).
+-- Built CONCURRENTLY so the CRM can keep creating customers meanwhile.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_customers_created_at
+    ON public.customers (created_at, id);
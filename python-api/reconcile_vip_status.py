@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Batched reconciliation of customers.job_count, total_spent and vip_status
+The jobs triggers (migrations/005) keep these by adding and subtracting
+deltas, so a missed or doubled delta (a trigger disabled during a restore,
+a bulk load without the statement-level mode) would otherwise persist.
+This recounts customers in e-mail order, BATCH_SIZE at a time, and rewrites
+only the rows that drifted. Each batch locks its customers first, so a job
+written meanwhile either is counted here or applies its delta afterwards.
+
+Usage:
+    NORDFLYTT_DATABASE_URL=postgresql://... python reconcile_vip_status.py
+    python reconcile_vip_status.py --dry-run --batch-size 200
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import List, Tuple
+
+from migrate import DATABASE_URL, Database, MigrationError, SQLiteDatabase
+
+BATCH_SIZE = int(os.getenv("NORDFLYTT_RECONCILE_BATCH_SIZE", "500"))
+# Pause between batches, so reconciliation never competes with traffic for long
+BATCH_PAUSE_SECONDS = float(os.getenv("NORDFLYTT_RECONCILE_PAUSE_SECONDS", "0.1"))
+
+# Same rule as apply_customer_job_deltas in migrations/005
+VIP_MIN_JOBS = 3
+VIP_MIN_SPENT = 50000
+
+TOTALS_SQL = f"""
+    SELECT c.email, c.job_count, c.total_spent, c.vip_status, t.jobs, t.spent,
+           (t.jobs >= {VIP_MIN_JOBS} OR t.spent > {VIP_MIN_SPENT}) AS vip
+    FROM customers c
+    JOIN (
+        SELECT b.email, COUNT(j.customer_email) AS jobs, COALESCE(SUM(j.total_amount), 0) AS spent
+        FROM (SELECT DISTINCT email FROM customers WHERE email >= %s AND email <= %s) b
+        LEFT JOIN jobs j ON j.customer_email = b.email
+        GROUP BY b.email
+    ) t ON t.email = c.email
+"""
+
+def _drifted(row: Tuple) -> bool:
+    _, job_count, total_spent, vip_status, jobs, spent, vip = row
+    return (job_count != jobs or float(total_spent or 0) != float(spent)
+            or bool(vip_status) != bool(vip))
+
+def reconcile_batch(database: Database, after: str, batch_size: int, dry_run: bool = False) -> Tuple[List[Tuple], str]:
+    """Repair one batch of customers with e-mail > after: (drifted rows, last e-mail)"""
+    lock = "" if isinstance(database, SQLiteDatabase) else " FOR UPDATE"
+    database.execute("BEGIN")
+    try:
+        emails = [row[0] for row in database.query(
+            f"SELECT email FROM customers WHERE email > %s ORDER BY email LIMIT %s{lock}", (after, batch_size)
+        )]
+        if not emails:
+            database.execute("COMMIT")
+            return [], after
+        drifted = [row for row in database.query(TOTALS_SQL, (emails[0], emails[-1])) if _drifted(row)]
+        if not dry_run:
+            for email, _, _, _, jobs, spent, vip in drifted:
+                database.execute(
+                    "UPDATE customers SET job_count = %s, total_spent = %s, vip_status = %s WHERE email = %s",
+                    (jobs, spent, bool(vip), email)
+                )
+        database.execute("COMMIT")
+    except Exception:
+        database.execute("ROLLBACK")
+        raise
+    return drifted, emails[-1]
+
+def reconcile(database: Database, batch_size: int = BATCH_SIZE, pause: float = BATCH_PAUSE_SECONDS,
+              dry_run: bool = False) -> List[Tuple]:
+    """Walk all customers batch by batch; returns the drifted rows"""
+    drifted: List[Tuple] = []
+    after = ""
+    while True:
+        batch, last = reconcile_batch(database, after, batch_size, dry_run)
+        drifted.extend(batch)
+        if last == after:
+            return drifted
+        after = last
+        time.sleep(pause)
+
+def main():
+    parser = argparse.ArgumentParser(description="Recount customer job totals and repair VIP status drift")
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=BATCH_PAUSE_SECONDS, help="Seconds between batches")
+    parser.add_argument("--dry-run", action="store_true", help="Report drift without repairing it")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("Set NORDFLYTT_DATABASE_URL or pass --database-url")
+
+    try:
+        database = Database.connect(args.database_url)
+    except MigrationError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    try:
+        drifted = reconcile(database, args.batch_size, args.pause, args.dry_run)
+    finally:
+        database.close()
+
+    for email, job_count, total_spent, vip_status, jobs, spent, vip in drifted:
+        print(f"{'Would repair' if args.dry_run else 'Repaired'} {email}: "
+              f"jobs {job_count} → {jobs}, spent {total_spent} → {spent}, VIP {bool(vip_status)} → {bool(vip)}")
+    print(f"✅ {len(drifted)} drifted customers {'found' if args.dry_run else 'repaired'} "
+          f"in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Request body validation straight from bytes
+FastAPI's default body handling decodes the JSON into a dict and then
+validates the dict into the model, walking every request twice. json_body()
+is a dependency that hands the raw body to pydantic-core's model_validate_json
+instead (one pass, no intermediate dict), and json_list_body() does the same
+for batch endpoints through a cached TypeAdapter. Errors are raised as
+RequestValidationError with the usual ("body", ...) locations, so clients
+still get FastAPI's 422 response, and openapi_body() keeps the request schema
+in the generated OpenAPI document used by the Custom GPT actions.
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, List, Type, TypeVar
+
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+import tracing
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+@lru_cache(maxsize=None)
+def list_adapter(model: Type[ModelT]) -> TypeAdapter:
+    """TypeAdapter for List[model]; building one compiles a validator, so reuse it"""
+    return TypeAdapter(List[model])
+
+def _request_errors(error: ValidationError) -> List[Dict[str, Any]]:
+    # A body that isn't valid JSON comes back with the raw bytes as "input",
+    # which FastAPI's 422 handler can't encode when they aren't UTF-8
+    errors = []
+    for item in error.errors(include_url=False):
+        item = {**item, "loc": ("body", *item["loc"])}
+        if isinstance(item.get("input"), (bytes, bytearray)):
+            item["input"] = _decode(item["input"])
+        errors.append(item)
+    return errors
+
+def _decode(body: bytes) -> str:
+    return bytes(body).decode("utf-8", errors="replace")
+
+def validate_json(model: Type[ModelT], body: bytes) -> ModelT:
+    with tracing.span("validate", model=model.__name__):
+        try:
+            return model.model_validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError(_request_errors(e), body=_decode(body))
+
+def validate_json_list(model: Type[ModelT], body: bytes) -> List[ModelT]:
+    with tracing.span("validate", model=f"List[{model.__name__}]"):
+        try:
+            return list_adapter(model).validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError(_request_errors(e), body=_decode(body))
+
+def json_body(model: Type[ModelT]):
+    """Dependency validating the raw request body as model"""
+    async def parse(request: Request) -> ModelT:
+        return validate_json(model, await request.body())
+    return parse
+
+def json_list_body(model: Type[ModelT]):
+    """Dependency validating the raw request body as a JSON array of model"""
+    async def parse(request: Request) -> List[ModelT]:
+        return validate_json_list(model, await request.body())
+    return parse
+
+def openapi_body(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """openapi_extra documenting a body that FastAPI no longer sees as a parameter"""
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": schema}}}}
@@ -0,0 +1,166 @@
+"""
+Hybrid retrieval for GPT RAG search
+Fuses the BM25 ranking (search_index.py) and the vector ranking
+(vector_index.py) with reciprocal-rank fusion: each passage scores
+sum(1 / (RRF_K + rank)) over the rankings it appears in, so neither score
+scale has to be calibrated against the other.
+
+The Custom GPT asks the same policy questions over and over, so results are
+cached per normalised query (NFC, lowercased, punctuation and extra spaces
+dropped) for SEARCH_CACHE_TTL_SECONDS. Both indexes tokenise the normalised
+query exactly as they would the original, so a cached answer is the answer.
+Passages are split once when the indexes are built, and both indexes are
+built from the same passages.
+"""
+
+import logging
+import os
+import time
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import knowledge_base
+import search_index
+import vector_index
+from knowledge_base import Passage
+
+logger = logging.getLogger(__name__)
+
+MODES = ("hybrid", "keyword", "semantic")
+RRF_K = 60
+# Depth of each ranking fed into the fusion
+FUSION_CANDIDATES = 50
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("NORDFLYTT_SEARCH_CACHE_TTL_SECONDS", "600"))
+SEARCH_CACHE_SIZE = int(os.getenv("NORDFLYTT_SEARCH_CACHE_SIZE", "2048"))
+
+def normalize_query(query: str) -> str:
+    return " ".join(search_index.TOKEN.findall(unicodedata.normalize("NFC", query).lower()))
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = RRF_K) -> List[Tuple[Hashable, float]]:
+    """Items of all rankings by fused score, best first"""
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda entry: entry[1], reverse=True)
+
+class ResultCache:
+    """LRU cache whose entries expire after ttl seconds"""
+
+    def __init__(self, size: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL_SECONDS):
+        self.size = size
+        self.ttl = ttl
+        self.entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        if self.size <= 0 or self.ttl <= 0:
+            return
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None
+        }
+
+class Retriever:
+    """Keyword, semantic and hybrid search behind one result cache
+
+    Either index may be None (failed to load); hybrid search then uses the other.
+    """
+
+    def __init__(self, keyword: Optional[search_index.BM25Index], vectors: Optional[vector_index.VectorIndex],
+                 cache: Optional[ResultCache] = None):
+        self.keyword = keyword
+        self.vectors = vectors
+        self.cache = cache if cache is not None else ResultCache()
+        self.passages: Dict[str, Passage] = {}
+        for index in (keyword, vectors):
+            if index is not None:
+                self.passages.update((passage.passage_id, passage) for passage in index.passages)
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def available(self, mode: str) -> bool:
+        if mode == "keyword":
+            return self.keyword is not None
+        if mode == "semantic":
+            return self.vectors is not None
+        return self.keyword is not None or self.vectors is not None
+
+    def _ranking(self, index, query: str, depth: int) -> List[str]:
+        return [passage.passage_id for passage, _ in index.search(query, depth)] if index is not None else []
+
+    def _search(self, query: str, top_k: int, mode: str) -> List[Tuple[Passage, float]]:
+        if mode == "keyword":
+            return self.keyword.search(query, top_k)
+        if mode == "semantic":
+            return self.vectors.search(query, top_k)
+        depth = max(FUSION_CANDIDATES, top_k)
+        fused = reciprocal_rank_fusion([
+            self._ranking(self.keyword, query, depth),
+            self._ranking(self.vectors, query, depth)
+        ])
+        return [(self.passages[passage_id], score) for passage_id, score in fused[:top_k]]
+
+    def search(self, query: str, top_k: int = 5, mode: str = "hybrid", use_cache: bool = True) -> List[Tuple[Passage, float]]:
+        """Best top_k passages for query, served from the cache when possible"""
+        normalized = normalize_query(query)
+        if not use_cache:
+            return self._search(normalized, top_k, mode)
+        key = (mode, top_k, normalized)
+        hits = self.cache.get(key)
+        if hits is None:
+            hits = self._search(normalized, top_k, mode)
+            self.cache.put(key, hits)
+        return hits
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "passages": len(self),
+            "keyword": self.keyword is not None,
+            "vectors": self.vectors.snapshot() if self.vectors is not None else None,
+            "cache": self.cache.snapshot()
+        }
+
+def load_or_build(knowledge_dir: str = knowledge_base.KNOWLEDGE_DIR,
+                  index_dir: str = knowledge_base.INDEX_DIR) -> Retriever:
+    """Both indexes, reloaded when current; the markdown is split at most once"""
+    passages = lru_cache(maxsize=1)(lambda: knowledge_base.load_passages(knowledge_dir))
+    keyword = vectors = None
+    try:
+        keyword = search_index.load_or_build(knowledge_dir, index_dir, load_passages=passages)
+    except Exception as e:
+        logger.error(f"Could not load or build the BM25 index: {str(e)}")
+    try:
+        vectors = vector_index.load_or_build(knowledge_dir, index_dir, load_passages=passages)
+    except Exception as e:
+        logger.error(f"Could not load or build the vector index: {str(e)}")
+    if keyword is None and vectors is None:
+        raise RuntimeError("No knowledge base index could be loaded")
+    return Retriever(keyword, vectors)
@@ -0,0 +1,184 @@
+"""
+BM25 keyword index over the knowledge-base passages
+Swedish-aware: text is NFC-normalised, lowercased, split on letters and
+digits (å, ä, ö included), stripped of Swedish stopwords and reduced with
+the Snowball Swedish stemmer, so "flyttar", "flytten" and "flyttarna" all
+match "flytt".
+
+The index is built once and pickled to INDEX_DIR together with a
+fingerprint of the knowledge directory; the next start reloads it in a few
+milliseconds unless a markdown file changed. Each term's postings are two
+NumPy arrays (passage ids and precomputed BM25 weights), so a query is one
+vectorised add per query term plus an argpartition for the top k.
+"""
+
+import logging
+import math
+import os
+import pickle
+import re
+import tempfile
+import time
+import unicodedata
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import knowledge_base
+from knowledge_base import Passage
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+INDEX_FILE = "bm25.pkl"
+
+K1 = 1.2
+B = 0.75
+
+TOKEN = re.compile(r"[0-9a-zåäöéü]+")
+
+STOPWORDS = frozenset("""
+alla allt att av blev bli blir blivit de dem den denna deras dess dessa det detta dig din dina ditt du där då
+efter ej eller en er era ert ett från för ha hade han hans har henne hennes hon honom hur här i icke ingen inom
+inte jag ju kan kunde man med mellan men mig min mina mitt mot mycket ni nu när någon något några och om oss på
+samma sedan sig sin sina sitta själv skulle som så sådan sådana sådant till under upp ut utan vad var vara varför
+varit varje vars vart vem vi vid vilka vilkas vilken vilket vår våra vårt än är åt över
+""".split())
+
+# Snowball Swedish stemmer (https://snowballstem.org/algorithms/swedish/stemmer.html)
+VOWELS = frozenset("aeiouyäåö")
+STEP1_SUFFIXES = sorted("""
+a arna erna heterna orna ad e ade ande arne are aste en anden aren heten ern ar er heter or as arnas ernas ornas
+es ades andes ens arens hetens erns at andet het ast
+""".split(), key=len, reverse=True)
+S_ENDING = frozenset("bcdfghjklmnoprtvy")
+STEP2_SUFFIXES = ("dd", "gd", "nn", "dt", "gt", "kt", "tt")
+STEP3_SUFFIXES = (("fullt", "full"), ("löst", "lös"), ("lig", ""), ("els", ""), ("ig", ""))
+
+def _r1(word: str) -> int:
+    """Start of R1: after the first non-vowel following a vowel, at least 3"""
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return max(i + 1, 3)
+    return len(word)
+
+def stem(word: str) -> str:
+    r1 = _r1(word)
+
+    for suffix in STEP1_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= r1:
+            word = word[:-len(suffix)]
+            break
+    else:
+        if word.endswith("s") and len(word) - 1 >= r1 and len(word) > 1 and word[-2] in S_ENDING:
+            word = word[:-1]
+
+    if any(word.endswith(suffix) and len(word) - len(suffix) >= r1 for suffix in STEP2_SUFFIXES):
+        word = word[:-1]
+
+    for suffix, replacement in STEP3_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= r1:
+            word = word[:-len(suffix)] + replacement
+            break
+    return word
+
+def tokenize(text: str) -> List[str]:
+    """Stemmed, stopword-free terms of text"""
+    text = unicodedata.normalize("NFC", text).lower()
+    return [stem(token) for token in TOKEN.findall(text) if token not in STOPWORDS]
+
+class BM25Index:
+    """Okapi BM25 over passages, with postings as NumPy arrays"""
+
+    def __init__(self, passages: Sequence[Passage], fingerprint: str = ""):
+        self.passages = list(passages)
+        self.fingerprint = fingerprint
+
+        term_counts = [Counter(tokenize(knowledge_base.passage_text(passage))) for passage in self.passages]
+        lengths = np.array([sum(counts.values()) for counts in term_counts], dtype=np.float32)
+        average_length = float(lengths.mean()) if len(lengths) else 0.0
+        # Length normalisation per passage, shared by all of its terms
+        norms = K1 * (1 - B + B * lengths / average_length) if average_length else lengths
+
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for passage_id, counts in enumerate(term_counts):
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((passage_id, tf))
+
+        total = len(self.passages)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, entries in postings.items():
+            ids = np.array([passage_id for passage_id, _ in entries], dtype=np.int32)
+            tfs = np.array([tf for _, tf in entries], dtype=np.float32)
+            idf = math.log(1 + (total - len(entries) + 0.5) / (len(entries) + 0.5))
+            self.postings[term] = (ids, (idf * tfs * (K1 + 1) / (tfs + norms[ids])).astype(np.float32))
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every passage for query"""
+        scores = np.zeros(len(self.passages), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                # A term lists each passage once, so fancy-index add is safe
+                scores[posting[0]] += posting[1]
+        return scores
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[Passage, float]]:
+        """Best top_k passages with a positive score, best first"""
+        scores = self.scores(query)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self.passages[i], float(scores[i])) for i in candidates]
+
+    def save(self, path: str):
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        # A unique temp file per writer: workers rebuilding at the same time
+        # must not write into each other's file before the rename
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump({"format": FORMAT_VERSION, "index": self}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @staticmethod
+    def load(path: str) -> Optional["BM25Index"]:
+        with open(path, "rb") as f:
+            stored = pickle.load(f)
+        if stored.get("format") != FORMAT_VERSION:
+            return None
+        return stored["index"]
+
+def load_or_build(knowledge_dir: str = knowledge_base.KNOWLEDGE_DIR, index_dir: str = knowledge_base.INDEX_DIR,
+                  load_passages: Optional[Callable[[], List[Passage]]] = None) -> BM25Index:
+    """Reload the saved index if the knowledge directory is unchanged, else rebuild and save it"""
+    started = time.perf_counter()
+    fingerprint = knowledge_base.fingerprint(knowledge_dir)
+    path = os.path.join(index_dir, INDEX_FILE)
+
+    if os.path.exists(path):
+        try:
+            index = BM25Index.load(path)
+            if index is not None and index.fingerprint == fingerprint:
+                logger.info("Loaded BM25 index (%d passages) in %.1f ms", len(index), (time.perf_counter() - started) * 1000)
+                return index
+        except Exception as e:
+            logger.error(f"Could not load BM25 index, rebuilding: {str(e)}")
+
+    passages = load_passages() if load_passages else knowledge_base.load_passages(knowledge_dir)
+    index = BM25Index(passages, fingerprint)
+    try:
+        index.save(path)
+    except OSError as e:
+        logger.error(f"Could not save BM25 index: {str(e)}")
+    logger.info("Built BM25 index (%d passages) in %.1f ms", len(index), (time.perf_counter() - started) * 1000)
+    return index
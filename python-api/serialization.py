@@ -0,0 +1,160 @@
+"""
+Response serialization for the GPT RAG API
+Uses orjson when installed (several times faster than the json module and
+able to serialize NumPy arrays without .tolist() copies) and falls back to
+the standard library otherwise, producing the same compact UTF-8 JSON.
+
+Internal callers (CRM, batch jobs) can ask for MessagePack instead through
+the Accept header, and endpoints returning a list of uniform rows can also
+offer an Arrow IPC stream; JSON stays the default for the Custom GPT and any
+client that does not ask for something else.
+"""
+
+import importlib.util
+import json
+from typing import Any, Dict, Optional, Sequence
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+
+import tracing
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    msgpack = None
+
+FAST_JSON_AVAILABLE = orjson is not None
+MSGPACK_AVAILABLE = msgpack is not None
+# pyarrow is imported on the first Arrow response, it is too heavy for import time
+ARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# Both names are in use; x-msgpack is what most client libraries send
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack")
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+def _default(obj: Any):
+    """Fallback for types the standard json module cannot handle"""
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Serialize content to compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+        default=_default
+    ).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered through dumps (orjson when available)"""
+
+    def render(self, content: Any) -> bytes:
+        with tracing.span("serialize", format="json"):
+            return dumps(content)
+
+class MsgPackResponse(Response):
+    """Response rendered as MessagePack"""
+
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        with tracing.span("serialize", format="msgpack"):
+            return msgpack.packb(content, default=_default, use_bin_type=True)
+
+def flatten_row(row: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Nested dicts as dotted column names ({"a": {"b": 1}} -> {"a.b": 1})"""
+    flat = {}
+    for key, value in row.items():
+        if isinstance(value, dict):
+            flat.update(flatten_row(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+class ArrowStreamResponse(Response):
+    """A list of rows rendered as one Arrow IPC stream, one column per (flattened) field"""
+
+    media_type = ARROW_STREAM_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        import pyarrow as pa
+        with tracing.span("serialize", format="arrow"):
+            table = pa.Table.from_pylist([flatten_row(row) for row in content])
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return sink.getvalue().to_pybytes()
+
+def _accepted(accept: str):
+    """Parse an Accept header into (media_type, q) pairs, best first"""
+    entries = []
+    for position, part in enumerate(accept.split(",")):
+        fields = part.strip().split(";")
+        media_type = fields[0].strip().lower()
+        if not media_type:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        # Stable on position so equal q keeps the client's order
+        entries.append((-q, position, media_type))
+    return [(media_type, -neg_q) for neg_q, _, media_type in sorted(entries)]
+
+def negotiate(accept: Optional[str], offered: Sequence[str]) -> str:
+    """Pick the best offered media type for an Accept header
+
+    offered[0] is the default, returned for a missing header, */* and
+    anything unrecognised, so clients that do not negotiate get JSON.
+    """
+    if not accept:
+        return offered[0]
+    for media_type, q in _accepted(accept):
+        if q <= 0:
+            continue
+        if media_type in offered:
+            return media_type
+        if media_type in ("*/*", "application/*"):
+            return offered[0]
+    return offered[0]
+
+def negotiated_response(request: Request, content: Any, status_code: int = 200,
+                        rows_key: Optional[str] = None) -> Response:
+    """Render content as MessagePack when the caller asks for it, else JSON
+
+    With rows_key set, content[rows_key] is a list of uniform rows and an
+    Arrow IPC stream of those rows is offered too. Asking for Arrow there
+    without pyarrow installed is a 406, not a silent JSON response.
+    """
+    accept = request.headers.get("accept")
+    offered = (JSON_MEDIA_TYPE,) + (MSGPACK_MEDIA_TYPES if MSGPACK_AVAILABLE else ())
+    if rows_key is not None:
+        if ARROW_AVAILABLE:
+            offered += (ARROW_STREAM_MEDIA_TYPE,)
+        elif negotiate(accept, offered + (ARROW_STREAM_MEDIA_TYPE,)) == ARROW_STREAM_MEDIA_TYPE:
+            raise HTTPException(status_code=406, detail="Arrow IPC is not available (pyarrow is not installed)")
+    media_type = negotiate(accept, offered)
+    if media_type == ARROW_STREAM_MEDIA_TYPE:
+        return ArrowStreamResponse(content[rows_key], status_code=status_code, headers={"Vary": "Accept"})
+    if media_type in MSGPACK_MEDIA_TYPES:
+        return MsgPackResponse(content, status_code=status_code, headers={"Vary": "Accept"})
+    return FastJSONResponse(content, status_code=status_code, headers={"Vary": "Accept"})
@@ -0,0 +1,195 @@
+"""
+Structured, queue-backed logging for the GPT RAG API
+Handlers only put the log record on a bounded queue; a background listener
+thread formats it as one JSON line, redacting customer PII on the way. The
+request model is attached unformatted, so building the message, dumping the
+model and redacting it all happen off the event loop. Per-route sampling and
+a level check before anything is built keep disabled logging near free.
+"""
+
+import atexit
+import hashlib
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import tracing
+from serialization import dumps
+
+LOG_LEVEL = os.getenv("NORDFLYTT_LOG_LEVEL", "INFO").upper()
+# Records waiting for the writer thread; beyond this they are dropped, never blocking a request
+LOG_QUEUE_SIZE = int(os.getenv("NORDFLYTT_LOG_QUEUE_SIZE", "10000"))
+# Default fraction of request logs kept, and per-route overrides ("/gpt-rag/calculate-price=0.1,...")
+LOG_SAMPLE_RATE = float(os.getenv("NORDFLYTT_LOG_SAMPLE_RATE", "1.0"))
+LOG_SAMPLE_RATES = os.getenv("NORDFLYTT_LOG_SAMPLE_RATES", "")
+
+# Request fields that identify a customer; logged as a short stable hash so
+# records can still be correlated without storing the value
+HASHED_FIELDS = {"email", "customer_email", "phone"}
+# Free-text fields that may contain anything; only their length is logged
+DROPPED_FIELDS = {"description", "query_context"}
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+PHONE_PATTERN = re.compile(r"(?<!\w)(?:\+46|0)[\d\s-]{7,12}\d")
+
+def _parse_sample_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        route, _, rate = entry.rpartition("=")
+        rates[route.strip()] = float(rate)
+    return rates
+
+SAMPLE_RATES = _parse_sample_rates(LOG_SAMPLE_RATES)
+
+def pseudonymize(value: Any) -> str:
+    return "sha256:" + hashlib.sha256(str(value).strip().lower().encode("utf-8")).hexdigest()[:12]
+
+def scrub(text: str) -> str:
+    """Mask e-mail addresses and Swedish phone numbers in free text"""
+    return PHONE_PATTERN.sub("[phone]", EMAIL_PATTERN.sub("[email]", text))
+
+def redact(fields: Any) -> Any:
+    """Copy of a request model or mapping that is safe to write to logs"""
+    if hasattr(fields, "model_dump"):
+        fields = fields.model_dump()
+    if not isinstance(fields, dict):
+        return fields
+
+    redacted = {}
+    for key, value in fields.items():
+        if value is None:
+            redacted[key] = None
+        elif key in HASHED_FIELDS:
+            redacted[key] = pseudonymize(value)
+        elif key in DROPPED_FIELDS:
+            redacted[key] = f"[redacted {len(str(value))} chars]"
+        elif isinstance(value, dict):
+            redacted[key] = redact(value)
+        elif isinstance(value, str):
+            redacted[key] = scrub(value)
+        else:
+            redacted[key] = value
+    return redacted
+
+class JSONLineFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, route, fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": scrub(record.getMessage())
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id is not None:
+            entry["request_id"] = request_id
+        route = getattr(record, "route", None)
+        if route is not None:
+            entry["route"] = route
+        fields = getattr(record, "fields", None)
+        if fields is not None:
+            entry["fields"] = redact(fields)
+        if record.exc_info:
+            entry["exception"] = scrub(self.formatException(record.exc_info))
+        return dumps(entry).decode("utf-8")
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that defers formatting to the listener and never blocks
+
+    The stock handler formats the message in the calling thread; here the
+    record is queued as is and formatted by the listener. A full queue drops
+    the record and counts it instead of stalling the request.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The request context is only visible on the calling thread
+        record.request_id = tracing.current_request_id()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+        with self._lock:
+            self.queued += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"queued": self.queued, "dropped": self.dropped, "pending": self.queue.qsize()}
+
+_handler: Optional[DroppingQueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def configure(level: str = LOG_LEVEL, stream=None) -> DroppingQueueHandler:
+    """Route all logging through the queue and start the writer thread (idempotent)"""
+    global _handler, _listener
+    if _handler is not None:
+        return _handler
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JSONLineFormatter())
+
+    _handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _listener = logging.handlers.QueueListener(_handler.queue, output, respect_handler_level=False)
+    _listener.start()
+    atexit.register(shutdown)
+    # A preloading master configures logging before forking workers, and
+    # threads do not survive fork: give each child its own queue and writer
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(_handler)
+    root.setLevel(level)
+    return _handler
+
+def _restart_after_fork():
+    global _listener
+    if _handler is None or _listener is None:
+        return
+    _handler._lock = threading.Lock()
+    _handler.queued = _handler.dropped = 0
+    _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _listener = logging.handlers.QueueListener(_handler.queue, *_listener.handlers, respect_handler_level=False)
+    _listener.start()
+
+def shutdown():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def stats() -> Dict[str, int]:
+    return _handler.snapshot() if _handler is not None else {"queued": 0, "dropped": 0, "pending": 0}
+
+def sampled(route: str) -> bool:
+    rate = SAMPLE_RATES.get(route, LOG_SAMPLE_RATE)
+    return rate >= 1.0 or random.random() < rate
+
+def log_request(logger: logging.Logger, route: str, message: str, data: Any = None, level: int = logging.INFO):
+    """Log an incoming request with its (unformatted) body, subject to level and sampling
+
+    Nothing is built when the level is disabled or the route is sampled out;
+    otherwise the record carries the request model itself and the writer
+    thread dumps and redacts it.
+    """
+    if logger.isEnabledFor(level) and sampled(route):
+        logger.log(level, message, extra={"route": route, "fields": data})
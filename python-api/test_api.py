@@ -164,7 +164,57 @@ def run_tests():
         }
     ))
     
-    # Test 8: Invalid API Key
+    # Test 8: Batch Price Calculation
+    results.append(test_endpoint(
+        "Price Calculation - Batch",
+        "POST",
+        "/gpt-rag/calculate-price/batch",
+        [
+            {
+                "volume_m3": 10,
+                "floors_from": 2,
+                "floors_to": 3,
+                "elevator_from": "yes",
+                "elevator_to": "none",
+                "additional_services": [],
+                "distance_km": 15
+            },
+            {
+                "volume_m3": 25,
+                "floors_from": 4,
+                "floors_to": 2,
+                "elevator_from": "none",
+                "elevator_to": "small",
+                "additional_services": ["packing", "cleaning", "piano"],
+                "distance_km": 50
+            }
+        ]
+    ))
+    
+    # Test 9: Knowledge Base Search
+    results.append(test_endpoint(
+        "Knowledge Search - Cancellation",
+        "POST",
+        "/gpt-rag/search",
+        {
+            "query": "Vad kostar det att avboka flytten?",
+            "top_k": 3
+        }
+    ))
+    
+    # Test 10: Customer Context
+    results.append(test_endpoint(
+        "Customer Context - Damage Claim",
+        "POST",
+        "/gpt-rag/customer-context",
+        {
+            "email": "anna.svensson@gmail.com",
+            "query": "TV:n skadades under flytten",
+            "limit": 5
+        }
+    ))
+    
+    # Test 11: Invalid API Key
     print(f"\n{COLORS['blue']}Testing: Authentication{COLORS['reset']}")
     headers = {
         "Authorization": "Bearer invalid_key_12345",
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Tests for the migration runner, against SQLite
+Run with: pytest test_migrate.py
+"""
+
+import os
+
+import pytest
+
+import migrate
+from migrate import Database, Migration, MigrationError, MigrationRunner, SQLiteDatabase, checksum, lint, split_statements
+
+def make_migration(sql, version=1, name="test"):
+    return Migration(version, name, f"{version:03d}_{name}.sql", sql, checksum(sql))
+
+def write_migrations(directory, files):
+    for filename, sql in files.items():
+        with open(os.path.join(directory, filename), "w", encoding="utf-8") as f:
+            f.write(sql)
+    return migrate.load_migrations(str(directory))
+
+@pytest.fixture
+def database(tmp_path):
+    db = Database.connect(f"sqlite:///{tmp_path / 'test.db'}")
+    yield db
+    db.close()
+
+def runner_for(database, migrations):
+    return MigrationRunner(database, migrations, pre_runner_tables={})
+
+def tables(database):
+    return {row[0] for row in database.query("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+# split_statements
+
+def test_split_statements_on_top_level_semicolons():
+    assert split_statements("CREATE TABLE a (id INT);\nCREATE TABLE b (id INT);") == [
+        "CREATE TABLE a (id INT)", "CREATE TABLE b (id INT)"
+    ]
+
+def test_split_statements_keeps_dollar_quoted_bodies():
+    sql = """
+CREATE FUNCTION f() RETURNS void AS $$
+BEGIN
+    UPDATE t SET x = 1;
+    DELETE FROM t;
+END;
+$$ LANGUAGE plpgsql;
+DO $body$ BEGIN PERFORM 1; END $body$;
+"""
+    statements = split_statements(sql)
+    assert len(statements) == 2
+    assert statements[0].endswith("$$ LANGUAGE plpgsql")
+    assert statements[1] == "DO $body$ BEGIN PERFORM 1; END $body$"
+
+def test_split_statements_ignores_semicolons_in_comments_and_quotes():
+    sql = """
+-- a comment; not a statement
+/* block; comment */
+INSERT INTO t VALUES ('a;b', 'it''s; fine', "odd;name");
+-- only a comment at the end;
+"""
+    assert split_statements(sql) == ["""-- a comment; not a statement
+/* block; comment */
+INSERT INTO t VALUES ('a;b', 'it''s; fine', "odd;name")"""]
+
+def test_split_statements_drops_comment_only_statements():
+    assert split_statements("-- nothing here;\n/* nor; here */;") == []
+
+# lint
+
+def test_lint_rejects_blocking_index_on_existing_table():
+    problems = lint(make_migration("CREATE INDEX idx_jobs_date ON public.jobs (date);"))
+    assert problems == ["CREATE INDEX on existing table jobs without CONCURRENTLY blocks writes"]
+
+def test_lint_allows_index_on_table_created_in_the_same_migration():
+    assert lint(make_migration("CREATE TABLE t (id INT);\nCREATE INDEX idx_t ON t (id);")) == []
+
+def test_lint_allows_blocking_index_when_the_file_says_so():
+    assert lint(make_migration("-- migrate:allow-blocking-index\nCREATE INDEX idx_jobs_date ON jobs (date);")) == []
+
+def test_lint_requires_if_not_exists_outside_a_transaction():
+    problems = lint(make_migration("CREATE INDEX CONCURRENTLY idx_jobs_date ON jobs (date);"))
+    assert problems == ["CREATE INDEX on jobs outside a transaction needs IF NOT EXISTS to be re-runnable"]
+    assert lint(make_migration("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_jobs_date ON jobs (date);")) == []
+
+# Applying
+
+def test_up_applies_pending_migrations_once(database, tmp_path):
+    migrations = write_migrations(tmp_path, {
+        "001_create_jobs.sql": "CREATE TABLE public.jobs (id INTEGER PRIMARY KEY, date TEXT);",
+        "002_index_jobs.sql": "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_jobs_date ON public.jobs (date);"
+    })
+    runner = runner_for(database, migrations)
+    assert [m.version for m in runner.up()] == [1, 2]
+    assert [state for _, state in runner.status()] == ["applied", "applied"]
+    assert runner.up() == []
+
+def test_failed_transactional_migration_is_rolled_back(database, tmp_path):
+    migrations = write_migrations(tmp_path, {
+        "001_broken.sql": "CREATE TABLE a (id INT);\nINSERT INTO missing VALUES (1);"
+    })
+    runner = runner_for(database, migrations)
+    with pytest.raises(MigrationError, match="001_broken.sql failed"):
+        runner.up()
+    assert "a" not in tables(database)
+    assert runner.applied() == {}
+
+def test_no_transaction_migration_keeps_earlier_statements_and_reruns(database, tmp_path):
+    write_migrations(tmp_path, {"001_create_jobs.sql": "CREATE TABLE jobs (id INTEGER PRIMARY KEY, date TEXT);"})
+    path = tmp_path / "002_index_jobs.sql"
+    path.write_text(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_jobs_date ON jobs (date);\n"
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_jobs_missing ON jobs (missing);\n"
+    )
+    runner = runner_for(database, migrate.load_migrations(str(tmp_path)))
+    assert not runner.migrations[1].transactional
+    with pytest.raises(MigrationError, match="002_index_jobs.sql failed"):
+        runner.up()
+    # Statement by statement: the first index stays, the migration is not recorded
+    assert database.query("SELECT name FROM sqlite_master WHERE name = 'idx_jobs_date'")
+    assert sorted(runner.applied()) == [1]
+
+    path.write_text(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_jobs_date ON jobs (date);\n"
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_jobs_id_date ON jobs (id, date);\n"
+    )
+    runner = runner_for(database, migrate.load_migrations(str(tmp_path)))
+    assert [m.version for m in runner.up()] == [2]
+
+def test_edited_migration_fails_verify_and_blocks_up(database, tmp_path):
+    path = tmp_path / "001_create_jobs.sql"
+    path.write_text("CREATE TABLE jobs (id INTEGER PRIMARY KEY);")
+    runner_for(database, migrate.load_migrations(str(tmp_path))).up()
+
+    path.write_text("CREATE TABLE jobs (id INTEGER PRIMARY KEY, date TEXT);")
+    (tmp_path / "002_more.sql").write_text("CREATE TABLE more (id INT);")
+    runner = runner_for(database, migrate.load_migrations(str(tmp_path)))
+    assert runner.verify() == ["001_create_jobs: checksum differs from the applied file"]
+    with pytest.raises(MigrationError, match="differ from disk"):
+        runner.up()
+    assert "more" not in tables(database)
+
+def test_crlf_checkout_does_not_change_the_checksum():
+    assert checksum("CREATE TABLE t (id INT);\r\n") == checksum("CREATE TABLE t (id INT);\n")
+
+def test_up_refuses_migrations_failing_lint(database, tmp_path):
+    migrations = write_migrations(tmp_path, {"001_index.sql": "CREATE INDEX idx_jobs_date ON jobs (date);"})
+    with pytest.raises(MigrationError, match="blocks writes"):
+        runner_for(database, migrations).up()
+
+# Migrations applied by hand before the runner
+
+def test_up_records_hand_applied_migrations_instead_of_rerunning_them(database, tmp_path):
+    migrations = write_migrations(tmp_path, {
+        "001_create_a.sql": "CREATE TABLE a (id INT);\nCREATE INDEX idx_a ON a (id);",
+        "002_create_b.sql": "CREATE TABLE b (id INT);",
+        "003_create_c.sql": "CREATE TABLE c (id INT);"
+    })
+    # 001 was pasted into the SQL editor
+    database.execute("CREATE TABLE a (id INT)")
+    database.execute("CREATE INDEX idx_a ON a (id)")
+    runner = MigrationRunner(database, migrations, pre_runner_tables={1: "a", 2: "b"})
+    assert [m.version for m in runner.up()] == [2, 3]
+    assert sorted(runner.applied()) == [1, 2, 3]
+    assert runner.applied()[1][1] == migrations[0].checksum
+
+def test_up_refuses_a_gap_in_hand_applied_migrations(database, tmp_path):
+    migrations = write_migrations(tmp_path, {
+        "001_create_a.sql": "CREATE TABLE a (id INT);",
+        "002_create_b.sql": "CREATE TABLE b (id INT);"
+    })
+    database.execute("CREATE TABLE b (id INT)")
+    runner = MigrationRunner(database, migrations, pre_runner_tables={1: "a", 2: "b"})
+    with pytest.raises(MigrationError, match="baseline"):
+        runner.up()
+    assert runner.applied() == {}
+
+def test_sqlite_translate_drops_postgres_only_clauses(database):
+    assert database.translate("CREATE INDEX CONCURRENTLY IF NOT EXISTS i ON public.jobs (date)") == \
+        "CREATE INDEX IF NOT EXISTS i ON jobs (date)"
+
+# Invalid indexes left by a failed concurrent build (Postgres only, so with a fake connection)
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params=()):
+        self.connection.executed.append((sql, params))
+
+    def fetchall(self):
+        return self.connection.rows
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+def test_drop_invalid_index_drops_an_invalid_index_before_the_retry():
+    connection = FakeConnection(rows=[(1,)])
+    Database(connection).drop_invalid_index("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_jobs_date ON public.jobs (date)")
+    assert connection.executed[0][1] == ("idx_jobs_date",)
+    assert connection.executed[1][0] == "DROP INDEX CONCURRENTLY IF EXISTS idx_jobs_date"
+
+def test_drop_invalid_index_keeps_a_valid_index():
+    connection = FakeConnection(rows=[])
+    Database(connection).drop_invalid_index("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_jobs_date ON jobs (date)")
+    assert len(connection.executed) == 1
+
+def test_drop_invalid_index_ignores_other_statements():
+    connection = FakeConnection(rows=[(1,)])
+    database = Database(connection)
+    database.drop_invalid_index("CREATE INDEX idx_t ON t (id)")
+    database.drop_invalid_index("ALTER TABLE t ADD COLUMN x INT")
+    assert connection.executed == []
+
+def test_no_transaction_migration_checks_each_statement_for_an_invalid_index(database, tmp_path):
+    checked = []
+
+    class RecordingDatabase(SQLiteDatabase):
+        def drop_invalid_index(self, statement):
+            checked.append(statement)
+
+    recording = RecordingDatabase(database.connection)
+    migrations = write_migrations(tmp_path, {
+        "001_create_jobs.sql": "CREATE TABLE jobs (id INTEGER PRIMARY KEY, date TEXT);",
+        "002_index_jobs.sql": "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_jobs_date ON jobs (date);"
+    })
+    runner_for(recording, migrations).up()
+    assert checked == ["CREATE INDEX IF NOT EXISTS idx_jobs_date ON jobs (date)"]
+
+def test_statements_after_a_comment_are_still_checked():
+    connection = FakeConnection(rows=[(1,)])
+    Database(connection).drop_invalid_index("-- Lookups by date\nCREATE INDEX CONCURRENTLY IF NOT EXISTS idx_jobs_date ON jobs (date)")
+    assert connection.executed[-1][0] == "DROP INDEX CONCURRENTLY IF EXISTS idx_jobs_date"
+    problems = lint(make_migration("-- Lookups by date\nCREATE INDEX idx_jobs_date ON jobs (date);"))
+    assert problems == ["CREATE INDEX on existing table jobs without CONCURRENTLY blocks writes"]
+
+def test_shipped_migrations_pass_lint():
+    for migration in migrate.load_migrations():
+        assert lint(migration) == [], migration.name
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for request body validation straight from bytes
+Run with: pytest test_request_validation.py
+"""
+
+from typing import List
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from request_validation import json_body, json_list_body
+
+class Item(BaseModel):
+    name: str
+    count: int
+
+app = FastAPI()
+
+@app.post("/item")
+async def item(data: Item = Depends(json_body(Item))):
+    return {"name": data.name}
+
+@app.post("/items")
+async def items(data: List[Item] = Depends(json_list_body(Item))):
+    return {"count": len(data)}
+
+client = TestClient(app)
+
+def test_valid_body():
+    response = client.post("/item", json={"name": "box", "count": 2})
+    assert response.status_code == 200
+    assert response.json() == {"name": "box"}
+
+def test_invalid_field_keeps_body_location():
+    response = client.post("/item", json={"name": "box", "count": "many"})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "count"]
+
+def test_list_body_error_location():
+    response = client.post("/items", json=[{"name": "box", "count": 1}, {"name": "box"}])
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", 1, "count"]
+
+def test_non_utf8_body_is_422():
+    for path in ("/item", "/items"):
+        response = client.post(path, content=b"\xff\xfe", headers={"Content-Type": "application/json"})
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["type"] == "json_invalid"
+        assert response.json()["detail"][0]["input"] == "��"
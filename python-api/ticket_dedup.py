@@ -0,0 +1,198 @@
+"""
+Near-duplicate detection for support tickets
+A customer who repeats the same complaint in chat should not open a new
+ticket each time. Each description is reduced to a MinHash signature over
+its shingles (stemmed words and word pairs), and signatures are bucketed by
+LSH bands under the customer's e-mail and booking reference. A new ticket
+only compares against the few tickets sharing a bucket in its own scope, so
+a lookup costs one signature and a handful of dictionary probes.
+
+Only open tickets are matched: a ticket loaded or refreshed with any other
+status is dropped, so a repeat after a resolution opens a new ticket.
+Tickets are kept for DEDUP_WINDOW_SECONDS and evicted in creation order,
+which bounds memory by the ticket rate of that window (and MAX_TICKETS).
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from search_index import tokenize
+from warmup import normalize_email
+
+NUM_PERMUTATIONS = 64
+BANDS = 16  # 16 bands of 4 rows: candidates from roughly 0.5 Jaccard up
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+SIMILARITY_THRESHOLD = float(os.getenv("NORDFLYTT_DEDUP_THRESHOLD", "0.6"))
+DEDUP_WINDOW_SECONDS = float(os.getenv("NORDFLYTT_DEDUP_WINDOW_SECONDS", str(72 * 3600)))
+MAX_TICKETS = int(os.getenv("NORDFLYTT_DEDUP_MAX_TICKETS", "100000"))
+# support_tickets.status values a new contact can still be linked to
+OPEN_STATUSES = ("open", "in_progress")
+
+# Universal hashing (a * x + b) mod p over 32-bit shingle hashes fits in uint64
+PRIME = np.uint64(4294967291)
+_rng = np.random.default_rng(20250101)
+PERM_A = _rng.integers(1, int(PRIME), size=NUM_PERMUTATIONS, dtype=np.uint64)
+PERM_B = _rng.integers(0, int(PRIME), size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+# Signature of text without words; never matched, or every empty text would be a duplicate
+EMPTY_SIGNATURE = np.full(NUM_PERMUTATIONS, PRIME, dtype=np.uint64)
+
+class TicketRecord(NamedTuple):
+    ticket_number: str
+    customer_email: str
+    booking_reference: Optional[str]
+    issue_type: Optional[str]
+    priority: Optional[str]
+    assigned_team: Optional[str]
+    status: Optional[str]
+    created_at: float
+    signature: np.ndarray
+
+def shingles(text: str) -> Set[str]:
+    stems = tokenize(text)
+    return set(stems) | {f"{a} {b}" for a, b in zip(stems, stems[1:])}
+
+def signature(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERMUTATIONS uint64 values) of text's shingles"""
+    hashed = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles(text)),
+        dtype=np.uint64
+    )
+    if not len(hashed):
+        return EMPTY_SIGNATURE
+    return ((np.outer(hashed, PERM_A) + PERM_B) % PRIME).min(axis=0)
+
+def similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.count_nonzero(first == second)) / NUM_PERMUTATIONS
+
+def _bands(sig: np.ndarray) -> List[bytes]:
+    return [sig[i * ROWS_PER_BAND:(i + 1) * ROWS_PER_BAND].tobytes() for i in range(BANDS)]
+
+def _scopes(email: str, booking_reference: Optional[str]) -> List[str]:
+    scopes = [f"email:{normalize_email(email)}"]
+    if booking_reference:
+        scopes.append(f"booking:{booking_reference.strip().upper()}")
+    return scopes
+
+def _timestamp(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return time.time()
+    # Naive values (create_ticket's datetime.now()) are local time, as timestamp() assumes
+    return parsed.timestamp()
+
+class TicketDeduplicator:
+    """MinHash LSH over recent tickets, scoped by e-mail and booking reference"""
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD, window: float = DEDUP_WINDOW_SECONDS,
+                 max_tickets: int = MAX_TICKETS):
+        self.threshold = threshold
+        self.window = window
+        self.max_tickets = max_tickets
+        self.tickets: Dict[str, TicketRecord] = {}
+        self.buckets: Dict[Tuple[str, int, bytes], List[str]] = {}
+        self.order: Deque[Tuple[float, str]] = deque()
+        self.duplicates_found = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.tickets)
+
+    def _bucket_keys(self, record: TicketRecord):
+        for scope in _scopes(record.customer_email, record.booking_reference):
+            for band, value in enumerate(_bands(record.signature)):
+                yield scope, band, value
+
+    def _remove(self, ticket_number: str):
+        record = self.tickets.pop(ticket_number, None)
+        if record is None:
+            return
+        for key in self._bucket_keys(record):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.remove(ticket_number)
+                if not bucket:
+                    del self.buckets[key]
+
+    def _evict(self, now: float):
+        while self.order and (self.order[0][0] < now - self.window or len(self.tickets) > self.max_tickets):
+            created_at, ticket_number = self.order.popleft()
+            record = self.tickets.get(ticket_number)
+            # Skip queue entries left behind by a re-added ticket
+            if record is not None and record.created_at == created_at:
+                self._remove(ticket_number)
+
+    def add(self, ticket_number: str, customer_email: str, description: str, booking_reference: Optional[str] = None,
+            issue_type: Optional[str] = None, priority: Optional[str] = None, assigned_team: Optional[str] = None,
+            created_at: Optional[float] = None, status: Optional[str] = None):
+        if not ticket_number or not customer_email:
+            return
+        if status is not None and status not in OPEN_STATUSES:
+            # Resolved or closed since it was added
+            with self._lock:
+                self._remove(ticket_number)
+            return
+        created_at = time.time() if created_at is None else created_at
+        if created_at < time.time() - self.window:
+            return
+        record = TicketRecord(ticket_number, customer_email, booking_reference, issue_type, priority, assigned_team,
+                              status, created_at, signature(description))
+        if record.signature is EMPTY_SIGNATURE:
+            return
+        with self._lock:
+            self._remove(ticket_number)
+            self.tickets[ticket_number] = record
+            for key in self._bucket_keys(record):
+                self.buckets.setdefault(key, []).append(ticket_number)
+            self.order.append((created_at, ticket_number))
+            self._evict(time.time())
+
+    def add_row(self, row: Dict[str, Any]):
+        """Add a support_tickets row (ticket_number, customer_email, description, ...)"""
+        self.add(row.get("ticket_number"), row.get("customer_email"), row.get("description") or "",
+                 row.get("booking_reference"), row.get("issue_type"), row.get("priority"),
+                 row.get("assigned_team"), _timestamp(row.get("created_at")), row.get("status"))
+
+    def observe(self, table: str, row: Dict[str, Any]):
+        """Listener for rows loaded by customer_context"""
+        if table == "support_tickets":
+            self.add_row(row)
+
+    def find(self, customer_email: str, description: str,
+             booking_reference: Optional[str] = None) -> Optional[Tuple[TicketRecord, float]]:
+        """The most similar recent ticket in the same scope, if above the threshold"""
+        sig = signature(description)
+        if sig is EMPTY_SIGNATURE:
+            return None
+        probe = TicketRecord("", customer_email, booking_reference, None, None, None, None, 0.0, sig)
+        best = None
+        with self._lock:
+            self._evict(time.time())
+            candidates = {number for key in self._bucket_keys(probe) for number in self.buckets.get(key, ())}
+            for number in candidates:
+                record = self.tickets[number]
+                score = similarity(sig, record.signature)
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (record, score)
+            if best is not None:
+                self.duplicates_found += 1
+        return best
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "tickets": len(self.tickets),
+            "buckets": len(self.buckets),
+            "duplicates_found": self.duplicates_found,
+            "window_hours": round(self.window / 3600, 1)
+        }
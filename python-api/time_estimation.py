@@ -0,0 +1,229 @@
+"""
+In-process time estimation for the GPT RAG API
+Loads the compiled time-estimation forest through the inference.py model_fn
+contract and predicts move hours without a SageMaker round trip. Falls back
+to the volume heuristic when no model (or no ML dependencies) is available.
+"""
+
+import os
+import sys
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# inference.py lives at the repository root next to the training tooling
+INFERENCE_DIR = os.getenv("NORDFLYTT_INFERENCE_DIR", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MODEL_DIR = os.getenv("NORDFLYTT_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model"))
+# An explicitly configured model (as in the production image) has to load:
+# falling back to the heuristic there would hide a broken deploy
+MODEL_REQUIRED = "NORDFLYTT_MODEL_DIR" in os.environ
+
+MIN_HOURS = 3
+
+# Same volume/area ratio and seasonal weather scores as lib/ai/sagemaker/feature-engineering.ts
+VOLUME_PER_SQM = 0.3
+MONTHLY_WEATHER_SCORES = {1: 0.3, 2: 0.3, 3: 0.5, 4: 0.6, 5: 0.8, 6: 0.9, 7: 0.9, 8: 0.9, 9: 0.7, 10: 0.5, 11: 0.4, 12: 0.3}
+
+class InferenceStats:
+    """Counts in-process model calls and their latency in microseconds"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.fallbacks = 0
+        self.total_us = 0.0
+        self.max_us = 0.0
+
+    def record(self, latency_us: float):
+        with self._lock:
+            self.calls += 1
+            self.total_us += latency_us
+            self.max_us = max(self.max_us, latency_us)
+
+    def record_fallback(self):
+        with self._lock:
+            self.fallbacks += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "fallbacks": self.fallbacks,
+                "avg_inference_us": round(self.total_us / self.calls, 1) if self.calls else None,
+                "max_inference_us": round(self.max_us, 1)
+            }
+
+stats = InferenceStats()
+
+def _import_inference():
+    if INFERENCE_DIR not in sys.path:
+        sys.path.insert(0, INFERENCE_DIR)
+    import inference
+    return inference
+
+class ModelUnavailable(RuntimeError):
+    """A required time-estimation model could not be loaded"""
+
+def preload():
+    """Import the model code without loading a model (for a preloading master)"""
+    try:
+        _import_inference()
+    except ImportError as e:
+        if MODEL_REQUIRED:
+            logger.error(f"Model code not preloaded, {MODEL_DIR} cannot be loaded: {str(e)}")
+        else:
+            logger.info(f"Model code not preloaded: {str(e)}")
+
+def load_time_model(model_dir: str = MODEL_DIR, required: bool = MODEL_REQUIRED):
+    """Load the time-estimation model via model_fn, or None if unavailable
+
+    With required set a missing or broken model raises ModelUnavailable
+    instead of falling back to the heuristic.
+    """
+    if not (os.path.isdir(os.path.join(model_dir, "forest")) or os.path.exists(os.path.join(model_dir, "model.joblib"))):
+        if required:
+            raise ModelUnavailable(f"No time-estimation model in {model_dir}")
+        logger.info(f"No time-estimation model in {model_dir}, using heuristic")
+        return None
+
+    try:
+        model = _import_inference().model_fn(model_dir)
+        logger.info(f"Time-estimation model loaded from {model_dir}")
+        return model
+    except Exception as e:
+        if required:
+            raise ModelUnavailable(f"Could not load time-estimation model from {model_dir}: {str(e)}") from e
+        logger.error(f"Could not load time-estimation model: {str(e)}")
+        return None
+
+def heuristic_hours(volume_m3: float) -> float:
+    """Original volume-only estimate (2 movers)"""
+    return max(MIN_HOURS, volume_m3 / 5)
+
+def _elevator_type(elevator: str) -> str:
+    if not elevator or elevator in ["none", "broken", "trappa", "ingen"]:
+        return "ingen"
+    if elevator in ["small", "liten"]:
+        return "liten"
+    return "stor"
+
+def _weather_score(now: datetime) -> float:
+    score = MONTHLY_WEATHER_SCORES.get(now.month, 0.7)
+    if now.weekday() >= 5:
+        score += 0.05
+    if 9 <= now.hour <= 16:
+        score += 0.05
+    elif now.hour < 6 or now.hour > 20:
+        score -= 0.1
+    return max(0.0, min(1.0, score))
+
+def _customer_preparation(services, volume_m3: float) -> float:
+    score = 0.7
+    services = [s.lower() for s in services]
+    if "packing" in services or "packning" in services:
+        score -= 0.2
+    if "cleaning" in services or "städning" in services:
+        score -= 0.1
+    if volume_m3 > 50:
+        score -= 0.1
+    elif volume_m3 < 15:
+        score += 0.1
+    return max(0.1, min(0.95, score))
+
+def price_request_features(data, now: Optional[datetime] = None) -> list:
+    """Map a CalculatePriceRequest to the model's 11 features in model order"""
+    now = now or datetime.now()
+    elevators = [_elevator_type(data.elevator_from), _elevator_type(data.elevator_to)]
+    no_elevator = "ingen" in elevators
+    small_elevator = not no_elevator and "liten" in elevators
+
+    return [
+        min(500.0, max(1.0, data.volume_m3 / VOLUME_PER_SQM)),  # living_area
+        2.0,  # team_size
+        min(200.0, max(0.1, data.distance_km)),  # distance_km
+        float(min(20, max(data.floors_from, data.floors_to, 0))),  # floors
+        _weather_score(now),  # weather_score
+        _customer_preparation(data.additional_services, data.volume_m3),  # customer_preparation
+        heuristic_hours(data.volume_m3),  # enhanced_v21_estimate
+        0.0,  # property_type_villa
+        0.0,  # property_type_kontor
+        1.0 if no_elevator else 0.0,  # elevator_ingen
+        1.0 if small_elevator else 0.0  # elevator_liten
+    ]
+
+def estimate_hours(data, model) -> Tuple[float, str]:
+    """Return (hours_needed, source) for a price request
+
+    Uses the in-process model when loaded and the heuristic otherwise or if
+    prediction fails.
+    """
+    if model is None:
+        return heuristic_hours(data.volume_m3), "heuristic"
+
+    try:
+        import numpy as np
+        inference = _import_inference()
+
+        features = np.array([price_request_features(data)], dtype=np.float32)
+        started = time.perf_counter()
+        with tracing.span("model.predict", rows=1):
+            prediction = inference.predict_fn(features, model)
+        stats.record((time.perf_counter() - started) * 1e6)
+
+        return max(MIN_HOURS, float(prediction["predictions"][0])), "model"
+    except Exception as e:
+        logger.error(f"Time-estimation model failed, using heuristic: {str(e)}")
+        stats.record_fallback()
+        return heuristic_hours(data.volume_m3), "heuristic"
+
+def estimate_hours_batch(requests, model) -> List[Tuple[float, str]]:
+    """estimate_hours for many price requests with a single model call"""
+    if model is None or not requests:
+        return [(heuristic_hours(data.volume_m3), "heuristic") for data in requests]
+
+    try:
+        import numpy as np
+        inference = _import_inference()
+
+        now = datetime.now()
+        features = np.array([price_request_features(data, now) for data in requests], dtype=np.float32)
+        started = time.perf_counter()
+        with tracing.span("model.predict", rows=len(requests)):
+            prediction = inference.predict_fn(features, model)
+        stats.record((time.perf_counter() - started) * 1e6)
+
+        return [(max(MIN_HOURS, float(hours)), "model") for hours in prediction["predictions"]]
+    except Exception as e:
+        logger.error(f"Time-estimation model failed, using heuristic: {str(e)}")
+        stats.record_fallback()
+        return [(heuristic_hours(data.volume_m3), "heuristic") for data in requests]
+
+def warm_up(model, sample_requests) -> int:
+    """Fault in the model's pages and run its predict path once
+
+    Scores the samples on the model directly, so warmup is not counted in
+    stats, drift sketches or shadow scoring. Returns the rows scored.
+    """
+    if model is None or not sample_requests:
+        return 0
+
+    import numpy as np
+    inference = _import_inference()
+
+    # HotSwapModel serves whichever forest is current
+    forest = getattr(model, "current", model)
+    if isinstance(forest, inference.CompiledForest):
+        # The node arrays are memory-mapped; reading them once pulls every page in
+        for name in forest.ARRAYS:
+            getattr(forest, name).sum()
+
+    features = np.array([price_request_features(data) for data in sample_requests], dtype=np.float32)
+    forest.predict(features[:1])
+    forest.predict(features)
+    return len(features)
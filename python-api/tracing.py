@@ -0,0 +1,296 @@
+"""
+Request-scoped tracing for the GPT RAG API
+TracingMiddleware opens a root span per request and gives it a request id
+(X-Request-ID, echoed back in the response). Code below it wraps Supabase
+calls, model inference and serialization in nested spans via span(). When a
+request finishes a tail-based sampler decides whether to keep the whole
+trace: slow and failed requests are always kept, the rest at a low rate.
+Kept traces are written by a background thread as OTLP JSON (one
+ExportTraceServiceRequest per line) to a size-rotated local file, which an
+OpenTelemetry collector's file receiver or any JSON tooling can read.
+"""
+
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# OTLP JSON output; empty disables export (spans and request ids still work)
+TRACE_FILE = os.getenv("NORDFLYTT_TRACE_FILE", "")
+TRACE_MAX_BYTES = int(os.getenv("NORDFLYTT_TRACE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.getenv("NORDFLYTT_TRACE_BACKUPS", "5"))
+# Requests at least this slow (or failed) are always kept; others at TRACE_SAMPLE_RATE
+TRACE_SLOW_MS = float(os.getenv("NORDFLYTT_TRACE_SLOW_MS", "500"))
+TRACE_SAMPLE_RATE = float(os.getenv("NORDFLYTT_TRACE_SAMPLE_RATE", "0.01"))
+
+SERVICE_NAME = "nordflytt-gpt-rag-api"
+REQUEST_ID_HEADER = "x-request-id"
+
+# OTLP span kinds and status codes
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+class Trace:
+    """All spans of one request"""
+
+    __slots__ = ("trace_id", "request_id", "spans", "error")
+
+    def __init__(self, request_id: Optional[str] = None):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.request_id = request_id or self.trace_id
+        self.spans: List["Span"] = []
+        self.error = False
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "attributes", "start_ns", "end_ns", "error")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], kind: int, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None):
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+            self.trace.error = True
+        self.trace.spans.append(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("nordflytt_current_span", default=None)
+
+def current_request_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace.request_id if current is not None else None
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attributes):
+    """Nested span under the current request; a no-op outside a traced request"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(parent.trace, name, parent.span_id, kind, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.end(e)
+        raise
+    else:
+        child.end()
+    finally:
+        _current_span.reset(token)
+
+class TailSampler:
+    """Keep every slow or failed trace and a random fraction of the rest"""
+
+    def __init__(self, slow_ms: float = TRACE_SLOW_MS, sample_rate: float = TRACE_SAMPLE_RATE):
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+
+    def keep(self, root: Span) -> bool:
+        return root.trace.error or root.duration_ms >= self.slow_ms or random.random() < self.sample_rate
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+def otlp_span(item: Span) -> Dict[str, Any]:
+    encoded = {
+        "traceId": item.trace.trace_id,
+        "spanId": item.span_id,
+        "name": item.name,
+        "kind": item.kind,
+        "startTimeUnixNano": str(item.start_ns),
+        "endTimeUnixNano": str(item.end_ns),
+        "attributes": [_attribute(key, value) for key, value in item.attributes.items()],
+        "status": {"code": STATUS_ERROR, "message": item.error} if item.error else {"code": STATUS_UNSET}
+    }
+    if item.parent_id:
+        encoded["parentSpanId"] = item.parent_id
+    return encoded
+
+def otlp_trace(trace: Trace) -> Dict[str, Any]:
+    """A finished trace as an OTLP/JSON ExportTraceServiceRequest"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", SERVICE_NAME),
+                                        _attribute("process.pid", os.getpid())]},
+            "scopeSpans": [{
+                "scope": {"name": "nordflytt.tracing"},
+                "spans": [otlp_span(item) for item in trace.spans]
+            }]
+        }]
+    }
+
+class FileExporter:
+    """Background thread writing traces to a size-rotated JSON-lines file
+
+    Rotation follows logging.handlers.RotatingFileHandler: path.1 is the
+    newest backup and at most `backups` are kept. A full queue drops traces
+    rather than slowing requests down.
+    """
+
+    def __init__(self, path: str, max_bytes: int = TRACE_MAX_BYTES, backups: int = TRACE_BACKUPS,
+                 max_pending: int = 1000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue: queue.Queue = queue.Queue(max_pending)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, trace: Trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _write(self, trace: Trace):
+        line = json.dumps(otlp_trace(trace), separators=(",", ":")) + "\n"
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+            self._rotate()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def _run(self):
+        while True:
+            trace = self._queue.get()
+            # One failed write (disk full, a backup removed meanwhile) loses that
+            # trace only; the thread keeps exporting
+            try:
+                self._write(trace)
+                self.exported += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error writing trace to {self.path}: {str(e)}")
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"exported": self.exported, "dropped": self.dropped, "failed": self.failed,
+                "pending": self._queue.qsize()}
+
+class TracingMiddleware:
+    """ASGI middleware opening the root span and propagating the request id"""
+
+    def __init__(self, app, exporter: Optional[FileExporter] = None, sampler: Optional[TailSampler] = None):
+        self.app = app
+        self.exporter = exporter if exporter is not None else default_exporter()
+        self.sampler = sampler or TailSampler()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+
+        trace = Trace(request_id)
+        root = Span(trace, f"{scope['method']} {scope['path']}", None, KIND_SERVER, {
+            "http.method": scope["method"],
+            "http.target": scope["path"],
+            "request.id": trace.request_id
+        })
+        token = _current_span.set(root)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                root.attributes["http.status_code"] = message["status"]
+                if message["status"] >= 500:
+                    trace.error = True
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER.encode("latin-1"), trace.request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        error = None
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _current_span.reset(token)
+            root.end(error)
+            if self.exporter is not None and self.sampler.keep(root):
+                self.exporter.export(trace)
+
+_default_exporter: Optional[FileExporter] = None
+_default_exporter_lock = threading.Lock()
+
+def trace_path(template: str, pid: Optional[int] = None) -> str:
+    """Per-process trace file: {pid} in template is the process id, added before the extension if missing
+
+    Gunicorn workers share the environment, so one fixed path would have every
+    worker appending to and rotating the same file.
+    """
+    if "{pid}" not in template:
+        root, extension = os.path.splitext(template)
+        template = f"{root}-{{pid}}{extension}"
+    return template.format(pid=os.getpid() if pid is None else pid)
+
+def default_exporter() -> Optional[FileExporter]:
+    """Process-wide exporter for NORDFLYTT_TRACE_FILE, or None when unset"""
+    global _default_exporter
+    if not TRACE_FILE:
+        return None
+    with _default_exporter_lock:
+        if _default_exporter is None:
+            # "{pid}" in the path gives each worker process its own file
+            _default_exporter = FileExporter(trace_path(TRACE_FILE))
+    return _default_exporter
+
+def stats() -> Dict[str, Any]:
+    if _default_exporter is None:
+        return {"enabled": False}
+    return {"enabled": True, "file": _default_exporter.path, **_default_exporter.snapshot()}
@@ -0,0 +1,338 @@
+"""
+Dense vector index over the knowledge-base passages
+Passages are embedded by a pluggable local embedding function (any
+callable taking a list of texts and returning an (n, dim) array, named by
+NORDFLYTT_EMBEDDER as "module:function"). The default embedder hashes
+stemmed words, word pairs and character 4-grams into a fixed-size signed
+vector, so it needs no model download and still matches compounds such as
+"flyttstädning" to "städning".
+
+Vectors are L2-normalised and stored as float32, or as int8 with one scale
+per row (NORDFLYTT_VECTOR_DTYPE=int8, a quarter of the size). Each array is a
+plain .npy file loaded memory-mapped, like the compiled forest in
+inference.py, so all workers share one copy. Search is a matrix-vector
+product and an argpartition. From IVF_MIN_PASSAGES passages on, an IVF index
+(spherical k-means centroids with inverted lists) is built too, and a query
+scores only the passages in its NPROBE nearest lists.
+
+Rebuilds are incremental: vectors are keyed by a hash of the passage text
+and embedder, and only new or changed passages are embedded again. Each
+save writes a new version directory and then switches the "vectors" symlink
+to it in one rename, like publish_forest in inference.py, so a reader never
+mixes files from two builds.
+"""
+
+import hashlib
+import importlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import knowledge_base
+from knowledge_base import Passage
+from search_index import TOKEN, tokenize
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+INDEX_SUBDIR = "vectors"
+ARRAYS = ("vectors", "scales", "centroids", "list_order", "list_offsets")
+# Saved versions kept next to the current one; workers may still map older ones
+KEEP_VERSIONS = 3
+
+EMBEDDER = os.getenv("NORDFLYTT_EMBEDDER", "vector_index:hashing_embedding")
+VECTOR_DTYPE = os.getenv("NORDFLYTT_VECTOR_DTYPE", "float32")
+IVF_MIN_PASSAGES = int(os.getenv("NORDFLYTT_IVF_MIN_PASSAGES", "20000"))
+NPROBE = int(os.getenv("NORDFLYTT_IVF_NPROBE", "8"))
+KMEANS_ITERATIONS = 10
+# Rows scored per block in brute-force int8 search (bounds the float copy)
+SCORE_BLOCK_ROWS = 8192
+
+HASHING_DIM = 512
+
+Embedder = Callable[[Sequence[str]], np.ndarray]
+
+def _hashed(feature: str, dim: int) -> Tuple[int, float]:
+    value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return value % dim, 1.0 if value >> 63 else -1.0
+
+def hashing_embedding(texts: Sequence[str], dim: int = HASHING_DIM) -> np.ndarray:
+    """Signed feature hashing of stems, stem pairs and character 4-grams"""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        stems = tokenize(text)
+        features = [(stem, 1.0) for stem in stems]
+        features += [(f"{a} {b}", 0.5) for a, b in zip(stems, stems[1:])]
+        for word in TOKEN.findall(text.lower()):
+            padded = f"<{word}>"
+            features += [(f"#{padded[i:i + 4]}", 0.25) for i in range(len(padded) - 3)]
+        for feature, weight in features:
+            column, sign = _hashed(feature, dim)
+            vectors[row, column] += sign * weight
+    return vectors
+
+def load_embedder(spec: str = EMBEDDER) -> Embedder:
+    module_name, _, function_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric int8 codes and the per-row scale that restores them"""
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+    codes = np.round(vectors / scales[:, np.newaxis]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def content_hash(passage: Passage, embedder: str) -> str:
+    return hashlib.sha1(f"{embedder}\n{knowledge_base.passage_text(passage)}".encode("utf-8")).hexdigest()
+
+def _top_k(ids: np.ndarray, scores: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    if len(scores) > top_k:
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        ids, scores = ids[best], scores[best]
+    order = np.argsort(-scores, kind="stable")
+    return ids[order], scores[order]
+
+def train_ivf(vectors: np.ndarray, lists: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means centroids (unit length) for the inverted lists"""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), size=min(len(vectors), lists * 64), replace=False)]
+    sample = np.asarray(sample, dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = ~sums.any(axis=1)
+        # Restart empty lists from random samples
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Passage ids grouped by nearest centroid, and the offset of each group"""
+    assignment = np.concatenate([
+        np.argmax(np.asarray(vectors[start:start + SCORE_BLOCK_ROWS], dtype=np.float32) @ centroids.T, axis=1)
+        for start in range(0, len(vectors), SCORE_BLOCK_ROWS)
+    ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+    order = np.argsort(assignment, kind="stable").astype(np.int32)
+    offsets = np.searchsorted(assignment[order], np.arange(len(centroids) + 1)).astype(np.int64)
+    return order, offsets
+
+def _switch_link(path: str, version_dir: str):
+    """Point the path symlink at version_dir with one rename"""
+    parent, name = os.path.split(path)
+    if os.path.isdir(path) and not os.path.islink(path):
+        # Move a pre-versioning index aside so the path can become a symlink
+        try:
+            os.rename(path, os.path.join(parent, f"{name}-legacy-{os.path.basename(version_dir)}"))
+        except FileNotFoundError:
+            pass  # another worker moved it first
+    tmp_link = os.path.join(parent, f".{name}.{os.path.basename(version_dir)}.tmp")
+    os.symlink(os.path.basename(version_dir), tmp_link)
+    os.replace(tmp_link, path)
+
+def _prune_versions(path: str, keep: int = KEEP_VERSIONS):
+    """Delete all but the newest keep version directories of path, never the current one"""
+    parent, name = os.path.split(path)
+    current = os.path.realpath(path)
+    versions = []
+    for entry in os.scandir(parent):
+        if entry.name.startswith(f"{name}-") and entry.is_dir(follow_symlinks=False):
+            try:
+                versions.append((entry.stat(follow_symlinks=False).st_mtime, entry.path))
+            except FileNotFoundError:
+                continue
+    versions.sort(reverse=True)
+    for _, version_dir in versions[keep:]:
+        if os.path.realpath(version_dir) != current:
+            shutil.rmtree(version_dir, ignore_errors=True)
+
+class VectorIndex:
+    """Passage embeddings as one (optionally int8) matrix, plus an optional IVF index"""
+
+    def __init__(self, passages: Sequence[Passage], hashes: List[str], vectors: np.ndarray,
+                 scales: Optional[np.ndarray] = None, centroids: Optional[np.ndarray] = None,
+                 list_order: Optional[np.ndarray] = None, list_offsets: Optional[np.ndarray] = None,
+                 embedder: str = EMBEDDER, fingerprint: str = ""):
+        self.passages = list(passages)
+        self.hashes = hashes
+        self.vectors = vectors
+        self.scales = scales
+        self.centroids = centroids
+        self.list_order = list_order
+        self.list_offsets = list_offsets
+        self.embedder = embedder
+        self.fingerprint = fingerprint
+        self._embed = None
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    @property
+    def dtype(self) -> str:
+        return "int8" if self.scales is not None else "float32"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "passages": len(self.passages),
+            "embedder": self.embedder,
+            "dtype": self.dtype,
+            "ivf_lists": len(self.centroids) if self.centroids is not None else None
+        }
+
+    def embed_query(self, query: str) -> np.ndarray:
+        if self._embed is None:
+            self._embed = load_embedder(self.embedder)
+        return normalize(self._embed([query]))[0]
+
+    def _score_rows(self, rows: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+        """Cosine scores of the given passage ids (all passages when rows is None)"""
+        if self.scales is None:
+            return (self.vectors if rows is None else self.vectors[rows]) @ query
+        if rows is not None:
+            return (self.vectors[rows].astype(np.float32) @ query) * self.scales[rows]
+        return np.concatenate([
+            (self.vectors[start:start + SCORE_BLOCK_ROWS].astype(np.float32) @ query) * self.scales[start:start + SCORE_BLOCK_ROWS]
+            for start in range(0, len(self.vectors), SCORE_BLOCK_ROWS)
+        ])
+
+    def search_vector(self, query: np.ndarray, top_k: int = 5, exact: bool = False,
+                      nprobe: int = NPROBE) -> Tuple[np.ndarray, np.ndarray]:
+        """(passage ids, cosine scores) of the top_k passages, best first"""
+        if not len(self.passages):
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        if self.centroids is None or exact:
+            return _top_k(np.arange(len(self.passages), dtype=np.int32), self._score_rows(None, query), top_k)
+
+        nearest = np.argpartition(-(self.centroids @ query), min(nprobe, len(self.centroids)) - 1)[:nprobe]
+        rows = np.concatenate([self.list_order[self.list_offsets[c]:self.list_offsets[c + 1]] for c in nearest])
+        return _top_k(rows, self._score_rows(rows, query), top_k)
+
+    def search(self, query: str, top_k: int = 5, exact: bool = False) -> List[Tuple[Passage, float]]:
+        ids, scores = self.search_vector(self.embed_query(query), top_k, exact)
+        return [(self.passages[i], float(score)) for i, score in zip(ids, scores) if score > 0]
+
+    @classmethod
+    def build(cls, passages: Sequence[Passage], embedder: str = EMBEDDER, dtype: str = VECTOR_DTYPE,
+              fingerprint: str = "", previous: Optional["VectorIndex"] = None,
+              ivf_min_passages: int = IVF_MIN_PASSAGES) -> "VectorIndex":
+        """Embed passages, reusing previous vectors of unchanged passages"""
+        passages = list(passages)
+        hashes = [content_hash(passage, embedder) for passage in passages]
+        reusable = {}
+        if previous is not None and previous.embedder == embedder:
+            reusable = {digest: i for i, digest in enumerate(previous.hashes)}
+
+        missing = [i for i, digest in enumerate(hashes) if digest not in reusable]
+        vectors = None
+        if missing:
+            embedded = normalize(load_embedder(embedder)([knowledge_base.passage_text(passages[i]) for i in missing]))
+            vectors = np.zeros((len(passages), embedded.shape[1]), dtype=np.float32)
+            vectors[missing] = embedded
+        reused = [(i, reusable[digest]) for i, digest in enumerate(hashes) if digest in reusable]
+        if reused:
+            old_vectors = previous.vectors[[old for _, old in reused]].astype(np.float32)
+            if previous.scales is not None:
+                old_vectors *= previous.scales[[old for _, old in reused], np.newaxis]
+            if vectors is None:
+                vectors = np.zeros((len(passages), old_vectors.shape[1]), dtype=np.float32)
+            vectors[[new for new, _ in reused]] = old_vectors
+        if vectors is None:
+            vectors = np.zeros((0, HASHING_DIM), dtype=np.float32)
+        logger.info("Embedded %d passages, reused %d", len(missing), len(reused))
+
+        centroids = list_order = list_offsets = None
+        if len(passages) >= ivf_min_passages:
+            # Keep trained centroids while the corpus has not doubled since
+            if previous is not None and previous.centroids is not None and previous.embedder == embedder \
+                    and len(passages) <= 2 * len(previous):
+                centroids = np.asarray(previous.centroids, dtype=np.float32)
+            else:
+                centroids = train_ivf(vectors, int(np.sqrt(len(passages))))
+            list_order, list_offsets = assign_lists(vectors, centroids)
+
+        scales = None
+        if dtype == "int8":
+            vectors, scales = quantize(vectors)
+        return cls(passages, hashes, vectors, scales, centroids, list_order, list_offsets, embedder, fingerprint)
+
+    def save(self, path: str):
+        """Write a new version directory next to path and switch the path symlink to it"""
+        path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique per save, so workers rebuilding at the same time never share files
+        version_dir = tempfile.mkdtemp(dir=os.path.dirname(path),
+                                       prefix=f"{os.path.basename(path)}-{time.strftime('%Y%m%d%H%M%S')}-")
+        try:
+            for name in ARRAYS:
+                array = getattr(self, name)
+                if array is not None:
+                    np.save(os.path.join(version_dir, f"{name}.npy"), array)
+
+            meta = {
+                "format": FORMAT_VERSION,
+                "embedder": self.embedder,
+                "dtype": self.dtype,
+                "fingerprint": self.fingerprint,
+                "arrays": [name for name in ARRAYS if getattr(self, name) is not None],
+                "hashes": self.hashes,
+                "passages": [list(passage) for passage in self.passages]
+            }
+            with open(os.path.join(version_dir, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            _switch_link(path, version_dir)
+        except BaseException:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            raise
+        _prune_versions(path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["VectorIndex"]:
+        # Resolve the symlink once, so every file comes from the same version
+        path = os.path.realpath(path)
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT_VERSION:
+            return None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in meta["arrays"]}
+        if len(arrays["vectors"]) != len(meta["passages"]):
+            return None
+        return cls([Passage(*passage) for passage in meta["passages"]], meta["hashes"],
+                   embedder=meta["embedder"], fingerprint=meta["fingerprint"], **arrays)
+
+def load_or_build(knowledge_dir: str = knowledge_base.KNOWLEDGE_DIR, index_dir: str = knowledge_base.INDEX_DIR,
+                  embedder: str = EMBEDDER, dtype: str = VECTOR_DTYPE,
+                  load_passages: Optional[Callable[[], List[Passage]]] = None) -> VectorIndex:
+    """Map the saved index if it is current, else rebuild it incrementally and save it"""
+    started = time.perf_counter()
+    fingerprint = knowledge_base.fingerprint(knowledge_dir)
+    path = os.path.join(index_dir, INDEX_SUBDIR)
+
+    previous = None
+    if os.path.exists(os.path.join(path, "meta.json")):
+        try:
+            previous = VectorIndex.load(path)
+        except Exception as e:
+            logger.error(f"Could not load vector index, rebuilding: {str(e)}")
+    if previous is not None and (previous.fingerprint, previous.embedder, previous.dtype) == (fingerprint, embedder, dtype):
+        logger.info("Loaded vector index (%d passages) in %.1f ms", len(previous), (time.perf_counter() - started) * 1000)
+        return previous
+
+    passages = load_passages() if load_passages else knowledge_base.load_passages(knowledge_dir)
+    index = VectorIndex.build(passages, embedder, dtype, fingerprint, previous)
+    try:
+        index.save(path)
+    except OSError as e:
+        logger.error(f"Could not save vector index: {str(e)}")
+    logger.info("Built vector index (%d passages) in %.1f ms", len(index), (time.perf_counter() - started) * 1000)
+    return index
@@ -0,0 +1,227 @@
+"""
+Worker warmup for the GPT RAG API
+Run by the lifespan handler before a worker accepts requests: opens the
+Supabase connection (TLS handshake, PostgREST schema cache) with one tiny
+query per hot table, loads the known-emails filter, and lets main.py push a
+sample request through pricing, the model, validation and serialization.
+Each step is timed and a failing step is logged and recorded. Only a
+required step (a configured time-estimation model) keeps the worker
+unready; otherwise the API falls back when Supabase or the model are
+unavailable.
+
+The known-emails filter is a Bloom filter over customer e-mails. A lookup
+for an e-mail it has definitely never seen skips both Supabase queries.
+Customers are created by the CRM, not this API, so every
+KNOWN_EMAILS_POLL_SECONDS the refresher adds customers created since the
+newest one in the filter (a new customer is missed for at most that long),
+and every KNOWN_EMAILS_REFRESH_SECONDS it rebuilds the filter, resized and
+without deleted customers.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tables queried on the request path, touched once during warmup
+WARM_TABLES = ("customers", "jobs")
+KNOWN_EMAILS_PAGE_SIZE = 1000  # PostgREST's default max rows per request
+KNOWN_EMAILS_FALSE_POSITIVE_RATE = 0.001
+KNOWN_EMAILS_REFRESH_SECONDS = float(os.getenv("NORDFLYTT_KNOWN_EMAILS_REFRESH_SECONDS", "300"))
+KNOWN_EMAILS_POLL_SECONDS = float(os.getenv("NORDFLYTT_KNOWN_EMAILS_POLL_SECONDS", "5"))
+# Polls re-read this far behind the newest created_at seen, so a customer
+# committed late with an earlier created_at is still picked up
+KNOWN_EMAILS_POLL_OVERLAP = timedelta(seconds=60)
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+def _parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+class KnownEmailFilter:
+    """Bloom filter of customer e-mails (no false negatives, few false positives)
+
+    Only hashes are stored, so the filter holds no customer data in clear.
+    """
+
+    def __init__(self, expected: int, false_positive_rate: float = KNOWN_EMAILS_FALSE_POSITIVE_RATE):
+        expected = max(expected, 1)
+        self.size = max(64, int(-expected * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / expected * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        self.loaded_at = time.time()
+        # created_at of the newest customer added, where polling resumes
+        self.newest_created_at: Optional[datetime] = None
+
+    def _positions(self, email: str):
+        digest = hashlib.blake2b(normalize_email(email).encode("utf-8"), digest_size=16).digest()
+        # Double hashing: k positions from two 64-bit halves
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, email: str):
+        for position in self._positions(email):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, email: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(email))
+
+    @classmethod
+    def from_emails(cls, emails: Iterable[str]) -> "KnownEmailFilter":
+        emails = [email for email in emails if email]
+        known = cls(len(emails))
+        for email in emails:
+            known.add(email)
+        return known
+
+    def add_customers(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Add customer rows (email, created_at) not in the filter yet; returns how many were added"""
+        added = 0
+        for row in rows:
+            email = row.get("email")
+            if email and email not in self:
+                self.add(email)
+                added += 1
+            if row.get("created_at"):
+                created_at = _parse_timestamp(row["created_at"])
+                if self.newest_created_at is None or created_at > self.newest_created_at:
+                    self.newest_created_at = created_at
+        return added
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "emails": self.count,
+            "size_kb": round(len(self.bits) / 1024, 1),
+            "age_seconds": round(time.time() - self.loaded_at),
+            "newest_customer": self.newest_created_at.isoformat() if self.newest_created_at else None
+        }
+
+def load_known_emails(client) -> KnownEmailFilter:
+    """Page through customers.email by id and build the filter"""
+    rows = []
+    last_id = None
+    while True:
+        query = client.table('customers').select('id, email, created_at')
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        page = query.order('id').limit(KNOWN_EMAILS_PAGE_SIZE).execute()
+        rows.extend(page.data or [])
+        if len(page.data or []) < KNOWN_EMAILS_PAGE_SIZE:
+            break
+        last_id = page.data[-1]['id']
+    known = KnownEmailFilter(len(rows))
+    known.add_customers(rows)
+    return known
+
+def add_new_customers(client, known: KnownEmailFilter) -> int:
+    """Add customers created since the newest one in the filter; returns how many were added
+
+    Pages are keyed on (created_at, id) like customer_context._pages: an
+    offset over the non-unique created_at skips or repeats customers created
+    between pages.
+    """
+    since = known.newest_created_at or datetime.fromtimestamp(known.loaded_at, timezone.utc)
+    since -= KNOWN_EMAILS_POLL_OVERLAP
+    added = 0
+    last = None
+    while True:
+        query = client.table('customers').select('id, email, created_at')
+        if last is not None:
+            created_at, row_id = (f'"{value}"' for value in last)
+            query = query.or_(f'created_at.gt.{created_at},and(created_at.eq.{created_at},id.gt.{row_id})')
+        else:
+            query = query.gte('created_at', since.isoformat())
+        page = query.order('created_at,id').limit(KNOWN_EMAILS_PAGE_SIZE).execute()
+        rows = page.data or []
+        added += known.add_customers(rows)
+        if len(rows) < KNOWN_EMAILS_PAGE_SIZE:
+            return added
+        last = (rows[-1]['created_at'], rows[-1]['id'])
+
+def open_connections(client):
+    """One row from each hot table: opens the pooled HTTPS connection and warms PostgREST"""
+    for table in WARM_TABLES:
+        client.table(table).select('*').limit(1).execute()
+
+class Warmup:
+    """Timed warmup steps and the resulting readiness"""
+
+    def __init__(self):
+        self.ready = False
+        self.started_at = None
+        self.duration_ms = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.failed_required: List[str] = []
+
+    def step(self, name: str, func: Callable[[], Any], required: bool = False) -> Optional[Any]:
+        """Run one timed step; a failed required step keeps readiness off"""
+        started = time.perf_counter()
+        try:
+            result = func()
+            self.steps[name] = {"ok": True, "ms": round((time.perf_counter() - started) * 1000, 1)}
+            return result
+        except Exception as e:
+            self.steps[name] = {"ok": False, "ms": round((time.perf_counter() - started) * 1000, 1), "error": str(e)}
+            if required:
+                self.steps[name]["required"] = True
+                self.failed_required.append(name)
+                logger.critical(f"Required warmup step {name} failed, worker stays unready: {str(e)}")
+            else:
+                logger.error(f"Warmup step {name} failed: {str(e)}")
+            return None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+
+    def finish(self):
+        self.duration_ms = round((time.perf_counter() - self.started_at) * 1000, 1)
+        self.ready = not self.failed_required
+        logger.info("Warmup finished in %s ms", self.duration_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "duration_ms": self.duration_ms, "steps": self.steps}
+
+class KnownEmailsRefresher:
+    """Adds new customers to the known-emails filter and rebuilds it in a daemon thread"""
+
+    def __init__(self, client, known: KnownEmailFilter, on_refresh: Callable[[KnownEmailFilter], None],
+                 interval: float = KNOWN_EMAILS_REFRESH_SECONDS, poll_interval: float = KNOWN_EMAILS_POLL_SECONDS):
+        self.client = client
+        self.known = known
+        self.on_refresh = on_refresh
+        self.interval = interval
+        self.poll_interval = poll_interval if poll_interval > 0 else interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="known-emails-refresh", daemon=True)
+
+    def start(self):
+        if self.interval > 0:
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        rebuilt_at = time.monotonic()
+        while not self._stop.wait(self.poll_interval):
+            try:
+                if time.monotonic() - rebuilt_at >= self.interval:
+                    self.known = load_known_emails(self.client)
+                    rebuilt_at = time.monotonic()
+                    self.on_refresh(self.known)
+                else:
+                    # Set bits are only ever added, so lookups can read the filter meanwhile
+                    add_new_customers(self.client, self.known)
+            except Exception as e:
+                logger.error(f"Known-emails refresh failed, keeping the previous filter: {str(e)}")
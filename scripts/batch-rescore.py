@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Offline batch re-scoring of historical jobs with the time-estimation model
+Reads a CSV, Parquet or NDJSON export in chunks, scores the chunks in a
+process pool built on the inference.py handlers and writes predictions plus
+confidences back in input order.
+
+Usage:
+    python scripts/batch-rescore.py jobs-export.csv --model-dir ./model --output rescored.csv
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inference  # noqa: E402
+from job_export import FORMATS, ChunkWriter, detect_format, read_chunks  # noqa: E402
+
+# Model loaded once per worker process (memory-mapped, so pages are shared)
+_worker_model = None
+
+def _init_worker(model_dir):
+    global _worker_model
+    _worker_model = inference.model_fn(model_dir)
+
+def score_chunk(chunk, id_columns):
+    """Score one chunk in a worker process"""
+    features = inference.features_from_frame(chunk)
+    prediction = inference.predict_fn(features, _worker_model)
+
+    result = chunk[id_columns].reset_index(drop=True) if id_columns else pd.DataFrame()
+    result['predicted_hours'] = prediction['predictions']
+    result['confidence_score'] = prediction['confidence']
+    return result
+
+def empty_result(id_columns, chunk=None):
+    """Zero-row frame with the output columns, typed from the input where known"""
+    result = chunk[id_columns].iloc[0:0].reset_index(drop=True) if chunk is not None and id_columns else \
+        pd.DataFrame({column: pd.Series(dtype=object) for column in id_columns})
+    result['predicted_hours'] = pd.Series(dtype='float64')
+    result['confidence_score'] = pd.Series(dtype='float64')
+    return result
+
+def prepare_model_dir(model_dir, scratch_dir):
+    """Return a directory with a compiled forest, compiling model.joblib if needed"""
+    if os.path.isdir(os.path.join(model_dir, inference.COMPILED_MODEL_DIR)):
+        return model_dir
+
+    print("🔧 Compiling model.joblib into a shared memory-mapped forest...")
+    model = inference.model_fn(model_dir)
+    inference.compile_forest(model).save(os.path.join(scratch_dir, inference.COMPILED_MODEL_DIR))
+    return scratch_dir
+
+def rescore(input_path, output_path, model_dir, input_format=None, output_format=None,
+            chunk_rows=10000, workers=None, id_columns=None):
+    """Score input_path into output_path and return (rows, seconds)"""
+    workers = workers or os.cpu_count() or 1
+    id_columns = id_columns or []
+    input_format = detect_format(input_path, input_format)
+    output_format = detect_format(output_path, output_format)
+
+    started = time.perf_counter()
+    rows = 0
+    writer = ChunkWriter(output_path, output_format, schema=empty_result(id_columns))
+
+    with tempfile.TemporaryDirectory(prefix='nordflytt-rescore-') as scratch_dir:
+        shared_model_dir = prepare_model_dir(model_dir, scratch_dir)
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shared_model_dir,)) as pool:
+            # Bounded window of in-flight chunks keeps memory flat and
+            # popping from the left keeps the output in input order
+            pending = deque()
+            max_in_flight = workers * 2
+
+            for chunk in read_chunks(input_path, input_format, chunk_rows):
+                if chunk.empty:
+                    # A header-only export: keep the input's column types for the empty output
+                    writer.schema = empty_result(id_columns, chunk)
+                    continue
+                pending.append(pool.submit(score_chunk, chunk, id_columns))
+                if len(pending) >= max_in_flight:
+                    result = pending.popleft().result()
+                    writer.write(result)
+                    rows += len(result)
+
+            while pending:
+                result = pending.popleft().result()
+                writer.write(result)
+                rows += len(result)
+
+    writer.close()
+    return rows, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score historical jobs with the time-estimation model")
+    parser.add_argument('input', help="Job export (.csv, .parquet or .ndjson)")
+    parser.add_argument('--output', required=True, help="Output file (.csv, .parquet or .ndjson)")
+    parser.add_argument('--model-dir', default=os.environ.get('NORDFLYTT_MODEL_DIR', 'model'),
+                        help="Directory with forest/ or model.joblib")
+    parser.add_argument('--format', dest='input_format', choices=sorted(set(FORMATS.values())))
+    parser.add_argument('--output-format', choices=sorted(set(FORMATS.values())))
+    parser.add_argument('--chunk-rows', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--id-column', action='append', dest='id_columns', default=[],
+                        help="Column copied to the output next to the prediction (repeatable)")
+    args = parser.parse_args()
+
+    print("🚀 Nordflytt batch re-scoring")
+    print(f"📦 Input: {args.input}")
+    print(f"🤖 Model: {args.model_dir}")
+    print(f"⚙️  Workers: {args.workers}, chunk size: {args.chunk_rows}")
+
+    rows, seconds = rescore(
+        args.input, args.output, args.model_dir,
+        input_format=args.input_format, output_format=args.output_format,
+        chunk_rows=args.chunk_rows, workers=args.workers, id_columns=args.id_columns
+    )
+
+    print(f"✅ Scored {rows} rows in {seconds:.2f}s ({rows / seconds if seconds else 0:.0f} rows/s)")
+    print(f"📍 Output: {args.output}")
+
+if __name__ == "__main__":
+    main()
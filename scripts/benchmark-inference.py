@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Local latency and throughput benchmark for inference.py
+Drives input_fn -> predict_fn -> output_fn with synthetic job features across
+batch sizes and forest sizes, and reports p50/p99 latency, rows/sec and peak
+RSS. Every case runs in a fresh process so peak RSS is per case. Results are
+saved as JSON so runs from different commits can be compared.
+
+Usage:
+    python scripts/benchmark-inference.py --output bench-$(git rev-parse --short HEAD).json
+    python scripts/benchmark-inference.py --compare bench-old.json --output bench-new.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inference  # noqa: E402
+
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+def synthetic_features(rows, seed=0):
+    """Features drawn from distributions resembling Nordflytt jobs"""
+    rng = np.random.default_rng(seed)
+    living_area = np.clip(rng.lognormal(np.log(70), 0.45, rows), 15, 400)
+    property_type = rng.choice(3, rows, p=[0.7, 0.2, 0.1])  # lägenhet, villa, kontor
+    elevator = rng.choice(3, rows, p=[0.3, 0.3, 0.4])  # ingen, liten, stor
+
+    features = np.column_stack([
+        living_area,
+        rng.choice([2, 3, 4], rows, p=[0.6, 0.3, 0.1]),
+        np.clip(rng.exponential(15, rows), 0.5, 200),
+        rng.integers(0, 7, rows),
+        rng.uniform(0.3, 0.95, rows),
+        rng.uniform(0.4, 0.9, rows),
+        np.clip(living_area * 0.3 / 5, 3, 50),
+        property_type == 1,
+        property_type == 2,
+        elevator == 0,
+        elevator == 1
+    ]).astype(np.float64)
+    return features
+
+def synthetic_hours(features, seed=0):
+    rng = np.random.default_rng(seed + 1)
+    hours = (
+        features[:, 6] * 0.8
+        + features[:, 2] / 25
+        + features[:, 3] * features[:, 9] * 0.4
+        + (1 - features[:, 5]) * 2
+        - (features[:, 1] - 2) * 0.6
+    )
+    return np.clip(hours + rng.normal(0, 0.5, len(hours)), 1, None)
+
+def build_models(tree_counts, base_dir, training_rows, seed):
+    """Train one forest per tree count and publish it the way training.py does"""
+    import training
+
+    X = synthetic_features(training_rows, seed).astype(np.float32)
+    y = synthetic_hours(X, seed)
+    model_dirs = {}
+
+    for trees in tree_counts:
+        model_dir = os.path.join(base_dir, f'trees-{trees}')
+        model = training.train_forest(X, y, n_estimators=trees, tree_step=trees, verbose=False)
+        training.save_model(model, model_dir)
+        model_dirs[trees] = model_dir
+        print(f"🌲 Built {trees}-tree forest")
+
+    return model_dirs
+
+def encode_payload(features, content_type):
+    if content_type == 'json':
+        if len(features) == 1:
+            return json.dumps(dict(zip(inference.FEATURE_NAMES, features[0].tolist())))
+        return json.dumps({'instances': features.tolist()})
+    if content_type == 'csv':
+        return '\n'.join(','.join(repr(value) for value in row) for row in features.tolist())
+    return '\n'.join(json.dumps(dict(zip(inference.FEATURE_NAMES, row))) for row in features.tolist())
+
+def run_case(model_dir, backend, trees, batch_size, content_type, iterations, seed):
+    """Benchmark one configuration; runs in its own process"""
+    if backend == 'sklearn':
+        import joblib
+        model = joblib.load(os.path.join(model_dir, 'model.joblib'))
+        model.set_params(n_jobs=1)
+    else:
+        model = inference.model_fn(model_dir)
+
+    mime = CONTENT_TYPES[content_type]
+    payload = encode_payload(synthetic_features(batch_size, seed + 2), content_type)
+
+    def invoke():
+        output = inference.output_fn(inference.predict_fn(inference.input_fn(payload, mime), model), mime)
+        if not isinstance(output, (str, bytes)):
+            for _ in output:
+                pass
+
+    # Warm up caches and lazy imports before timing
+    for _ in range(min(3, iterations)):
+        invoke()
+
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        invoke()
+        latencies.append(time.perf_counter() - started)
+
+    latencies = np.array(latencies)
+    return {
+        'backend': backend,
+        'trees': trees,
+        'batch_size': batch_size,
+        'content_type': content_type,
+        'iterations': iterations,
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'rows_per_sec': float(batch_size * iterations / latencies.sum()),
+        # ru_maxrss is KiB on Linux and bytes on macOS
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+    }
+
+def case_key(case):
+    return (case['backend'], case['trees'], case['batch_size'], case['content_type'])
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+def print_results(cases, baseline=None):
+    baseline_cases = {case_key(case): case for case in (baseline or {}).get('cases', [])}
+    header = f"{'backend':>8} {'trees':>5} {'batch':>6} {'type':>6} {'p50 ms':>9} {'p99 ms':>9} {'rows/s':>11} {'RSS MB':>7}"
+    print('\n' + header + ('   Δp50' if baseline_cases else ''))
+
+    for case in cases:
+        line = (f"{case['backend']:>8} {case['trees']:>5} {case['batch_size']:>6} {case['content_type']:>6} "
+                f"{case['p50_ms']:>9.3f} {case['p99_ms']:>9.3f} {case['rows_per_sec']:>11.0f} {case['peak_rss_mb']:>7.1f}")
+        previous = baseline_cases.get(case_key(case))
+        if previous:
+            line += f" {(case['p50_ms'] / previous['p50_ms'] - 1) * 100:>+6.1f}%"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inference.py latency and throughput")
+    parser.add_argument('--trees', default='3,50,200,500', help="Comma-separated forest sizes")
+    parser.add_argument('--batch-sizes', default='1,10,100,1000,10000')
+    parser.add_argument('--backends', default='compiled', help="compiled and/or sklearn")
+    parser.add_argument('--content-types', default='json', help="json, csv and/or ndjson")
+    parser.add_argument('--rows-per-case', type=int, default=50000, help="Rows scored per case (sets iterations)")
+    parser.add_argument('--training-rows', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='inference-benchmark.json')
+    parser.add_argument('--compare', help="Earlier results JSON to show p50 change against")
+    args = parser.parse_args()
+
+    tree_counts = [int(value) for value in args.trees.split(',')]
+    batch_sizes = [int(value) for value in args.batch_sizes.split(',')]
+    backends = args.backends.split(',')
+    content_types = args.content_types.split(',')
+
+    print("⏱️  Nordflytt inference benchmark")
+    cases = []
+    # Fresh interpreter per case keeps peak RSS and warm caches independent
+    spawn = multiprocessing.get_context('spawn')
+
+    with tempfile.TemporaryDirectory(prefix='nordflytt-bench-') as base_dir:
+        model_dirs = build_models(tree_counts, base_dir, args.training_rows, args.seed)
+
+        for backend in backends:
+            for trees in tree_counts:
+                for batch_size in batch_sizes:
+                    for content_type in content_types:
+                        iterations = max(5, min(1000, args.rows_per_case // batch_size))
+                        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                            case = pool.submit(run_case, model_dirs[trees], backend, trees, batch_size,
+                                               content_type, iterations, args.seed).result()
+                        cases.append(case)
+                        print(f"  {backend} {trees} trees × {batch_size} rows ({content_type}): "
+                              f"p50 {case['p50_ms']:.3f} ms")
+
+    results = {
+        'commit': git_commit(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'cases': cases
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\n📊 Comparing against {args.compare} (commit {baseline.get('commit')})")
+
+    print_results(cases, baseline)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n📍 Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Parallel hyperparameter search for the time-estimation RandomForest
+Materializes the feature matrix once as memory-mapped .npy files, evaluates
+every configuration with k-fold CV across a process pool and caches each
+(configuration, fold) result on disk so an interrupted search resumes where
+it stopped. Prints a leaderboard with error, fit time, predict latency and
+compiled model size.
+
+Usage:
+    python scripts/hyperparameter-search.py jobs-export.parquet \\
+        --n-estimators 100,300 --max-depth none,12,20 --min-samples-leaf 1,5
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inference  # noqa: E402
+import training  # noqa: E402
+
+LATENCY_SAMPLES = 200
+
+def export_fingerprint(path):
+    """Identify an export by path, size and mtime so stale caches are not reused"""
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha1(key.encode()).hexdigest()[:12]
+
+def write_atomic(path, write, mode='wb'):
+    """Write path through a unique temp file in its directory, then rename it into place
+
+    An interrupted run never leaves a truncated file, and parallel workers
+    writing the same path never share a temp file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def save_array(path, array):
+    write_atomic(path, lambda f: np.save(f, array))
+
+def materialize(path, cache_dir, folds, seed):
+    """Write X.npy, y.npy and fold assignments once and return the dataset dir"""
+    dataset_dir = os.path.join(cache_dir, export_fingerprint(path))
+    fold_path = os.path.join(dataset_dir, f'folds-{folds}-{seed}.npy')
+
+    if not os.path.exists(os.path.join(dataset_dir, 'y.npy')):
+        print("📦 Building feature matrix (once)...")
+        X, y = training.load_training_data(path)
+        os.makedirs(dataset_dir, exist_ok=True)
+        # y.npy marks the cache complete, so it is written last
+        save_array(os.path.join(dataset_dir, 'X.npy'), X)
+        save_array(os.path.join(dataset_dir, 'y.npy'), y)
+    else:
+        print("♻️  Reusing cached feature matrix")
+
+    if not os.path.exists(fold_path):
+        y = np.load(os.path.join(dataset_dir, 'y.npy'), mmap_mode='r')
+        rng = np.random.default_rng(seed)
+        save_array(fold_path, rng.permutation(len(y)) % folds)
+
+    return dataset_dir, fold_path
+
+def parse_values(raw, cast):
+    return [None if value.lower() == 'none' else cast(value) for value in raw.split(',')]
+
+def build_grid(args):
+    keys = ['n_estimators', 'max_depth', 'min_samples_leaf', 'max_features']
+    values = [
+        parse_values(args.n_estimators, int),
+        parse_values(args.max_depth, int),
+        parse_values(args.min_samples_leaf, int),
+        parse_values(args.max_features, float)
+    ]
+    return [dict(zip(keys, combination)) for combination in itertools.product(*values)]
+
+def config_key(config):
+    return '-'.join(f"{key}={config[key]}" for key in sorted(config))
+
+def result_path(results_dir, config, fold):
+    digest = hashlib.sha1(config_key(config).encode()).hexdigest()[:12]
+    return os.path.join(results_dir, f'{digest}-fold{fold}.json')
+
+def evaluate_fold(dataset_dir, fold_path, config, fold, seed, output_path):
+    """Fit one configuration on one fold in a worker and cache the result"""
+    X = np.load(os.path.join(dataset_dir, 'X.npy'), mmap_mode='r')
+    y = np.load(os.path.join(dataset_dir, 'y.npy'), mmap_mode='r')
+    fold_ids = np.load(fold_path, mmap_mode='r')
+    is_test = fold_ids == fold
+
+    model = RandomForestRegressor(n_jobs=1, random_state=seed, **config)
+
+    started = time.perf_counter()
+    model.fit(X[~is_test], y[~is_test])
+    fit_seconds = time.perf_counter() - started
+
+    compiled = inference.compile_forest(model)
+    X_test, y_test = X[is_test], y[is_test]
+
+    started = time.perf_counter()
+    predictions = compiled.predict(X_test)
+    batch_seconds = time.perf_counter() - started
+
+    # Single-row latency as seen by the serving path
+    latencies = []
+    for row in X_test[:LATENCY_SAMPLES]:
+        started = time.perf_counter()
+        compiled.predict_trees(row)
+        latencies.append(time.perf_counter() - started)
+
+    errors = predictions - y_test
+    result = {
+        'config': config,
+        'fold': fold,
+        'mae': float(np.mean(np.abs(errors))),
+        'rmse': float(np.sqrt(np.mean(errors ** 2))),
+        'fit_seconds': fit_seconds,
+        'predict_us_per_row': batch_seconds / max(len(y_test), 1) * 1e6,
+        'single_row_p50_us': float(np.percentile(latencies, 50) * 1e6) if latencies else None,
+        'model_bytes': int(sum(getattr(compiled, name).nbytes for name in compiled.ARRAYS)),
+        'node_count': compiled.node_count
+    }
+
+    # Write-then-rename so an interrupted worker never leaves a partial result
+    write_atomic(output_path, lambda f: json.dump(result, f), mode='w')
+    return result
+
+def mean_of(values):
+    """Mean of the timings that were measured; None when no fold had test rows"""
+    values = [value for value in values if value is not None]
+    return float(np.mean(values)) if values else None
+
+def leaderboard(results):
+    """Aggregate fold results per configuration, best mean MAE first"""
+    by_config = {}
+    for result in results:
+        by_config.setdefault(config_key(result['config']), []).append(result)
+
+    rows = []
+    for fold_results in by_config.values():
+        rows.append({
+            'config': fold_results[0]['config'],
+            'folds': len(fold_results),
+            'mae': float(np.mean([r['mae'] for r in fold_results])),
+            'mae_std': float(np.std([r['mae'] for r in fold_results])),
+            'rmse': float(np.mean([r['rmse'] for r in fold_results])),
+            'fit_seconds': float(np.mean([r['fit_seconds'] for r in fold_results])),
+            'predict_us_per_row': float(np.mean([r['predict_us_per_row'] for r in fold_results])),
+            'single_row_p50_us': mean_of(r['single_row_p50_us'] for r in fold_results),
+            'model_mb': float(np.mean([r['model_bytes'] for r in fold_results])) / 1e6
+        })
+    return sorted(rows, key=lambda row: row['mae'])
+
+def print_leaderboard(rows):
+    print(f"\n{'#':>3} {'MAE':>7} {'±':>6} {'fit s':>7} {'µs/row':>8} {'p50 µs':>8} {'MB':>7}  config")
+    for rank, row in enumerate(rows, 1):
+        p50 = f"{row['single_row_p50_us']:>8.1f}" if row['single_row_p50_us'] is not None else f"{'-':>8}"
+        print(f"{rank:>3} {row['mae']:>7.3f} {row['mae_std']:>6.3f} {row['fit_seconds']:>7.2f} "
+              f"{row['predict_us_per_row']:>8.2f} {p50} {row['model_mb']:>7.2f}  "
+              f"{config_key(row['config'])}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Hyperparameter search for the time-estimation model")
+    parser.add_argument('input', help="Completed jobs export (.csv, .parquet or .ndjson)")
+    parser.add_argument('--cache-dir', default='.hpsearch-cache')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--n-estimators', default='100,300')
+    parser.add_argument('--max-depth', default='none,12')
+    parser.add_argument('--min-samples-leaf', default='1,5')
+    parser.add_argument('--max-features', default='0.5,1.0')
+    parser.add_argument('--output', help="Leaderboard JSON (default: leaderboard.json in the results cache)")
+    args = parser.parse_args()
+
+    print("🔍 Nordflytt hyperparameter search")
+    dataset_dir, fold_path = materialize(args.input, args.cache_dir, args.folds, args.seed)
+    results_dir = os.path.join(dataset_dir, f'results-{args.folds}-{args.seed}')
+    os.makedirs(results_dir, exist_ok=True)
+
+    grid = build_grid(args)
+    results, tasks = [], []
+    for config in grid:
+        for fold in range(args.folds):
+            path = result_path(results_dir, config, fold)
+            if os.path.exists(path):
+                with open(path) as f:
+                    results.append(json.load(f))
+            else:
+                tasks.append((config, fold, path))
+
+    print(f"⚙️  {len(grid)} configurations × {args.folds} folds: "
+          f"{len(results)} cached, {len(tasks)} to run on {args.workers} workers")
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [
+            pool.submit(evaluate_fold, dataset_dir, fold_path, config, fold, args.seed, path)
+            for config, fold, path in tasks
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results.append(result)
+            print(f"  [{done}/{len(tasks)}] {config_key(result['config'])} fold {result['fold']}: "
+                  f"MAE {result['mae']:.3f}")
+
+    rows = leaderboard(results)
+    print_leaderboard(rows)
+
+    output_path = args.output or os.path.join(results_dir, 'leaderboard.json')
+    with open(output_path, 'w') as f:
+        json.dump(rows, f, indent=2)
+    print(f"\n📍 Leaderboard saved to {output_path}")
+
+if __name__ == "__main__":
+    main()
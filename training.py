@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Train the Nordflytt time-estimation RandomForest from job history
+Streams completed jobs (actual hours plus the 11 model features) from an
+export, grows the forest in warm-started increments with n_jobs parallelism
+and publishes model.joblib plus the compiled forest consumed by model_fn.
+
+Usage:
+    python training.py jobs-export.parquet --model-dir ./model --n-estimators 300
+"""
+
+import argparse
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+import inference
+from drift_monitor import REFERENCE_FILE, FeatureSketches
+from job_export import read_chunks
+
+TARGET_COLUMN = 'actual_hours'
+COMPLETED_STATUSES = ('completed', 'done', 'finished')
+
+def completed_jobs(chunk, target_column=TARGET_COLUMN):
+    """Keep rows for completed jobs with a usable actual-hours target"""
+    if 'status' in chunk.columns:
+        chunk = chunk[chunk['status'].astype(str).str.lower().isin(COMPLETED_STATUSES)]
+    chunk = chunk[chunk[target_column].notna() & (chunk[target_column] > 0)]
+    return chunk
+
+def load_training_data(path, target_column=TARGET_COLUMN, file_format=None, chunk_rows=50000, max_rows=None):
+    """Stream an export into a compact float32 feature matrix and target vector
+
+    Only the 11 model features and the target are kept per chunk, so peak
+    memory is the size of the final matrix rather than the raw export.
+    """
+    feature_chunks, target_chunks = [], []
+    rows = 0
+
+    for chunk in read_chunks(path, file_format, chunk_rows):
+        if target_column not in chunk.columns:
+            raise ValueError(f"Export has no '{target_column}' column")
+
+        chunk = completed_jobs(chunk, target_column)
+        if max_rows is not None:
+            chunk = chunk.iloc[:max_rows - rows]
+
+        feature_chunks.append(inference.features_from_frame(chunk).to_numpy(dtype=np.float32))
+        target_chunks.append(chunk[target_column].to_numpy(dtype=np.float64))
+        rows += len(chunk)
+
+        if max_rows is not None and rows >= max_rows:
+            break
+
+    if not rows:
+        raise ValueError(f"No completed jobs with '{target_column}' found in {path}")
+
+    return np.concatenate(feature_chunks), np.concatenate(target_chunks)
+
+def train_forest(X, y, n_estimators=200, tree_step=50, max_depth=None, min_samples_leaf=5,
+                 max_features=1.0, n_jobs=-1, random_state=42, base_model=None, verbose=True):
+    """Grow a RandomForestRegressor in warm-started increments of tree_step trees
+
+    Passing base_model continues an existing forest: its trees are kept and
+    only the additional trees are fitted on X, y.
+    """
+    if base_model is not None:
+        model = base_model
+        model.set_params(warm_start=True, n_jobs=n_jobs)
+        n_estimators = len(model.estimators_) + n_estimators
+    else:
+        model = RandomForestRegressor(
+            n_estimators=0,
+            max_depth=max_depth,
+            min_samples_leaf=min_samples_leaf,
+            max_features=max_features,
+            n_jobs=n_jobs,
+            random_state=random_state,
+            warm_start=True
+        )
+
+    grown = len(getattr(model, 'estimators_', []))
+    while grown < n_estimators:
+        grown = min(grown + tree_step, n_estimators)
+        started = time.perf_counter()
+        model.set_params(n_estimators=grown)
+        model.fit(X, y)
+        if verbose:
+            print(f"🌲 {grown}/{n_estimators} trees ({time.perf_counter() - started:.2f}s)")
+
+    return model
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+def drift_reference(forest, X, max_rows=100000, random_state=42):
+    """Sketch training features and predictions as the drift baseline"""
+    if len(X) > max_rows:
+        X = X[np.random.default_rng(random_state).choice(len(X), max_rows, replace=False)]
+    sketches = FeatureSketches(inference.FEATURE_NAMES)
+    for start in range(0, len(X), 10000):
+        batch = X[start:start + 10000]
+        sketches.update(batch, forest.predict(batch))
+    return sketches
+
+def save_model(model, model_dir, slot=inference.COMPILED_MODEL_DIR, X_reference=None):
+    """Write model.joblib and publish the compiled forest, returning their sizes in bytes
+
+    Publishing to the 'candidate' slot leaves the live forest untouched so a
+    hot-swapping server scores the new model in shadow first. With
+    X_reference, a drift_reference.json snapshot is published alongside.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    joblib_name = 'model.joblib' if slot == inference.COMPILED_MODEL_DIR else f'{slot}.joblib'
+    joblib_path = os.path.join(model_dir, joblib_name)
+
+    tmp_path = f'{joblib_path}.tmp'
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, joblib_path)
+    forest = inference.compile_forest(model)
+    extra_files = {}
+    if X_reference is not None:
+        extra_files[REFERENCE_FILE] = drift_reference(forest, X_reference).to_dict()
+    compiled_path = inference.publish_forest(forest, model_dir, slot, extra_files)
+
+    return {
+        'joblib_bytes': os.path.getsize(joblib_path),
+        'compiled_bytes': directory_size(compiled_path)
+    }
+
+def train(path, model_dir, holdout=0.1, max_rows=None, warm_start_from=None,
+          slot=inference.COMPILED_MODEL_DIR, **forest_params):
+    """Train from an export, save the artifacts and return a training report"""
+    load_started = time.perf_counter()
+    X, y = load_training_data(path, max_rows=max_rows)
+    load_seconds = time.perf_counter() - load_started
+
+    rng = np.random.default_rng(forest_params.get('random_state', 42))
+    is_holdout = rng.random(len(y)) < holdout if holdout else np.zeros(len(y), dtype=bool)
+    X_train, y_train = X[~is_holdout], y[~is_holdout]
+
+    base_model = joblib.load(os.path.join(warm_start_from, 'model.joblib')) if warm_start_from else None
+
+    fit_started = time.perf_counter()
+    model = train_forest(X_train, y_train, base_model=base_model, **forest_params)
+    fit_seconds = time.perf_counter() - fit_started
+
+    report = {
+        'rows': int(len(y)),
+        'train_rows': int(len(y_train)),
+        'holdout_rows': int(is_holdout.sum()),
+        'load_seconds': round(load_seconds, 3),
+        'fit_seconds': round(fit_seconds, 3),
+        'n_estimators': len(model.estimators_),
+        'node_count': int(sum(tree.tree_.node_count for tree in model.estimators_)),
+        'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+
+    if is_holdout.any():
+        holdout_predictions = model.predict(X[is_holdout])
+        report['holdout_mae_hours'] = round(float(np.mean(np.abs(holdout_predictions - y[is_holdout]))), 4)
+
+    report.update(save_model(model, model_dir, slot, X_reference=X_train))
+
+    report_name = 'training_report.json' if slot == inference.COMPILED_MODEL_DIR else f'{slot}_training_report.json'
+    with open(os.path.join(model_dir, report_name), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the Nordflytt time-estimation model from job history")
+    parser.add_argument('input', help="Completed jobs export (.csv, .parquet or .ndjson)")
+    parser.add_argument('--model-dir', default='model', help="Where model.joblib and forest/ are written")
+    parser.add_argument('--n-estimators', type=int, default=200)
+    parser.add_argument('--tree-step', type=int, default=50, help="Trees added per warm-start increment")
+    parser.add_argument('--max-depth', type=int, default=None)
+    parser.add_argument('--min-samples-leaf', type=int, default=5)
+    parser.add_argument('--max-features', type=float, default=1.0)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--holdout', type=float, default=0.1, help="Fraction of rows held out for MAE")
+    parser.add_argument('--warm-start-from', help="Existing model dir whose forest is extended")
+    parser.add_argument('--candidate', action='store_true',
+                        help="Publish as the shadow candidate instead of the live model")
+    parser.add_argument('--scaling', help="Comma-separated row counts to report fit time and size against")
+    args = parser.parse_args()
+
+    forest_params = {
+        'n_estimators': args.n_estimators,
+        'tree_step': args.tree_step,
+        'max_depth': args.max_depth,
+        'min_samples_leaf': args.min_samples_leaf,
+        'max_features': args.max_features,
+        'n_jobs': args.n_jobs
+    }
+
+    print("🚀 Nordflytt time-estimation training")
+    print(f"📦 Input: {args.input}")
+
+    if args.scaling:
+        print(f"{'rows':>10} {'fit s':>8} {'nodes':>10} {'joblib MB':>10} {'compiled MB':>12}")
+        for max_rows in (int(value) for value in args.scaling.split(',')):
+            scaling_dir = os.path.join(args.model_dir, f'scaling-{max_rows}')
+            report = train(args.input, scaling_dir, holdout=0, max_rows=max_rows,
+                           verbose=False, **forest_params)
+            print(f"{report['rows']:>10} {report['fit_seconds']:>8.2f} {report['node_count']:>10} "
+                  f"{report['joblib_bytes'] / 1e6:>10.2f} {report['compiled_bytes'] / 1e6:>12.2f}")
+        return
+
+    slot = inference.CANDIDATE_MODEL_DIR if args.candidate else inference.COMPILED_MODEL_DIR
+    report = train(args.input, args.model_dir, holdout=args.holdout,
+                   warm_start_from=args.warm_start_from, slot=slot, **forest_params)
+
+    print(f"✅ Trained {report['n_estimators']} trees on {report['train_rows']} rows in {report['fit_seconds']:.2f}s")
+    if 'holdout_mae_hours' in report:
+        print(f"🎯 Holdout MAE: {report['holdout_mae_hours']:.3f} hours")
+    print(f"💾 joblib: {report['joblib_bytes'] / 1e6:.2f} MB, {slot}/: {report['compiled_bytes'] / 1e6:.2f} MB")
+    print(f"📍 Model dir: {args.model_dir}")
+
+if __name__ == "__main__":
+    main()